@@ -0,0 +1,105 @@
+# model/database.py
+from Model.note import Note
+
+
+class NoteRepository:
+    """
+    Note-level access to the notes stored by DatabaseManager, returning
+    Note objects instead of dictionaries.
+
+    Listing methods only read titles and previews; each listed note fetches
+    its body from the database the first time its content is read.
+    """
+    def __init__(self, db):
+        """
+        Args:
+            db (DatabaseManager): The database holding the notes
+        """
+        self.db = db
+
+    def get(self, note_id):
+        """
+        Args:
+            note_id (int): The ID of the note
+
+        Returns:
+            Note: The note with its content, or None if not found
+        """
+        row = self.db.get_note(note_id)
+        return Note.from_row(row) if row else None
+
+    def list_page(self, limit=50, cursor=None, preview_length=100):
+        """
+        Retrieves one page of notes, most recently updated first, without
+        their content.
+
+        Args:
+            limit (int, optional): Maximum number of notes in the page
+            cursor (tuple, optional): Cursor returned with the previous page
+            preview_length (int, optional): Characters of preview per note
+
+        Returns:
+            tuple: (notes, next_cursor) as for DatabaseManager.get_notes_page()
+        """
+        rows, next_cursor = self.db.get_notes_page(
+            limit=limit, cursor=cursor, preview_length=preview_length
+        )
+        return [self.from_summary(row) for row in rows], next_cursor
+
+    def list_all(self, preview_length=100):
+        """
+        Retrieves every note, most recently updated first, without content.
+
+        Returns:
+            list: Note objects
+        """
+        notes = []
+        cursor = None
+        while True:
+            page, cursor = self.list_page(limit=500, cursor=cursor,
+                                          preview_length=preview_length)
+            notes.extend(page)
+            if cursor is None:
+                return notes
+
+    def from_summary(self, row):
+        """
+        Builds a note from a listing row or note change event summary, with
+        its content loaded on demand.
+        """
+        return Note.from_row(row, loader=self.load_content)
+
+    def load_content(self, note_id):
+        """Returns the content of a note, or None if it does not exist."""
+        return self.db.get_note_content(note_id)
+
+    def save(self, note):
+        """
+        Creates or updates a note, setting note.id for new notes.
+
+        Args:
+            note (Note): The note to save
+
+        Returns:
+            int: The ID of the note
+        """
+        note.id = self.db.save_note(note.title, note.content, note.id)
+        return note.id
+
+    def delete(self, note_id):
+        """Soft deletes a note."""
+        self.db.delete_note(note_id)
+
+    def search(self, text, limit=20):
+        """
+        Full-text search over titles and content.
+
+        Returns:
+            list: Matching notes, best match first, with their snippet as
+                  the preview
+        """
+        return [
+            Note(row['title'], id=row['id'], preview=row['snippet'],
+                 updated_at=row['updated_at'], loader=self.load_content)
+            for row in self.db.search_notes(text, limit=limit)
+        ]
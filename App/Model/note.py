@@ -0,0 +1,111 @@
+# model/note.py
+from datetime import datetime
+import hashlib
+
+# Marks content that has not been fetched from the database yet
+_NOT_LOADED = object()
+
+
+def note_payload(title, content):
+    """
+    Serializes a note into the bytes stored in its Drive file.
+    Args:
+        title (str): The note title
+        content (str): The note content
+    Returns:
+        bytes: UTF-8 text with the title, a blank line and the content
+    """
+    return f"{title}\n\n{content or ''}".encode('utf-8')
+
+
+def note_content_hash(title, content):
+    """
+    Returns the MD5 hex digest of a note's payload, which is what Drive
+    reports as the md5Checksum of the file holding that version of the note.
+    """
+    return hashlib.md5(note_payload(title, content)).hexdigest()
+
+
+def parse_timestamp(value):
+    """
+    Converts a timestamp as stored by SQLite ('YYYY-MM-DD HH:MM:SS') into a
+    datetime. Returns None for None and passes datetimes through.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class Note:
+    """
+    A single note.
+
+    Notes built for the notes list carry only the title and a preview; the
+    full content is fetched through the loader the first time .content is
+    read, so listing never reads note bodies. __slots__ keeps each instance
+    small when thousands are listed.
+    """
+    __slots__ = ('id', 'title', 'preview', 'created_at', 'updated_at',
+                 '_content', '_loader')
+
+    def __init__(self, title, content=_NOT_LOADED, id=None, preview=None,
+                 created_at=None, updated_at=None, loader=None):
+        """
+        Args:
+            title (str): The note title
+            content (str, optional): The note body; leave out to load it
+                lazily through loader
+            id (int, optional): Database ID, None for unsaved notes
+            preview (str, optional): Start of the content for listings
+            created_at (datetime or str, optional): Creation time
+            updated_at (datetime or str, optional): Last modification time
+            loader (callable, optional): loader(note_id) returning the
+                content when it is first needed
+        """
+        self.id = id
+        self.title = title
+        self.preview = preview
+        self.created_at = parse_timestamp(created_at)
+        self.updated_at = parse_timestamp(updated_at)
+        self._content = content
+        self._loader = loader
+
+    @classmethod
+    def from_row(cls, row, loader=None):
+        """
+        Builds a note from a DatabaseManager dictionary: a full note from
+        get_note(), or a listing row with a preview and no content.
+        """
+        return cls(
+            row['title'],
+            content=row['content'] if 'content' in row else _NOT_LOADED,
+            id=row['id'],
+            preview=row.get('preview'),
+            created_at=row.get('created_at'),
+            updated_at=row.get('updated_at'),
+            loader=loader
+        )
+
+    @property
+    def content(self):
+        if self._content is _NOT_LOADED:
+            self._content = self._loader(self.id) if self._loader and self.id is not None else None
+            self._loader = None
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._loader = None
+
+    @property
+    def content_loaded(self):
+        """True once the full content is in memory."""
+        return self._content is not _NOT_LOADED
+
+    def to_dict(self):
+        """Returns the note as a dictionary with id, title and content."""
+        return {'id': self.id, 'title': self.title, 'content': self.content}
+
+    def __repr__(self):
+        return f"Note(id={self.id!r}, title={self.title!r})"
@@ -0,0 +1,92 @@
+# model/note_draft.py
+from Model.note import Note
+
+
+class NoteDraft:
+    """
+    The note open in the editor and what was last saved of it.
+
+    Kept apart from the widgets so the save rules can be tested on their
+    own. A save marks the title and content as saved as soon as it is
+    queued, so the same text is never written twice; if the write then
+    fails they are marked unsaved again, and the next save retries them.
+    Writes run through a DatabaseExecutor, one at a time and in order.
+    """
+    def __init__(self, notes, executor):
+        """
+        Args:
+            notes (NoteRepository): Where notes are saved
+            executor (DatabaseExecutor): Runs the writes off the UI thread
+        """
+        self.notes = notes
+        self.executor = executor
+        self.clear()
+
+    def clear(self):
+        """Starts a new, empty note."""
+        self.note = None
+        # (title, content) as last written, or None after a failed write
+        self.saved_state = ("", "")
+
+    def load(self, note):
+        """
+        Starts editing a saved note
+        Args:
+            note (Note): The note, with its content
+        """
+        self.note = note
+        self.saved_state = (note.title, note.content or "")
+
+    def is_dirty(self, title, content):
+        """Returns True if title and content differ from what was last saved"""
+        return (title, content) != self.saved_state
+
+    def save(self, title, content, on_saved=None, on_error=None):
+        """
+        Queues a write of title and content if they changed
+        Args:
+            title (str): The title being edited
+            content (str): The content being edited
+            on_saved (callable, optional): Called with the note once written
+            on_error (callable, optional): Called with the exception if the
+                write failed
+        Returns:
+            bool: True if a save was queued
+        """
+        if not self.is_dirty(title, content):
+            return False
+        if self.note is None:
+            # Don't create empty notes
+            if not title.strip() and not content.strip():
+                return False
+            self.note = Note(title, content=content)
+
+        note = self.note
+        state = (title, content)
+        self.saved_state = state
+
+        def failed(error):
+            # Unless something newer was saved since, the changes count as
+            # unsaved again
+            if self.note is note and self.saved_state == state:
+                self.saved_state = None
+            if on_error is not None:
+                on_error(error)
+
+        self.executor.submit(
+            self.write_note, self.notes, note, title, content,
+            on_result=lambda note_id: on_saved(note) if on_saved else None,
+            on_error=failed
+        )
+        return True
+
+    @staticmethod
+    def write_note(notes, note, title, content):
+        """
+        Runs on the database worker thread. Writes run there one at a time
+        in order, so when a new note is saved again before the first save
+        finished, the second save already sees the ID the first one set and
+        updates the same row.
+        """
+        note.id = notes.save(Note(title, content=content, id=note.id))
+        return note.id
@@ -0,0 +1,284 @@
+# services/backup_service.py
+from datetime import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from Utils.db_backup import backup_database, compress_file
+from Utils.snapshot_bundle import (
+    DEFAULT_CHUNK_SIZE, BundleWriter, coalesce_chunks, decode_chunk,
+    decode_manifest, parse_footer
+)
+
+# Settings key holding the Drive IDs of the current backup chain and the
+# time the latest bundle was started
+SNAPSHOT_STATE_KEY = 'snapshot_backup_state'
+
+# Bytes read from the end of a bundle to find its manifest; small manifests
+# come with the footer in the same request
+SNAPSHOT_TAIL_SIZE = 64 * 1024
+
+# Largest byte range requested at once while restoring
+MAX_RANGE_SIZE = 8 * 1024 * 1024
+
+# Notes read from the database at a time while writing a bundle
+BACKUP_BATCH_SIZE = 500
+
+class BackupService:
+    """
+    Backs the whole note library up to cloud storage as snapshot bundles
+    (see Utils.snapshot_bundle): one compressed file per backup instead of
+    one Drive file per note, so backup and restore cost a handful of
+    requests and their time is dominated by the bytes transferred.
+
+    The first backup, and any backup with full=True, holds every live note.
+    Later ones are incremental and hold only notes changed since the
+    previous bundle, including deletions. Restoring applies the chain of
+    bundles since the last full backup in order, fetching only the chunks
+    that hold the requested notes. Restored notes are matched to local ones
+    by uuid, never by id: a local note that only shares an id with a backed
+    up one is left alone and the backed up note is added next to it.
+    """
+    def __init__(self, db, cloud, chunk_size=DEFAULT_CHUNK_SIZE, work_dir=None):
+        """
+        Args:
+            db (DatabaseManager): Local note storage
+            cloud: Cloud backend providing upload_file(path, name),
+                download_range(file_id, start, end) and delete_file(file_id),
+                normally a GoogleDriveService
+            chunk_size (int, optional): Uncompressed bytes per bundle chunk
+            work_dir (str, optional): Where bundles are written before upload
+        """
+        self.db = db
+        self.cloud = cloud
+        self.chunk_size = chunk_size
+        self.work_dir = work_dir
+        # Held while a database file backup runs, so only one runs at a time
+        self.database_backup_lock = threading.Lock()
+
+    def get_state(self):
+        """
+        Returns:
+            dict: 'bundles', the Drive IDs of the backup chain oldest first,
+                  and 'since', when the latest bundle was started
+        """
+        value = self.db.get_setting(SNAPSHOT_STATE_KEY)
+        return json.loads(value) if value else {'bundles': [], 'since': None}
+
+    def backup(self, full=False):
+        """
+        Writes a snapshot bundle and uploads it.
+
+        Args:
+            full (bool, optional): Back up every note and start a new chain,
+                even if an earlier backup exists
+
+        Returns:
+            dict: 'file_id', 'full', 'notes' and 'bytes' of the uploaded
+                  bundle, or None if nothing changed since the last backup
+        """
+        state = self.get_state()
+        full = full or not state['bundles']
+        since = None if full else state['since']
+        # Taken before reading, so notes saved during the backup are picked
+        # up by the next one
+        started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        fd, path = tempfile.mkstemp(suffix='.nsb', dir=self.work_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer = BundleWriter(f, chunk_size=self.chunk_size)
+                self._write_notes(writer, since, full)
+                writer.finish(full=full, since=since, created_at=started)
+            if writer.note_count == 0:
+                return None
+
+            kind = 'full' if full else 'incremental'
+            stamp = started.replace('-', '').replace(':', '').replace(' ', '-')
+            file_id = self.cloud.upload_file(path, f"notes-{kind}-{stamp}.nsb")
+            size = os.path.getsize(path)
+        finally:
+            os.remove(path)
+
+        bundles = [file_id] if full else state['bundles'] + [file_id]
+        self.db.save_setting(SNAPSHOT_STATE_KEY,
+                             json.dumps({'bundles': bundles, 'since': started}))
+        if full:
+            self._delete_bundles(state['bundles'])
+        logging.info(f"Uploaded {kind} backup of {writer.note_count} notes ({size} bytes)")
+        return {'file_id': file_id, 'full': full, 'notes': writer.note_count, 'bytes': size}
+
+    def _write_notes(self, writer, since, full):
+        """Streams the notes changed since `since` into writer, in batches."""
+        after = None
+        while True:
+            batch = self.db.get_notes_changed_since(since, limit=BACKUP_BATCH_SIZE, after=after)
+            if not batch:
+                return
+            for note in batch:
+                if not note['is_deleted']:
+                    writer.add({key: note[key] for key in
+                                ('id', 'uuid', 'title', 'content', 'created_at', 'updated_at')})
+                elif not full:
+                    # Earlier bundles in the chain may still hold the note
+                    writer.add({'id': note['id'], 'uuid': note['uuid'],
+                                'updated_at': note['updated_at'], 'is_deleted': True})
+            last = batch[-1]
+            after = (last['updated_at'], last['id'])
+
+    def _delete_bundles(self, file_ids):
+        """Removes bundles replaced by a new full backup."""
+        for file_id in file_ids:
+            try:
+                self.cloud.delete_file(file_id)
+            except Exception as e:
+                logging.warning(f"Failed to delete old backup {file_id}: {str(e)}")
+
+    def start_database_backup(self, on_result=None, on_error=None, **options):
+        """
+        Runs backup_database_file() on a thread of its own, so the copy,
+        compression and upload never queue behind or hold up the database
+        work of the screens.
+
+        Args:
+            on_result (callable, optional): Called with the result on the
+                backup thread
+            on_error (callable, optional): Called with the exception on the
+                backup thread
+            **options: Passed to backup_database_file()
+
+        Returns:
+            threading.Thread: The backup thread, or None if a database
+                              backup is already running
+        """
+        if not self.database_backup_lock.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                result = self.backup_database_file(**options)
+            except Exception as e:
+                logging.error(f"Database backup failed: {str(e)}")
+                if on_error:
+                    on_error(e)
+            else:
+                if on_result:
+                    on_result(result)
+            finally:
+                self.database_backup_lock.release()
+
+        thread = threading.Thread(target=run, name='database-backup', daemon=True)
+        thread.start()
+        return thread
+
+    def backup_database_file(self, **options):
+        """
+        Uploads a gzipped copy of the whole database file, taken online with
+        Utils.db_backup.backup_database() so the app keeps working during
+        the copy. Unlike bundles this keeps everything, settings included.
+        Blocks until the upload is done; start_database_backup() runs it in
+        the background.
+
+        Args:
+            **options: pages_per_step and step_pause for backup_database()
+
+        Returns:
+            dict: The copy statistics from backup_database(), plus
+                  'file_id' and 'bytes' of the uploaded file
+        """
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db', dir=self.work_dir)
+        os.close(fd)
+        compressed_path = snapshot_path + '.gz'
+        try:
+            stats = backup_database(self.db, snapshot_path, **options)
+            compress_file(snapshot_path, compressed_path)
+            size = os.path.getsize(compressed_path)
+            file_id = self.cloud.upload_file(compressed_path, f"notes-db-{stamp}.db.gz")
+        finally:
+            for path in (snapshot_path, compressed_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        logging.info(
+            f"Uploaded database backup: {stats['pages']} pages at "
+            f"{stats['pages_per_second'] or 0:.0f} pages/s, "
+            f"{stats['ui_slow_calls']} slow UI database calls meanwhile"
+        )
+        return dict(stats, file_id=file_id, bytes=size)
+
+    def restore(self, note_ids=None):
+        """
+        Restores notes from the backup chain, overwriting local copies.
+
+        Args:
+            note_ids (iterable, optional): IDs of the notes to restore; None
+                restores every note
+
+        Returns:
+            int: Number of notes restored or deleted
+        """
+        wanted = set(note_ids) if note_ids is not None else None
+        return sum(self.restore_bundle(file_id, wanted)
+                   for file_id in self.get_state()['bundles'])
+
+    def restore_bundle(self, file_id, note_ids=None):
+        """
+        Applies one bundle to the database, downloading only the chunks
+        holding the requested notes, with neighbouring chunks merged into
+        a single ranged request.
+
+        Args:
+            file_id (str): Drive ID of the bundle
+            note_ids (set, optional): IDs of the notes to restore; None
+                restores every note in the bundle
+
+        Returns:
+            int: Number of notes restored or deleted
+        """
+        manifest = self.read_manifest(file_id)
+        chunks = [
+            chunk for chunk in manifest['chunks']
+            if note_ids is None or not note_ids.isdisjoint(chunk['ids'])
+        ]
+        count = 0
+        for start, end, group in coalesce_chunks(chunks, MAX_RANGE_SIZE):
+            data, _ = self.cloud.download_range(file_id, start, end)
+            notes = []
+            deleted_uuids = []
+            for chunk in group:
+                offset = chunk['offset'] - start
+                for note in decode_chunk(chunk, data[offset:offset + chunk['length']]):
+                    if note_ids is not None and note['id'] not in note_ids:
+                        continue
+                    if note.get('is_deleted'):
+                        deleted_uuids.append(note['uuid'])
+                    else:
+                        # The id is only meaningful on the device that wrote
+                        # the bundle; the uuid finds the note here
+                        notes.append({key: value for key, value in note.items() if key != 'id'})
+            if notes:
+                self.db.save_notes_bulk(notes)
+            if deleted_uuids:
+                self.db.delete_notes_bulk(uuids=deleted_uuids)
+            count += len(notes) + len(deleted_uuids)
+        return count
+
+    def read_manifest(self, file_id):
+        """
+        Fetches a bundle's manifest: the tail of the file, which usually
+        holds the whole manifest, and the rest of it if it is larger.
+        """
+        tail, size = self.cloud.download_range(file_id, -SNAPSHOT_TAIL_SIZE)
+        manifest_offset, manifest_length = parse_footer(tail)
+        tail_start = size - len(tail)
+        if manifest_offset >= tail_start:
+            start = manifest_offset - tail_start
+            data = tail[start:start + manifest_length]
+        else:
+            data, _ = self.cloud.download_range(
+                file_id, manifest_offset, manifest_offset + manifest_length - 1
+            )
+        return decode_manifest(data)
@@ -1,44 +1,208 @@
 # services/cloud_service.py
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+# The Google client libraries are imported inside the methods that need
+# them: importing googleapiclient costs noticeable time on a phone, and the
+# app must start without touching it
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import functools
+import hashlib
+import json
+import logging
 import os
 import pickle
 import io
+import threading
+
+from Model.note import note_payload
+from Utils.atomic_file import atomic_write
+
+# MIME type of the Drive files that hold individual notes
+NOTE_MIMETYPE = 'text/plain'
+
+# Payloads up to this size go out as a single multipart request; larger ones
+# use a resumable upload session, which costs an extra round trip
+SIMPLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+
+# Bytes fetched per request by download_file(); also the most of a download
+# held in memory at once
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Files or changes fetched per listing request (Drive allows up to 1000)
+LIST_PAGE_SIZE = 100
+
+# File metadata requested by iter_files() and list_changes(); enough to diff
+# remote state without downloading anything
+FILE_FIELDS = 'id, name, mimeType, modifiedTime, md5Checksum, appProperties, trashed'
+
+# Requests kept in flight at once by upload_notes_bulk()
+DEFAULT_UPLOAD_WORKERS = 4
+
+# Credentials are refreshed in the background this many seconds before they
+# expire, and a failed refresh is retried after TOKEN_REFRESH_RETRY seconds
+TOKEN_REFRESH_MARGIN = 5 * 60
+TOKEN_REFRESH_RETRY = 60
+
+# Outcome of one upload in upload_notes_bulk(): file_id is None and error is
+# the exception if the upload failed
+UploadResult = namedtuple('UploadResult', ['note_id', 'file_id', 'error'])
+
+class DownloadError(Exception):
+    """Raised when a downloaded file does not match Drive's checksum."""
+
+def file_md5(path, block_size=DOWNLOAD_CHUNK_SIZE):
+    """Returns the md5 hex digest of a file, read a block at a time."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def drive_discovery_document():
+    """
+    Returns the Drive v3 discovery document bundled with googleapiclient,
+    read once per process, so building a client never goes to the network.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc('drive', 'v3')
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
 
 class GoogleDriveService:
-    def __init__(self):
+    @classmethod
+    def shared(cls):
+        """
+        Returns the process-wide instance, so credentials are loaded and
+        the Drive client is built once however many callers use it
+        """
+        global _shared_service
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = cls()
+            return _shared_service
+
+    def __init__(self, upload_workers=DEFAULT_UPLOAD_WORKERS):
         # If modifying these scopes, delete the token.pickle file
         self.SCOPES = ['https://www.googleapis.com/auth/drive.file']
         self.creds = None
         self.service = None
         self.token_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'token.pickle')
         self.credentials_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'credentials.json')
+        # httplib2 connections are not thread-safe, so every upload thread
+        # gets its own; http_factory overrides how they are created
+        self.http_local = threading.local()
+        self.http_factory = None
+        # Upload threads are started with the first bulk upload and kept
+        # for the next, along with their connections, until shutdown()
+        self.upload_workers = upload_workers
+        self.upload_pool = None
+        self.upload_pool_lock = threading.Lock()
+        # Guards building the client and refreshing the credentials
+        self.auth_lock = threading.RLock()
+        self.refresh_timer = None
         
-    def authenticate(self):
-        """Handles the OAuth2 authentication flow with Google"""
-        # Load existing credentials if available
-        if os.path.exists(self.token_path):
-            with open(self.token_path, 'rb') as token:
-                self.creds = pickle.load(token)
-        
-        # If credentials are invalid or don't exist, get new ones
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_path, self.SCOPES)
-                self.creds = flow.run_local_server(port=0)
+    def authenticate(self, interactive=True):
+        """
+        Handles the OAuth2 authentication flow with Google and builds the
+        Drive client, unless another thread already has
+        Args:
+            interactive (bool, optional): Whether the browser sign-in flow
+                may be started when there are no usable stored credentials
+        Returns:
+            bool: True if the client is ready, False if it needs an
+                  interactive sign-in
+        """
+        with self.auth_lock:
+            if self.service:
+                return True
+                
+            from google.auth.transport.requests import Request
             
-            # Save the credentials for future use
-            with open(self.token_path, 'wb') as token:
-                pickle.dump(self.creds, token)
-        
-        # Build the Drive API service
-        self.service = build('drive', 'v3', credentials=self.creds)
+            # Load existing credentials if available
+            if self.creds is None and os.path.exists(self.token_path):
+                with open(self.token_path, 'rb') as token:
+                    self.creds = pickle.load(token)
+            
+            # If credentials are invalid or don't exist, get new ones
+            if not self.creds or not self.creds.valid:
+                if self.creds and self.creds.expired and self.creds.refresh_token:
+                    self.creds.refresh(Request())
+                elif not interactive:
+                    return False
+                else:
+                    from google_auth_oauthlib.flow import InstalledAppFlow
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        self.credentials_path, self.SCOPES)
+                    self.creds = flow.run_local_server(port=0)
+                
+                # Save the credentials for future use
+                self.save_credentials()
+            
+            # Build the Drive API service from the cached discovery document
+            from googleapiclient.discovery import build_from_document
+            self.service = build_from_document(
+                drive_discovery_document(), credentials=self.creds
+            )
+            self.schedule_token_refresh()
+            return True
+            
+    def save_credentials(self):
+        """Stores the current credentials in token.pickle"""
+        # A torn token file would force the user through sign-in again
+        atomic_write(self.token_path, pickle.dumps(self.creds))
+            
+    def schedule_token_refresh(self, min_delay=0):
+        """
+        Starts a timer that refreshes the credentials TOKEN_REFRESH_MARGIN
+        seconds before they expire, so no request waits on a refresh
+        Args:
+            min_delay (float, optional): Seconds to wait at the least
+        """
+        with self.auth_lock:
+            self.stop_token_refresh()
+            expiry = getattr(self.creds, 'expiry', None)
+            if expiry is None or not getattr(self.creds, 'refresh_token', None):
+                return
+            # google-auth keeps expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            delay = (expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN
+            self.refresh_timer = threading.Timer(max(delay, min_delay), self.refresh_token)
+            self.refresh_timer.daemon = True
+            self.refresh_timer.start()
+            
+    def shutdown(self, wait=True):
+        """
+        Stops the background credential refresh and the upload threads
+        Args:
+            wait (bool, optional): Wait for uploads in progress to finish
+        """
+        self.stop_token_refresh()
+        with self.upload_pool_lock:
+            pool, self.upload_pool = self.upload_pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def stop_token_refresh(self):
+        """Cancels the pending background credential refresh, if any"""
+        with self.auth_lock:
+            if self.refresh_timer is not None:
+                self.refresh_timer.cancel()
+                self.refresh_timer = None
+                
+    def refresh_token(self):
+        """Refreshes the credentials now and schedules the next refresh"""
+        try:
+            from google.auth.transport.requests import Request
+            with self.auth_lock:
+                self.creds.refresh(Request())
+                self.save_credentials()
+        except Exception as e:
+            logging.warning(f"Background token refresh failed: {str(e)}")
+            self.schedule_token_refresh(min_delay=TOKEN_REFRESH_RETRY)
+            return
+        self.schedule_token_refresh()
         
     def upload_file(self, file_path, file_name=None):
         """
@@ -55,8 +219,12 @@ class GoogleDriveService:
         if not file_name:
             file_name = os.path.basename(file_path)
             
+        from googleapiclient.http import MediaFileUpload
         file_metadata = {'name': file_name}
-        media = MediaFileUpload(file_path, resumable=True)
+        media = MediaFileUpload(
+            file_path,
+            resumable=os.path.getsize(file_path) > SIMPLE_UPLOAD_LIMIT
+        )
         
         file = self.service.files().create(
             body=file_metadata,
@@ -66,27 +234,127 @@ class GoogleDriveService:
         
         return file.get('id')
         
-    def download_file(self, file_id, save_path):
+    def download_file(self, file_id, save_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
         """
-        Downloads a file from Google Drive
+        Downloads a file from Google Drive, streaming it to disk in ranged
+        chunks so memory use does not grow with the file size. The data goes
+        to save_path + '.part', which is renamed over save_path once
+        complete and checked against Drive's md5. The file's revision is
+        kept next to the partial file; if the partial file is left from an
+        interrupted download of the same revision, the download resumes
+        where it stopped, otherwise it starts over
         Args:
             file_id (str): ID of the file to download
             save_path (str): Where to save the downloaded file
+            chunk_size (int, optional): Bytes requested at a time
+        Raises:
+            DownloadError: If the downloaded data does not match the md5
         """
         if not self.service:
             self.authenticate()
             
+        metadata = self.service.files().get(
+            fileId=file_id, fields='md5Checksum, modifiedTime'
+        ).execute()
+        revision = json.dumps(
+            {'md5Checksum': metadata.get('md5Checksum'),
+             'modifiedTime': metadata.get('modifiedTime')},
+            sort_keys=True
+        ).encode('utf-8')
+        
         request = self.service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
+        part_path = save_path + '.part'
+        revision_path = part_path + '.rev'
+        offset = 0
+        if os.path.exists(part_path) and os.path.exists(revision_path):
+            with open(revision_path, 'rb') as f:
+                if f.read() == revision:
+                    offset = os.path.getsize(part_path)
+        if not offset:
+            # Written before any data, so a partial file is never resumed
+            # against a revision it did not come from
+            atomic_write(revision_path, revision)
+        
+        with open(part_path, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            while True:
+                resp, content = request.http.request(
+                    request.uri,
+                    'GET',
+                    headers={'range': f"bytes={offset}-{offset + chunk_size - 1}"}
+                )
+                total_size = None
+                if 'content-range' in resp:
+                    total_size = int(resp['content-range'].rsplit('/', 1)[1])
+                
+                if resp.status == 416 and total_size is not None:
+                    # Nothing left at this offset: the partial file is either
+                    # complete already or longer than the file now is
+                    if offset != total_size:
+                        f.truncate(0)
+                        f.seek(0)
+                        offset = 0
+                        continue
+                    break
+                if resp.status == 200:
+                    # The server ignored the range and sent the whole file
+                    f.truncate(0)
+                    f.seek(0)
+                    offset = 0
+                    total_size = len(content)
+                elif resp.status != 206:
+                    from googleapiclient.errors import HttpError
+                    raise HttpError(resp, content, uri=request.uri)
+                    
+                f.write(content)
+                offset += len(content)
+                if total_size is None or offset >= total_size or not content:
+                    break
+            f.truncate()
+            
+        expected_md5 = metadata.get('md5Checksum')
+        if expected_md5 and file_md5(part_path) != expected_md5:
+            os.remove(part_path)
+            os.remove(revision_path)
+            raise DownloadError(f"Downloaded file {file_id} does not match its md5 checksum")
+        os.replace(part_path, save_path)
+        os.remove(revision_path)
         
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
+    def download_range(self, file_id, start, end=None):
+        """
+        Downloads part of a file in a single ranged request
+        Args:
+            file_id (str): ID of the file
+            start (int): Offset of the first byte, or a negative number for
+                the last -start bytes of the file
+            end (int, optional): Offset of the last byte, inclusive; None
+                reads to the end of the file
+        Returns:
+            tuple: (data, total_size) where total_size is the size of the
+                   whole file
+        """
+        if not self.service:
+            self.authenticate()
             
-        fh.seek(0)
-        with open(save_path, 'wb') as f:
-            f.write(fh.read())
+        request = self.service.files().get_media(fileId=file_id)
+        if start < 0:
+            byte_range = f"bytes={start}"
+        else:
+            byte_range = f"bytes={start}-{'' if end is None else end}"
+        resp, content = request.http.request(
+            request.uri, 'GET', headers={'range': byte_range}
+        )
+        
+        if resp.status == 200:
+            # The server ignored the range and sent the whole file
+            total_size = len(content)
+            first = max(total_size + start, 0) if start < 0 else start
+            last = total_size if end is None else end + 1
+            return content[first:last], total_size
+        if resp.status != 206:
+            from googleapiclient.errors import HttpError
+            raise HttpError(resp, content, uri=request.uri)
+        return content, int(resp['content-range'].rsplit('/', 1)[1])
             
     def list_files(self, query=None):
         """
@@ -96,13 +364,200 @@ class GoogleDriveService:
         Returns:
             list: List of file metadata dictionaries
         """
+        return list(self.iter_files(query, fields='id, name, mimeType, createdTime'))
+        
+    def iter_files(self, query=None, page_size=LIST_PAGE_SIZE, fields=FILE_FIELDS):
+        """
+        Lists files in Google Drive page by page, following nextPageToken,
+        so no file is missed however many there are
+        Args:
+            query (str, optional): Search query to filter files
+            page_size (int, optional): Files fetched per request
+            fields (str, optional): File fields to return
+        Yields:
+            dict: File metadata
+        """
         if not self.service:
             self.authenticate()
             
-        results = self.service.files().list(
-            pageSize=10,
-            fields="nextPageToken, files(id, name, mimeType, createdTime)",
-            q=query
-        ).execute()
+        page_token = None
+        while True:
+            results = self.service.files().list(
+                pageSize=page_size,
+                fields=f"nextPageToken, files({fields})",
+                q=query,
+                pageToken=page_token
+            ).execute()
+            yield from results.get('files', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+                
+    def get_changes_start_token(self):
+        """
+        Returns:
+            str: Page token from which list_changes() reports changes made
+                 after this call
+        """
+        if not self.service:
+            self.authenticate()
+            
+        response = self.service.changes().getStartPageToken().execute()
+        return response['startPageToken']
         
-        return results.get('files', [])
\ No newline at end of file
+    def list_changes(self, page_token, page_size=LIST_PAGE_SIZE):
+        """
+        Fetches every change made in Drive since page_token, so remote state
+        can be brought up to date without listing all files again
+        Args:
+            page_token (str): Token from get_changes_start_token() or from a
+                previous call
+            page_size (int, optional): Changes fetched per request
+        Returns:
+            tuple: (changes, new_token) where changes is a list of dicts with
+                   'fileId', 'removed' and, for files that still exist,
+                   'file' metadata; new_token is passed to the next call
+        """
+        if not self.service:
+            self.authenticate()
+            
+        changes = []
+        while True:
+            results = self.service.changes().list(
+                pageToken=page_token,
+                pageSize=page_size,
+                spaces='drive',
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+            ).execute()
+            changes.extend(results.get('changes', []))
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+
+    def upload_note(self, note, file_id=None, http=None):
+        """
+        Uploads a single note as a text file. Notes up to SIMPLE_UPLOAD_LIMIT
+        go out in one multipart request
+        Args:
+            note (dict): The note, with 'id', 'title' and 'content'
+            file_id (str, optional): Drive ID of the note's existing file,
+                which is overwritten instead of creating a new one
+            http (optional): HTTP connection to send the request on, for
+                callers running on worker threads
+        Returns:
+            str: ID of the Drive file holding the note
+        """
+        if not self.service:
+            self.authenticate()
+            
+        from googleapiclient.errors import HttpError
+        payload = note_payload(note['title'], note['content'])
+        file_metadata = {'name': f"{note['title']}.txt"}
+        
+        if file_id:
+            try:
+                file = self.service.files().update(
+                    fileId=file_id,
+                    body=file_metadata,
+                    media_body=self._payload_media(payload),
+                    fields='id'
+                ).execute(http=http)
+                return file.get('id')
+            except HttpError as e:
+                # The file was removed from Drive; upload it again below
+                if e.resp.status != 404:
+                    raise
+        
+        file_metadata['appProperties'] = {'note_id': str(note['id'])}
+        file = self.service.files().create(
+            body=file_metadata,
+            media_body=self._payload_media(payload),
+            fields='id'
+        ).execute(http=http)
+        
+        return file.get('id')
+        
+    def upload_notes_bulk(self, notes):
+        """
+        Uploads many notes concurrently on a bounded pool of threads, so a
+        large first sync is limited by bandwidth rather than by the round
+        trip time of one request after another. At most upload_workers
+        uploads are in flight at once.
+        Args:
+            notes (list): Notes with 'id', 'title' and 'content', and
+                optionally the 'cloud_id' of an existing file to overwrite
+        Returns:
+            list: One UploadResult per note, in the same order; a failed
+                  upload is reported in its result instead of raising
+        """
+        if not self.service:
+            self.authenticate()
+            
+        def upload(note):
+            try:
+                file_id = self.upload_note(
+                    note,
+                    file_id=note.get('cloud_id'),
+                    http=self._thread_http()
+                )
+                return UploadResult(note['id'], file_id, None)
+            except Exception as e:
+                return UploadResult(note['id'], None, e)
+        
+        return list(self._upload_pool().map(upload, notes))
+
+    def _upload_pool(self):
+        """Returns the upload thread pool, starting it on first use."""
+        with self.upload_pool_lock:
+            if self.upload_pool is None:
+                self.upload_pool = ThreadPoolExecutor(
+                    max_workers=self.upload_workers,
+                    thread_name_prefix='drive-upload'
+                )
+            return self.upload_pool
+        
+    def _payload_media(self, payload):
+        """Wraps bytes for upload, resumable only when they are large."""
+        from googleapiclient.http import MediaIoBaseUpload
+        return MediaIoBaseUpload(
+            io.BytesIO(payload),
+            mimetype=NOTE_MIMETYPE,
+            resumable=len(payload) > SIMPLE_UPLOAD_LIMIT
+        )
+        
+    def _thread_http(self):
+        """
+        Returns the calling thread's own authorized HTTP connection, made
+        anew if the user signed in again since it was made.
+        """
+        http = getattr(self.http_local, 'http', None)
+        if http is None or self.http_local.creds is not self.creds:
+            if self.http_factory is not None:
+                http = self.http_factory()
+            else:
+                import httplib2
+                from google_auth_httplib2 import AuthorizedHttp
+                http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self.http_local.http = http
+            self.http_local.creds = self.creds
+        return http
+        
+    def delete_file(self, file_id):
+        """
+        Deletes a file from Google Drive
+        Args:
+            file_id (str): ID of the file to delete
+        Returns:
+            bool: True if the file was deleted, False if it was already gone
+        """
+        if not self.service:
+            self.authenticate()
+            
+        from googleapiclient.errors import HttpError
+        try:
+            self.service.files().delete(fileId=file_id).execute()
+            return True
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
@@ -0,0 +1,102 @@
+# services/outbox_worker.py
+import logging
+import threading
+import time
+
+# Seconds to wait after a note changes before sending, so a burst of
+# autosaves goes out as a single upload of the latest version
+OUTBOX_DEBOUNCE = 2.0
+
+# Longest the worker sleeps while the outbox is empty, as a safety net for
+# changes made without a note event
+OUTBOX_IDLE_INTERVAL = 300.0
+
+class OutboxWorker:
+    """
+    Background thread that drains the database's outbox of cloud operations
+    through SyncService.drain_outbox().
+
+    Saving a note only writes it and its outbox entry to the database, so
+    saves return at once and nothing is lost if the app is closed or offline
+    before the upload; the entry stays until the cloud has the note. The
+    worker wakes when a note changes, waits OUTBOX_DEBOUNCE seconds for
+    further changes, and sends what is due. Entries that failed are picked
+    up again when their backoff expires. Uploads run concurrently, bounded
+    by the cloud's upload_notes_bulk(). While the user is signed out the
+    outbox is left alone until the next change or OUTBOX_IDLE_INTERVAL.
+    """
+    def __init__(self, db, sync, debounce=OUTBOX_DEBOUNCE,
+                 idle_interval=OUTBOX_IDLE_INTERVAL, startup_delay=0.0):
+        """
+        Args:
+            db (DatabaseManager): Database holding the outbox
+            sync (SyncService): Sends the entries
+            debounce (float, optional): Seconds to collect changes for, and
+                the shortest time between two drains
+            idle_interval (float, optional): Longest sleep with an empty
+                outbox
+            startup_delay (float, optional): Seconds to wait after start()
+                before the first drain, so entries left from the last run
+                do not compete with launch
+        """
+        self.db = db
+        self.sync = sync
+        self.debounce = debounce
+        self.idle_interval = idle_interval
+        self.startup_delay = startup_delay
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts the worker thread and begins listening for note changes."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.db.add_note_listener(self.on_note_changed)
+        self.thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the worker after the drain in progress, if any. Entries not
+        sent yet stay in the outbox for the next run.
+        """
+        if self.thread is None:
+            return
+        self.db.remove_note_listener(self.on_note_changed)
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def on_note_changed(self, event, note_id, note=None):
+        """Note listener: the outbox has a new entry."""
+        self.wake()
+
+    def wake(self):
+        """Makes the worker drain the outbox after the debounce delay."""
+        self.wake_event.set()
+
+    def run(self):
+        self.stop_event.wait(self.startup_delay)
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            try:
+                if self.sync.cloud_ready():
+                    self.sync.drain_outbox()
+                    next_attempt = self.db.get_next_outbox_attempt()
+                else:
+                    next_attempt = None
+            except Exception as e:
+                logging.error(f"Failed to drain outbox: {str(e)}")
+                next_attempt = None
+
+            if next_attempt is None:
+                timeout = self.idle_interval
+            else:
+                # Also covers a drain skipped because a sync was running
+                timeout = max(next_attempt - time.time(), self.debounce)
+            if self.wake_event.wait(timeout):
+                # Let a burst of changes settle before sending
+                self.stop_event.wait(self.debounce)
@@ -1,23 +1,201 @@
 # services/storage_service.py
+import copy
+import hashlib
 import json
+import logging
 import os
+import threading
 from datetime import datetime
 
+from Model.database import NoteRepository
+from Utils.atomic_file import atomic_write
+
+# All items live in this one file inside the storage directory; the
+# previous version is kept next to it as a fallback
+STORE_FILE_NAME = 'storage.json'
+BACKUP_FILE_NAME = 'storage.json.bak'
+
+# Seconds writes are collected for before the store is written out, so a
+# burst of store_data() calls costs a single file write
+FLUSH_DELAY = 0.5
+
+# How durably a write must be stored, from most to least durable:
+# FSYNC_ALWAYS writes and fsyncs before store_data() returns, FSYNC_BATCHED
+# fsyncs when the coalesced batch is written, and FSYNC_NEVER leaves the
+# batch for the OS to write back, so a power loss may drop it
+FSYNC_ALWAYS = 'always'
+FSYNC_BATCHED = 'batched'
+FSYNC_NEVER = 'never'
+
+# Policy per key class: an entry applies to every key starting with it and
+# the longest match wins. Keys without a match use FSYNC_BATCHED
+DEFAULT_FSYNC_POLICIES = {
+    # Losing this re-shows the welcome dialog
+    'first_time_setup_complete': FSYNC_ALWAYS,
+    'cache.': FSYNC_NEVER,
+}
+
+def items_checksum(items):
+    """Returns the SHA-256 hex digest of the canonical JSON form of items."""
+    canonical = json.dumps(items, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
 class StorageService:
-    def __init__(self, db):
+    """
+    Small key/value store for app data such as flags and preferences, and
+    the app's entry point to notes, which are kept in the database and
+    reached through self.notes (a NoteRepository).
+
+    Every item is kept in a single compact JSON file that is read once and
+    then served from memory. Writes only update the in-memory copy and
+    schedule a flush; all writes made within FLUSH_DELAY seconds go to disk
+    together, through a temporary file renamed over the store, so the file
+    is never left half-written. Call flush() before exiting.
+
+    How durably each key is written is chosen by its fsync policy (see
+    DEFAULT_FSYNC_POLICIES). The store carries a checksum of its items; if
+    the file is damaged anyway, the previous version is loaded instead of
+    silently losing every item.
+    """
+    def __init__(self, db, base_dir=None, flush_delay=FLUSH_DELAY,
+                 fsync_policies=None, checksums=True):
+        """
+        Args:
+            db (DatabaseManager): The app database
+            base_dir (str, optional): Storage directory instead of data/
+            flush_delay (float, optional): Seconds to coalesce writes for;
+                0 writes every change immediately
+            fsync_policies (dict, optional): Key prefix to FSYNC_* policy,
+                replacing DEFAULT_FSYNC_POLICIES
+            checksums (bool, optional): Whether to write a checksum of the
+                items; stored checksums are verified either way
+        """
         self.db = db
+        self.notes = NoteRepository(db) if db is not None else None
         # Initialize with a base directory for storing data
-        self.base_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
+        self.base_dir = base_dir or os.path.join(os.path.dirname(__file__), '..', 'data')
         self.ensure_storage_directory()
-    
+        self.store_path = os.path.join(self.base_dir, STORE_FILE_NAME)
+        self.backup_path = os.path.join(self.base_dir, BACKUP_FILE_NAME)
+
+        self.flush_delay = flush_delay
+        self.fsync_policies = dict(
+            DEFAULT_FSYNC_POLICIES if fsync_policies is None else fsync_policies
+        )
+        self.checksums = checksums
+        self.lock = threading.RLock()
+        self.flush_timer = None
+        self.dirty = False
+        # Whether the pending batch holds a write that has to be fsynced
+        self.fsync_pending = False
+        # Loaded on first use; maps key to {'timestamp', 'content'}
+        self.items = None
+        # Per-key files from before the single store, deleted once their
+        # items have been written to it
+        self.legacy_files = []
+
+    def save_note(self, note):
+        """
+        Saves a note to the database
+        Args:
+            note (Note): The note to create or update
+        Returns:
+            int: The ID of the note
+        """
+        return self.notes.save(note)
+
+    def get_note(self, note_id):
+        """
+        Retrieves a note with its content
+        Args:
+            note_id (int): The ID of the note
+        Returns:
+            Note: The note, or None if not found
+        """
+        return self.notes.get(note_id)
+
+    def get_all_notes(self):
+        """
+        Returns every note, newest first. Only titles and previews are read;
+        each note's content is loaded when first accessed
+        """
+        return self.notes.list_all()
+
+    def delete_note(self, note_id):
+        """Soft deletes a note"""
+        self.notes.delete(note_id)
+
     def ensure_storage_directory(self):
         """Creates the storage directory if it doesn't exist"""
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
-    
+
+    def fsync_policy(self, key):
+        """Returns the FSYNC_* policy for a key."""
+        matches = [prefix for prefix in self.fsync_policies if key.startswith(prefix)]
+        if not matches:
+            return FSYNC_BATCHED
+        return self.fsync_policies[max(matches, key=len)]
+
+    def _load(self):
+        """
+        Reads the store into memory, falling back to the previous version if
+        the store is damaged, and importing old per-key files once.
+        """
+        if self.items is not None:
+            return
+        for path in (self.store_path, self.backup_path):
+            items = self._read_store(path)
+            if items is not None:
+                if path == self.backup_path:
+                    logging.warning("Storage file was damaged; restored the previous version")
+                    self.dirty = True
+                self.items = items
+                return
+        self.items = {}
+        self._import_legacy_files()
+
+    def _read_store(self, path):
+        """Returns the items in a store file, or None if missing or damaged."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable storage file {path}: {str(e)}")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('items'), dict):
+            logging.warning(f"Ignoring malformed storage file {path}")
+            return None
+        checksum = data.get('checksum')
+        if checksum is not None and checksum != items_checksum(data['items']):
+            logging.warning(f"Ignoring storage file {path} with a bad checksum")
+            return None
+        return data['items']
+
+    def _import_legacy_files(self):
+        """Copies items stored as <key>.json files into the store."""
+        for file_name in os.listdir(self.base_dir):
+            if not file_name.endswith('.json') or file_name == STORE_FILE_NAME:
+                continue
+            file_path = os.path.join(self.base_dir, file_name)
+            try:
+                with open(file_path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if isinstance(data, dict) and 'content' in data:
+                self.items[os.path.splitext(file_name)[0]] = data
+                self.legacy_files.append(file_path)
+        if self.legacy_files:
+            self.dirty = True
+            self.fsync_pending = True
+            self.flush()
+
     def store_data(self, key, data):
         """
-        Stores data in a JSON file with the given key
+        Stores data under the given key
         Args:
             key (str): Identifier for the data
             data (dict): Data to store
@@ -25,13 +203,14 @@ class StorageService:
         # Add metadata to track when the data was stored
         data_with_metadata = {
             'timestamp': datetime.now().isoformat(),
-            'content': data
+            'content': copy.deepcopy(data)
         }
-        
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        with open(file_path, 'w') as f:
-            json.dump(data_with_metadata, f, indent=4)
-            
+
+        with self.lock:
+            self._load()
+            self.items[key] = data_with_metadata
+            self._schedule_flush(self.fsync_policy(key))
+
     def retrieve_data(self, key):
         """
         Retrieves data stored under the given key
@@ -40,19 +219,17 @@ class StorageService:
         Returns:
             dict: The stored data, or None if not found
         """
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                return data['content']
-        except (FileNotFoundError, json.JSONDecodeError, KeyError):
-            return None
-            
+        with self.lock:
+            self._load()
+            item = self.items.get(key)
+            return copy.deepcopy(item['content']) if item else None
+
     def list_stored_items(self):
         """Returns a list of all stored item keys"""
-        files = os.listdir(self.base_dir)
-        return [os.path.splitext(f)[0] for f in files if f.endswith('.json')]
-        
+        with self.lock:
+            self._load()
+            return list(self.items)
+
     def delete_data(self, key):
         """
         Deletes data stored under the given key
@@ -61,9 +238,51 @@ class StorageService:
         Returns:
             bool: True if deletion was successful, False otherwise
         """
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        try:
-            os.remove(file_path)
+        with self.lock:
+            self._load()
+            if self.items.pop(key, None) is None:
+                return False
+            self._schedule_flush(self.fsync_policy(key))
             return True
-        except FileNotFoundError:
-            return False
\ No newline at end of file
+
+    def _schedule_flush(self, policy):
+        """
+        Marks the store changed and makes sure a flush is pending, or
+        flushes now for FSYNC_ALWAYS.
+        """
+        self.dirty = True
+        if policy != FSYNC_NEVER:
+            self.fsync_pending = True
+        if policy == FSYNC_ALWAYS or self.flush_delay <= 0:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
+    def flush(self):
+        """Writes pending changes to disk now."""
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if not self.dirty:
+                return
+            data = {'items': self.items}
+            if self.checksums:
+                data['checksum'] = items_checksum(self.items)
+            atomic_write(
+                self.store_path,
+                json.dumps(data, separators=(',', ':')).encode('utf-8'),
+                fsync=self.fsync_pending,
+                backup_path=self.backup_path
+            )
+            self.dirty = False
+            self.fsync_pending = False
+
+            for file_path in self.legacy_files:
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            self.legacy_files = []
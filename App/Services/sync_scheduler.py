@@ -0,0 +1,176 @@
+# services/sync_scheduler.py
+import logging
+import threading
+import time
+
+# Seconds after start() before the first sync, so it does not compete with
+# launch for CPU and I/O
+STARTUP_SYNC_DELAY = 10.0
+
+# Bounds of the interval between periodic syncs. The interval starts at
+# MIN_SYNC_INTERVAL, doubles after every sync that found nothing to do or
+# failed, and drops back to the minimum when something changed
+MIN_SYNC_INTERVAL = 60.0
+MAX_SYNC_INTERVAL = 1800.0
+
+# Seconds without edits before a burst of edits is synced. A burst that
+# keeps going is synced MIN_SYNC_INTERVAL after its first edit at the latest
+EDIT_SYNC_DELAY = 15.0
+
+# Result counts that mean a sync found something to do. Failures are not
+# activity: an offline device backs off instead of retrying every minute
+ACTIVITY_KEYS = ('uploaded', 'deleted', 'unchanged', 'remote_changes')
+
+class SyncScheduler:
+    """
+    Runs SyncService.sync_notes() in the background, as often as the notes
+    actually change.
+
+    Syncs run on an adaptive interval: quiet periods and failing syncs back
+    off exponentially up to MAX_SYNC_INTERVAL, while edits bring the next sync forward and
+    reset the interval, so steady-state sync load follows the edit rate.
+    A burst of edits is coalesced into a single sync once it settles. A run
+    that finds another sync in flight is skipped and retried later rather
+    than queued behind it. A run while the user is signed out counts as a
+    failure, so it backs off and never prompts for sign-in.
+    """
+    def __init__(self, db, sync, startup_delay=STARTUP_SYNC_DELAY,
+                 min_interval=MIN_SYNC_INTERVAL, max_interval=MAX_SYNC_INTERVAL,
+                 edit_delay=EDIT_SYNC_DELAY, clock=time.monotonic):
+        """
+        Args:
+            db (DatabaseManager): Database whose note changes trigger syncs
+            sync (SyncService): Performs the syncs
+            startup_delay (float, optional): Seconds before the first sync
+            min_interval (float, optional): Shortest interval between syncs
+            max_interval (float, optional): Longest interval between syncs
+            edit_delay (float, optional): Quiet seconds after an edit before
+                syncing it
+            clock (callable, optional): Monotonic time source in seconds
+        """
+        self.db = db
+        self.sync = sync
+        self.startup_delay = startup_delay
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.edit_delay = edit_delay
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.interval = min_interval
+        # When the next periodic sync is due, None until start()
+        self.periodic_run_at = None
+        # When the pending burst of edits is due to be synced, and the latest
+        # it may be pushed back to; None while no edits are pending
+        self.edit_run_at = None
+        self.edit_deadline = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.last_result = None
+
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Schedules the first sync and starts the scheduler thread."""
+        if self.thread is not None:
+            return
+        with self.lock:
+            self.periodic_run_at = self.clock() + self.startup_delay
+        self.stop_event.clear()
+        self.db.add_note_listener(self.on_note_changed)
+        self.thread = threading.Thread(target=self.run, name='sync-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the scheduler after the sync in progress, if any."""
+        if self.thread is None:
+            return
+        self.db.remove_note_listener(self.on_note_changed)
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def on_note_changed(self, event, note_id, note=None):
+        """
+        Note listener: schedules a sync EDIT_SYNC_DELAY after this edit, but
+        no later than MIN_SYNC_INTERVAL after the first edit of the burst,
+        and resets the interval.
+        """
+        with self.lock:
+            now = self.clock()
+            if self.edit_deadline is None:
+                self.edit_deadline = now + self.min_interval
+            self.edit_run_at = min(now + self.edit_delay, self.edit_deadline)
+            self.interval = self.min_interval
+        self.wake_event.set()
+
+    def request_sync(self):
+        """Runs a sync as soon as possible."""
+        with self.lock:
+            self.periodic_run_at = self.clock()
+        self.wake_event.set()
+
+    @property
+    def next_run_at(self):
+        """When the next sync is due, or None before start()."""
+        times = [t for t in (self.periodic_run_at, self.edit_run_at) if t is not None]
+        return min(times) if times else None
+
+    def seconds_until_next_run(self):
+        """Returns how long until the next sync is due, never negative."""
+        with self.lock:
+            if self.next_run_at is None:
+                return self.max_interval
+            return max(self.next_run_at - self.clock(), 0.0)
+
+    def tick(self):
+        """
+        Runs a sync if one is due and schedules the next.
+
+        Returns:
+            dict: The sync result, or None if no sync was due or another
+                  sync was in flight
+        """
+        with self.lock:
+            if self.next_run_at is None or self.clock() < self.next_run_at:
+                return None
+            # Edits made from here on need another sync
+            self.edit_run_at = None
+            self.edit_deadline = None
+
+        try:
+            if not self.sync.cloud_ready():
+                raise Exception("Not signed in to the cloud")
+            result = self.sync.sync_notes()
+        except Exception as e:
+            logging.error(f"Scheduled sync failed: {str(e)}")
+            result = None
+            failed = True
+        else:
+            failed = False
+
+        with self.lock:
+            if result is None and not failed:
+                # Another sync is in flight; check back soon
+                self.skipped_runs += 1
+                delay = self.min_interval
+            else:
+                self.runs += 1
+                self.last_result = result
+                if (not failed and not result.get('failed')
+                        and any(result.get(key) for key in ACTIVITY_KEYS)):
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.interval * 2, self.max_interval)
+                delay = self.interval
+            self.periodic_run_at = self.clock() + delay
+        return result
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            self.tick()
+            self.wake_event.wait(self.seconds_until_next_run())
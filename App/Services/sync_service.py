@@ -0,0 +1,275 @@
+# services/sync_service.py
+import logging
+import random
+import threading
+import time
+
+from Model.note import note_payload
+from Utils.database import DRIVE_CHANGES_TOKEN_KEY
+
+# Number of pending notes read from the database at a time while syncing
+SYNC_BATCH_SIZE = 100
+
+# Seconds before a failed outbox entry is retried: doubles with every failed
+# attempt, from OUTBOX_RETRY_BASE up to OUTBOX_RETRY_MAX
+OUTBOX_RETRY_BASE = 5.0
+OUTBOX_RETRY_MAX = 3600.0
+
+def retry_delay(attempts, base=OUTBOX_RETRY_BASE, maximum=OUTBOX_RETRY_MAX):
+    """
+    Returns the seconds to wait before retrying an operation that has now
+    failed attempts + 1 times. The delay is jittered between half and all
+    of the exponential backoff, so devices that failed together do not all
+    retry together.
+    """
+    delay = min(base * 2 ** attempts, maximum)
+    return random.uniform(delay / 2, delay)
+
+class SyncService:
+    """
+    Incrementally pushes local note changes to cloud storage.
+
+    Only notes whose sync_status is 'not_synced' are visited, through the
+    partial index over pending notes, so the cost of a sync grows with the
+    number of changed notes rather than the size of the library. Every write
+    to a note marks it pending again, so a pending note is exactly one whose
+    updated_at is later than the last_synced recorded for it. The Drive file
+    ID of every synced note is kept in sync_metadata, so edits overwrite the
+    same file and deletions know which file to remove.
+
+    Remote state is mirrored in the drive_files table. The first sync lists
+    Drive once; later ones only fetch the changes feed since the stored page
+    token, and a note whose file disappeared from Drive is queued to upload
+    again.
+
+    Every pending note also has an entry in the database's outbox, which
+    drain_outbox() works through on behalf of the OutboxWorker: entries due
+    now are sent, and failed ones are retried later with exponential
+    backoff. sync_notes() ignores the backoff and sends every pending note.
+
+    A pending note whose content hash equals the cached md5Checksum of its
+    Drive file is already stored there (for example after a save with no
+    edits) and is marked synced without sending anything. bytes_sent and
+    bytes_skipped count payload bytes uploaded and avoided since the service
+    was created.
+    """
+    def __init__(self, db, cloud, batch_size=SYNC_BATCH_SIZE):
+        """
+        Args:
+            db (DatabaseManager): Local note storage
+            cloud: Cloud backend providing authenticate(interactive),
+                upload_notes_bulk(notes), delete_file(file_id), iter_files(query),
+                get_changes_start_token() and list_changes(page_token),
+                normally a GoogleDriveService
+            batch_size (int, optional): Pending notes read per query
+        """
+        self.db = db
+        self.cloud = cloud
+        self.batch_size = batch_size
+        self.sync_lock = threading.Lock()
+        self.last_result = None
+        self.bytes_sent = 0
+        self.bytes_skipped = 0
+
+    def cloud_ready(self):
+        """
+        Makes sure the cloud client can be used without prompting for
+        sign-in. Background callers check this first, so a signed-out user
+        is never shown the browser sign-in from a worker thread.
+
+        Returns:
+            bool: True if the cloud can be used now
+        """
+        try:
+            return self.cloud.authenticate(interactive=False)
+        except Exception as e:
+            logging.warning(f"Cloud credentials unavailable: {str(e)}")
+            return False
+
+    def sync_notes(self):
+        """
+        Pushes every pending change: new and edited notes are uploaded (over
+        their existing Drive file when there is one) and soft-deleted notes
+        are removed from Drive. A note that fails stays pending and is
+        retried on the next sync. If a sync is already running this returns
+        immediately.
+
+        Returns:
+            dict: Counts of 'uploaded', 'deleted', 'unchanged' and 'failed'
+                  notes, of Drive files changed or removed remotely as
+                  'remote_changes', and of 'bytes_sent' and 'bytes_skipped',
+                  or None if another sync was already in progress
+        """
+        if not self.sync_lock.acquire(blocking=False):
+            logging.info("Cloud sync already in progress, skipping")
+            return None
+
+        try:
+            result = self._new_result()
+            try:
+                remote = self.refresh_remote_files()
+                result['remote_changes'] = remote['changed'] + remote['removed']
+            except Exception as e:
+                # Uploads do not depend on the cache, so sync them anyway
+                logging.error(f"Failed to refresh Drive file cache: {str(e)}")
+
+            after = None
+            while True:
+                batch = self.db.get_notes_pending_sync(limit=self.batch_size, after=after)
+                if not batch:
+                    break
+                self.sync_batch(batch, result)
+                last = batch[-1]
+                after = (last['updated_at'], last['id'])
+
+            logging.info(f"Cloud sync finished: {result}")
+            self._finish(result)
+            return result
+        finally:
+            self.sync_lock.release()
+
+    def drain_outbox(self):
+        """
+        Sends every outbox entry that is due. An entry whose operation fails
+        stays in the outbox and is retried after retry_delay(); one that
+        succeeds is removed when its note is marked synced. If a sync is
+        already running this returns immediately.
+
+        Returns:
+            dict: Counts as for sync_notes(), or None if another sync was
+                  already in progress
+        """
+        if not self.sync_lock.acquire(blocking=False):
+            return None
+
+        try:
+            result = self._new_result()
+            # Entries attempted in this drain, by (note ID, version): a
+            # version that comes back due is left for the next drain
+            attempted = set()
+            while True:
+                due = [
+                    note for note in self.db.get_outbox_due(time.time(), limit=self.batch_size)
+                    if (note['id'], note['version']) not in attempted
+                ]
+                if not due:
+                    break
+                attempted.update((note['id'], note['version']) for note in due)
+                for note, error in self.sync_batch(due, result):
+                    self.db.record_outbox_failure(
+                        note['id'], note['version'], str(error),
+                        time.time() + retry_delay(note['attempts'])
+                    )
+
+            if any(result.values()):
+                logging.info(f"Outbox drained: {result}")
+            self._finish(result)
+            return result
+        finally:
+            self.sync_lock.release()
+
+    @staticmethod
+    def _new_result():
+        return {'uploaded': 0, 'deleted': 0, 'unchanged': 0, 'failed': 0,
+                'remote_changes': 0, 'bytes_sent': 0, 'bytes_skipped': 0}
+
+    def _finish(self, result):
+        """Adds a finished sync's byte counts to the running totals."""
+        self.bytes_sent += result['bytes_sent']
+        self.bytes_skipped += result['bytes_skipped']
+        self.last_result = result
+
+    def refresh_remote_files(self):
+        """
+        Brings the local cache of Drive file metadata up to date: a full
+        listing the first time, and only the changes since the last refresh
+        after that.
+
+        Returns:
+            dict: Counts of 'changed' and 'removed' files; after the first
+                  listing, only files whose content differs from the cache
+        """
+        page_token = self.db.get_setting(DRIVE_CHANGES_TOKEN_KEY)
+        if page_token is None:
+            # Take the token first so changes made during the listing are
+            # fetched again next time rather than lost
+            page_token = self.cloud.get_changes_start_token()
+            files = list(self.cloud.iter_files(query="trashed = false"))
+            self.db.replace_drive_files(files, page_token)
+            return {'changed': len(files), 'removed': 0}
+
+        changes, new_token = self.cloud.list_changes(page_token)
+        files, removed_ids = [], []
+        for change in changes:
+            file = change.get('file')
+            if change.get('removed') or file is None or file.get('trashed'):
+                removed_ids.append(change['fileId'])
+            else:
+                files.append(file)
+        changed, removed = self.db.apply_drive_changes(files, removed_ids, new_token)
+        return {'changed': changed, 'removed': removed}
+
+    def sync_batch(self, batch, result):
+        """
+        Syncs one batch of pending notes: deletions one by one, then all
+        uploads together through the cloud's concurrent bulk upload. Notes
+        Drive already holds are marked synced without uploading.
+
+        Args:
+            batch (list): Rows from DatabaseManager.get_notes_pending_sync()
+            result (dict): Counts updated in place
+
+        Returns:
+            list: (note, error) for every note that failed
+        """
+        failures = []
+        uploads = []
+        payload_sizes = {}
+        for note in batch:
+            if not note['is_deleted']:
+                size = len(note_payload(note['title'], note['content']))
+                if note['cloud_id'] and note['content_hash'] == note['remote_md5']:
+                    self.db.mark_note_synced(note, note['cloud_id'])
+                    result['unchanged'] += 1
+                    result['bytes_skipped'] += size
+                else:
+                    uploads.append(note)
+                    payload_sizes[note['id']] = size
+                continue
+            try:
+                result[self.sync_deletion(note)] += 1
+            except Exception as e:
+                logging.error(f"Failed to sync deletion of note {note['id']}: {str(e)}")
+                result['failed'] += 1
+                failures.append((note, e))
+
+        if not uploads:
+            return failures
+        notes_by_id = {note['id']: note for note in uploads}
+        for upload in self.cloud.upload_notes_bulk(uploads):
+            if upload.error is not None:
+                logging.error(f"Failed to upload note {upload.note_id}: {str(upload.error)}")
+                result['failed'] += 1
+                failures.append((notes_by_id[upload.note_id], upload.error))
+                continue
+            self.db.mark_note_synced(notes_by_id[upload.note_id], upload.file_id)
+            result['uploaded'] += 1
+            result['bytes_sent'] += payload_sizes[upload.note_id]
+        return failures
+
+    def sync_deletion(self, note):
+        """
+        Removes a soft-deleted note's file from the cloud, if it has one.
+
+        Args:
+            note (dict): A deleted row from get_notes_pending_sync()
+
+        Returns:
+            str: 'deleted', or 'unchanged' if the note was never uploaded
+        """
+        outcome = 'unchanged'
+        if note['cloud_id']:
+            self.cloud.delete_file(note['cloud_id'])
+            outcome = 'deleted'
+        self.db.mark_note_deletion_synced(note['id'], note['updated_at'])
+        return outcome
@@ -0,0 +1,91 @@
+# utils/atomic_file.py
+
+import os
+import shutil
+import tempfile
+
+
+def atomic_write(path, data, fsync=True, backup_path=None):
+    """
+    Replaces the contents of a file so that readers, and the file after a
+    crash, see either the old or the new contents but never a mix.
+
+    The data is written to a temporary file in the same directory, flushed
+    and optionally fsynced, then renamed over path. With fsync the rename
+    is made durable too, so the new contents survive a power loss.
+
+    The previous contents are kept in backup_path by hard-linking (or, where
+    links are not supported, copying) the current file before the rename,
+    so path itself exists at every moment.
+
+    Args:
+        path (str): File to replace
+        data (bytes): New contents
+        fsync (bool, optional): Wait for the data to reach the disk
+        backup_path (str, optional): Where to keep the previous contents
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        if backup_path is not None and os.path.exists(path):
+            keep_backup(path, backup_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        fsync_directory(directory)
+
+
+def keep_backup(path, backup_path):
+    """
+    Replaces backup_path with the current contents of path, leaving path
+    where it is.
+    """
+    directory = os.path.dirname(os.path.abspath(backup_path))
+    fd, link_path = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(backup_path)}.", suffix='.tmp'
+    )
+    os.close(fd)
+    try:
+        os.remove(link_path)
+        try:
+            os.link(path, link_path)
+        except OSError:
+            # Filesystems such as FAT on external storage have no hard links
+            shutil.copy2(path, link_path)
+        os.replace(link_path, backup_path)
+    except BaseException:
+        try:
+            os.remove(link_path)
+        except OSError:
+            pass
+        raise
+
+
+def fsync_directory(directory):
+    """
+    Makes renames within directory durable. Does nothing on platforms that
+    cannot open directories, such as Windows.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,148 @@
+# utils/connection_pool.py
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    A small pool of SQLite connections that can be shared between threads.
+
+    There is exactly one writer connection, guarded by a re-entrant lock, so
+    writes are serialized the way SQLite requires. Reads are served by up to
+    max_readers extra connections which, in WAL mode, run concurrently with
+    the writer and with each other. A thread that currently holds the writer
+    reads through the writer connection, so it sees its own uncommitted
+    changes.
+
+    Every connection is opened with check_same_thread=False, which is safe
+    here because a connection is only ever used by one thread at a time.
+    """
+    def __init__(self, db_path, configure=None, max_readers=3, timeout=5.0,
+                 main_thread_observer=None):
+        """
+        Opens the writer connection. Reader connections are opened lazily.
+
+        Args:
+            db_path (str): Path of the SQLite database file
+            configure (callable, optional): Called with every new connection,
+                e.g. to apply PRAGMA settings
+            max_readers (int, optional): Maximum number of reader connections
+            timeout (float, optional): Seconds to wait on a locked database
+            main_thread_observer (callable, optional): Called with the number
+                of seconds each use of the pool blocked the main thread,
+                including time spent waiting for a connection
+        """
+        self.db_path = db_path
+        self.configure = configure
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self.main_thread_observer = main_thread_observer
+
+        self.writer_lock = threading.RLock()
+        self.writer_connection = self._open()
+
+        self.idle_readers = queue.LifoQueue()
+        self.reader_count = 0
+        self.reader_count_lock = threading.Lock()
+        self.all_readers = []
+
+        # Per-thread depth of writer() blocks, so reader() can tell whether
+        # the calling thread already owns the writer
+        self.local = threading.local()
+
+    def _open(self):
+        """Opens and configures a new connection."""
+        connection = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False
+        )
+        if self.configure:
+            self.configure(connection)
+        return connection
+
+    def holds_writer(self):
+        """Returns True if the calling thread is inside a writer() block."""
+        return getattr(self.local, 'writer_depth', 0) > 0
+
+    @contextmanager
+    def writer(self):
+        """
+        Yields the writer connection, holding the writer lock for the whole
+        block. Blocks are re-entrant within the same thread.
+        """
+        started = self._start_main_thread_timer()
+        try:
+            with self.writer_lock:
+                self.local.writer_depth = getattr(self.local, 'writer_depth', 0) + 1
+                try:
+                    yield self.writer_connection
+                finally:
+                    self.local.writer_depth -= 1
+        finally:
+            self._stop_main_thread_timer(started)
+
+    @contextmanager
+    def reader(self):
+        """
+        Yields a connection for reading. Reuses an idle reader, opens a new
+        one while fewer than max_readers exist, and otherwise waits for one
+        to be returned.
+        """
+        if self.holds_writer():
+            yield self.writer_connection
+            return
+
+        started = self._start_main_thread_timer()
+        connection = self._acquire_reader()
+        try:
+            yield connection
+        finally:
+            # Never hand a reader back with a read transaction still open,
+            # or it would pin an old snapshot of the database
+            if connection.in_transaction:
+                connection.rollback()
+            self.idle_readers.put(connection)
+            self._stop_main_thread_timer(started)
+
+    def _start_main_thread_timer(self):
+        """
+        Returns the start time of an outermost pool use on the main thread,
+        or None when there is nothing to measure.
+        """
+        if (self.main_thread_observer is None
+                or self.holds_writer()
+                or threading.current_thread() is not threading.main_thread()):
+            return None
+        return time.perf_counter()
+
+    def _stop_main_thread_timer(self, started):
+        if started is not None:
+            self.main_thread_observer(time.perf_counter() - started)
+
+    def _acquire_reader(self):
+        try:
+            return self.idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.reader_count_lock:
+            if self.reader_count < self.max_readers:
+                self.reader_count += 1
+                connection = self._open()
+                self.all_readers.append(connection)
+                return connection
+
+        return self.idle_readers.get()
+
+    def close(self):
+        """Closes every connection in the pool."""
+        with self.writer_lock:
+            self.writer_connection.close()
+        for connection in self.all_readers:
+            connection.close()
+        self.all_readers = []
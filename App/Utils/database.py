@@ -1,8 +1,127 @@
 # utils/database.py
 
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
+import logging
 import os
+import threading
+import zlib
+
+from Model.note import note_content_hash
+from Utils.connection_pool import ConnectionPool
+from Utils.db_executor import MainThreadMonitor
+
+# Events passed to note change listeners
+NOTE_CREATED = 'created'
+NOTE_UPDATED = 'updated'
+NOTE_DELETED = 'deleted'
+# Sent once for bulk writes; listeners should reload rather than patch rows
+NOTES_BULK_CHANGED = 'bulk_changed'
+
+# Note bodies longer than this many bytes of UTF-8 are stored zlib-compressed
+# in content_compressed instead of as plain text in content
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 6
+
+# Characters of each note's content kept uncompressed in the preview column,
+# which the notes list reads instead of the body
+STORED_PREVIEW_LENGTH = 100
+
+# Marks FTS snippet() puts around matches. Control characters cannot clash
+# with note text, which is escaped before they become Kivy markup
+SNIPPET_MATCH_START = '\x02'
+SNIPPET_MATCH_END = '\x03'
+
+# Settings key holding the Drive changes page token that drive_files is
+# up to date with
+DRIVE_CHANGES_TOKEN_KEY = 'drive_changes_token'
+
+# PRAGMA settings applied to every new connection, by profile name.
+# 'balanced' is the default: WAL journaling lets readers run alongside the
+# writer, and synchronous=NORMAL only fsyncs at WAL checkpoints, so a commit
+# can lose the last transactions on power loss but never corrupts the file.
+# 'durable' fsyncs every commit and 'legacy' reproduces the original plain
+# rollback-journal connection, which is useful as a benchmark baseline.
+CONNECTION_PROFILES = {
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -8192,       # negative means KiB, so 8 MiB
+        'mmap_size': 67108864,     # 64 MiB
+        'temp_store': 'MEMORY',
+    },
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8192,
+        'mmap_size': 67108864,
+        'temp_store': 'MEMORY',
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+}
+DEFAULT_CONNECTION_PROFILE = 'balanced'
+
+# Reader connections kept alongside the single writer connection
+DEFAULT_MAX_READERS = 3
+
+def snippet_markup(snippet):
+    """
+    Turns an FTS snippet into Kivy markup with the matches in bold. The
+    text is escaped as kivy.utils.escape_markup() does, so brackets in a
+    note are shown as typed rather than read as markup tags.
+    """
+    text = snippet.replace('&', '&amp;').replace('[', '&bl;').replace(']', '&br;')
+    return text.replace(SNIPPET_MATCH_START, '[b]').replace(SNIPPET_MATCH_END, '[/b]')
+
+def encode_note_body(content, threshold=COMPRESSION_THRESHOLD):
+    """
+    Splits note content into the values stored for it.
+    
+    Args:
+        content (str): The note content
+        threshold (int, optional): Compress bodies larger than this many
+            bytes; None never compresses
+        
+    Returns:
+        tuple: (content, content_compressed, preview, content_length), where
+               exactly one of content and content_compressed is set for a
+               non-empty note
+    """
+    if content is None:
+        return None, None, None, 0
+    preview = content[:STORED_PREVIEW_LENGTH]
+    if threshold is not None:
+        data = content.encode('utf-8')
+        if len(data) > threshold:
+            compressed = zlib.compress(data, COMPRESSION_LEVEL)
+            # Incompressible text is cheaper to keep as it is
+            if len(compressed) < len(data):
+                return None, compressed, preview, len(content)
+    return content, None, preview, len(content)
+
+def decode_note_body(content, content_compressed):
+    """
+    Returns the full content of a note from its stored columns. Registered
+    on every connection as the SQL function note_body(content,
+    content_compressed), which queries, the search index and its triggers
+    use to read bodies.
+    """
+    if content_compressed is None:
+        return content
+    return zlib.decompress(content_compressed).decode('utf-8')
+
+def register_sql_functions(connection):
+    """
+    Registers the SQL functions the schema relies on on a connection. The
+    search index triggers and the view the index reads from call
+    note_body(), so writing to notes or searching on a connection without
+    it fails with "no such function: note_body".
+    """
+    connection.create_function('note_body', 2, decode_note_body, deterministic=True)
 
 class DatabaseManager:
     """
@@ -10,78 +129,712 @@ class DatabaseManager:
     Uses SQLite as the backend database engine for local storage.
     
     The database stores notes with their metadata and user settings.
+    
+    The schema depends on the application-defined SQL function note_body(),
+    which every connection the manager opens registers. Any other
+    connection to the same file, such as a maintenance script or the
+    sqlite3 shell, must call register_sql_functions() before inserting,
+    updating or searching notes. Reading the notes table itself works
+    without it.
     """
-    def __init__(self):
+    # Schema migrations as (user_version, method name), applied in order by
+    # migrate(). Append new entries here; never edit or reorder old ones.
+    SCHEMA_MIGRATIONS = [
+        (1, '_migrate_base_tables'),
+        (2, '_migrate_search_index'),
+        (3, '_migrate_query_indexes'),
+        (4, '_migrate_drive_files'),
+        (5, '_migrate_compressed_content'),
+        (6, '_migrate_content_hash'),
+        (7, '_migrate_changed_notes_index'),
+        (8, '_migrate_outbox'),
+        (9, '_migrate_note_uuid'),
+    ]
+
+    def __init__(self, db_path=None, profile=DEFAULT_CONNECTION_PROFILE,
+                 max_readers=DEFAULT_MAX_READERS,
+                 compression_threshold=COMPRESSION_THRESHOLD):
         """
         Initializes the database connection and ensures the database directory exists.
         Creates a new database file if it doesn't exist.
+        
+        Args:
+            db_path (str, optional): Database file to use instead of data/notes.db
+            profile (str or dict, optional): Name of an entry in
+                CONNECTION_PROFILES, or a dict of PRAGMA settings
+            max_readers (int, optional): Number of reader connections that
+                may serve queries concurrently with the writer
+            compression_threshold (int, optional): Bytes above which note
+                bodies are stored compressed; None stores every body as text
         """
-        # Create the data directory if it doesn't exist
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-        os.makedirs(data_dir, exist_ok=True)
+        if db_path is None:
+            # Create the data directory if it doesn't exist
+            data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
+            os.makedirs(data_dir, exist_ok=True)
+            
+            # Set up the database file path
+            db_path = os.path.join(data_dir, 'notes.db')
+        self.db_path = db_path
+        
+        if isinstance(profile, str):
+            if profile not in CONNECTION_PROFILES:
+                raise ValueError(f"Unknown connection profile: {profile}")
+            profile = CONNECTION_PROFILES[profile]
+        self.connection_profile = dict(profile)
         
-        # Set up the database file path
-        self.db_path = os.path.join(data_dir, 'notes.db')
+        self.max_readers = max_readers
+        self.compression_threshold = compression_threshold
         
         # Initialize the database connection
+        self.pool = None
         self.connection = None
-        self.cursor = None
+        
+        # Callbacks notified whenever a note is created, updated or deleted
+        self.note_listeners = []
+        
+        # Per-thread nesting depth of transaction() blocks, and the note
+        # events held back until the outermost block commits
+        self.transaction_state = threading.local()
+        
+        # Tracks how long database calls block the UI thread
+        self.main_thread_monitor = MainThreadMonitor()
         
         # Establish the initial connection
         self.connect()
 
     def connect(self):
         """
-        Establishes a connection to the SQLite database.
-        Creates a new connection if one doesn't exist.
+        Establishes the pool of connections to the SQLite database.
+        
+        The pool has a single writer connection (also available as
+        self.connection) and up to max_readers reader connections, so worker
+        threads can query and write while the UI thread keeps reading.
+        Every method takes its own cursor, so calls from different threads
+        never share one.
         """
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.cursor = self.connection.cursor()
+            self.pool = ConnectionPool(
+                self.db_path,
+                configure=self.configure_connection,
+                max_readers=self.max_readers,
+                main_thread_observer=self.main_thread_monitor.record
+            )
+            self.connection = self.pool.writer_connection
         except sqlite3.Error as e:
             raise Exception(f"Failed to connect to database: {str(e)}")
 
+    def close(self):
+        """Closes every connection to the database."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+            self.connection = None
+
+    def configure_connection(self, connection):
+        """
+        Prepares a freshly opened connection: applies the connection profile
+        and registers the SQL functions the schema relies on.
+        """
+        register_sql_functions(connection)
+        self.apply_connection_profile(connection)
+
+    def apply_connection_profile(self, connection):
+        """
+        Applies the PRAGMA settings of the connection profile to a connection.
+        
+        Args:
+            connection (sqlite3.Connection): The freshly opened connection
+        """
+        for pragma, value in self.connection_profile.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+
+    def get_connection_settings(self):
+        """
+        Reads back the effective value of every PRAGMA in the connection
+        profile. SQLite silently ignores some settings (for example WAL on
+        in-memory databases), so benchmarks should record these values
+        rather than the requested ones.
+        
+        Returns:
+            dict: PRAGMA name to the value SQLite reports
+        """
+        settings = {}
+        with self.pool.writer() as connection:
+            for pragma in self.connection_profile:
+                row = connection.execute(f"PRAGMA {pragma}").fetchone()
+                settings[pragma] = row[0] if row else None
+        return settings
+
+    def get_main_thread_stats(self):
+        """
+        Returns how many database calls ran on the main (UI) thread, their
+        total and longest duration, and how many exceeded the frame budget.
+        With all screen work going through DatabaseExecutor this should stay
+        at zero calls after startup.
+        """
+        return self.main_thread_monitor.get_stats()
+
+    def add_note_listener(self, callback):
+        """
+        Registers a callback for note changes. The callback is called as
+        callback(event, note_id, note) after the change is committed, where
+        event is NOTE_CREATED, NOTE_UPDATED or NOTE_DELETED and note is a
+        listing summary (id, title, preview, created_at, updated_at), or None
+        for deletions. This lets views patch a single row instead of
+        re-querying every note.
+        """
+        if callback not in self.note_listeners:
+            self.note_listeners.append(callback)
+
+    def remove_note_listener(self, callback):
+        """Unregisters a callback added with add_note_listener()."""
+        if callback in self.note_listeners:
+            self.note_listeners.remove(callback)
+
+    def notify_note_listeners(self, event, note_id, note=None):
+        """
+        Calls every registered note listener. A failing listener is logged
+        and does not prevent the others from being notified. Inside a
+        transaction() block the events are held back until it commits.
+        """
+        if getattr(self.transaction_state, 'depth', 0):
+            self.transaction_state.pending_events.append((event, note_id, note))
+            return
+        for callback in list(self.note_listeners):
+            try:
+                callback(event, note_id, note)
+            except Exception as e:
+                logging.error(f"Note listener failed on {event} of note {note_id}: {str(e)}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups several write operations into a single commit.
+        
+        Write methods called inside the block do not commit on their own;
+        everything is committed when the outermost block exits, or rolled
+        back if it raises. Nested blocks join the enclosing transaction.
+        The writer connection is held for the whole block, so other threads'
+        writes wait for it, while their reads carry on against the last
+        committed state. Note listeners are only notified once the commit
+        succeeds.
+        
+        Yields:
+            sqlite3.Connection: The writer connection
+        
+        Example:
+            with db.transaction():
+                for note in imported:
+                    db.save_note(note['title'], note['content'])
+        """
+        state = self.transaction_state
+        with self.pool.writer() as connection:
+            if not getattr(state, 'depth', 0):
+                state.depth = 0
+                state.pending_events = []
+            state.depth += 1
+            try:
+                yield connection
+            except BaseException:
+                state.depth -= 1
+                if state.depth == 0:
+                    connection.rollback()
+                    state.pending_events = []
+                raise
+            
+            state.depth -= 1
+            if state.depth > 0:
+                return
+            try:
+                connection.commit()
+            except sqlite3.Error as e:
+                state.pending_events = []
+                raise Exception(f"Failed to commit transaction: {str(e)}")
+            events, state.pending_events = state.pending_events, []
+        
+        for event, note_id, note in events:
+            self.notify_note_listeners(event, note_id, note)
+
     def create_tables(self):
         """
-        Creates all necessary database tables if they don't exist.
-        This includes tables for notes, settings, and sync metadata.
+        Creates all necessary database tables if they don't exist and brings
+        an existing database up to the current schema version.
+        This includes tables for notes, settings, sync metadata and the
+        cache of Drive file metadata.
+        """
+        self.migrate()
+
+    def get_schema_version(self):
+        """Returns the schema version recorded in PRAGMA user_version."""
+        with self.pool.reader() as connection:
+            return connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """
+        Applies every migration in SCHEMA_MIGRATIONS newer than the version
+        recorded in the database. Each migration runs in its own transaction
+        together with the version bump, so an interrupted upgrade resumes
+        from the last completed step instead of rebuilding the database.
+        """
+        with self.pool.writer() as connection:
+            version = self.get_schema_version()
+            for target, method_name in self.SCHEMA_MIGRATIONS:
+                if target <= version:
+                    continue
+                try:
+                    cursor = connection.cursor()
+                    cursor.execute("BEGIN")
+                    getattr(self, method_name)(cursor)
+                    cursor.execute(f"PRAGMA user_version = {int(target)}")
+                    connection.commit()
+                except sqlite3.Error as e:
+                    connection.rollback()
+                    raise Exception(f"Failed to migrate database to version {target}: {str(e)}")
+                version = target
+
+    def _migrate_base_tables(self, cursor):
+        """Migration 1: the original notes, settings and sync_metadata tables."""
+        # Create the notes table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                content TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_deleted BOOLEAN DEFAULT 0,
+                sync_status TEXT DEFAULT 'not_synced'
+            )
+        ''')
+        
+        # Create the settings table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Create the sync_metadata table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_metadata (
+                note_id INTEGER PRIMARY KEY,
+                cloud_id TEXT,
+                last_synced TIMESTAMP,
+                FOREIGN KEY (note_id) REFERENCES notes (id)
+            )
+        ''')
+
+    def _migrate_query_indexes(self, cursor):
+        """Migration 3: indexes for the listing and sync queries."""
+        # Partial index backing the paginated listing: it holds only live
+        # notes in display order and carries every listed column (SQLite
+        # also needs is_deleted itself to treat it as covering), so a
+        # listing without previews never has to touch the table
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_listing
+            ON notes (updated_at DESC, id DESC, title, created_at, is_deleted)
+            WHERE is_deleted = 0
+        ''')
+        
+        # Partial index holding only notes waiting to be synced, so finding
+        # them costs the number of pending notes rather than all notes
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_pending_sync
+            ON notes (updated_at, id, is_deleted, sync_status)
+            WHERE sync_status = 'not_synced'
+        ''')
+
+    def _migrate_compressed_content(self, cursor):
+        """
+        Migration 5: compressed storage for long note bodies, with a stored
+        preview and length so the notes list never reads bodies.
+        """
+        # The search index is rebuilt below to read bodies via note_body()
+        for trigger in ('notes_fts_insert', 'notes_fts_update', 'notes_fts_delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE IF EXISTS notes_fts")
+        
+        cursor.execute("ALTER TABLE notes ADD COLUMN content_compressed BLOB")
+        cursor.execute("ALTER TABLE notes ADD COLUMN preview TEXT")
+        cursor.execute("ALTER TABLE notes ADD COLUMN content_length INTEGER NOT NULL DEFAULT 0")
+        
+        # Re-encode existing notes in batches, in id order
+        last_id = 0
+        while True:
+            rows = cursor.execute('''
+                SELECT id, content FROM notes WHERE id > ? ORDER BY id LIMIT 500
+            ''', (last_id,)).fetchall()
+            if not rows:
+                break
+            cursor.executemany('''
+                UPDATE notes
+                SET content = ?, content_compressed = ?, preview = ?,
+                    content_length = ?
+                WHERE id = ?
+            ''', [
+                encode_note_body(content, self.compression_threshold) + (note_id,)
+                for note_id, content in rows
+            ])
+            last_id = rows[-1][0]
+        
+        # The listing index now carries the preview, so listing pages with
+        # previews are answered from the index alone
+        cursor.execute("DROP INDEX IF EXISTS idx_notes_listing")
+        cursor.execute('''
+            CREATE INDEX idx_notes_listing
+            ON notes (updated_at DESC, id DESC, title, preview, created_at, is_deleted)
+            WHERE is_deleted = 0
+        ''')
+        
+        # The index reads live notes' full text through this view, which
+        # also lets FTS5 rebuild it without indexing soft-deleted notes
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS notes_fts_source AS
+            SELECT id, title, note_body(content, content_compressed) AS content
+            FROM notes
+            WHERE is_deleted = 0
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE notes_fts USING fts5(
+                title,
+                content,
+                content='notes_fts_source',
+                content_rowid='id',
+                prefix='2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER notes_fts_insert
+            AFTER INSERT ON notes WHEN new.is_deleted = 0
+            BEGIN
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, note_body(new.content, new.content_compressed));
+            END
+        ''')
+        # One trigger for both steps, as in migration 2
+        cursor.execute('''
+            CREATE TRIGGER notes_fts_update
+            AFTER UPDATE OF title, content, content_compressed, is_deleted ON notes
+            BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                SELECT 'delete', old.id, old.title,
+                       note_body(old.content, old.content_compressed)
+                WHERE old.is_deleted = 0;
+                INSERT INTO notes_fts (rowid, title, content)
+                SELECT new.id, new.title, note_body(new.content, new.content_compressed)
+                WHERE new.is_deleted = 0;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER notes_fts_delete
+            AFTER DELETE ON notes WHEN old.is_deleted = 0
+            BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title,
+                        note_body(old.content, old.content_compressed));
+            END
+        ''')
+        cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+    def _migrate_content_hash(self, cursor):
+        """
+        Migration 6: the MD5 of each note's Drive payload, compared with the
+        md5Checksum of its Drive file to skip uploads of unchanged notes.
+        """
+        cursor.execute("ALTER TABLE notes ADD COLUMN content_hash TEXT")
+        last_id = 0
+        while True:
+            rows = cursor.execute('''
+                SELECT id, title, note_body(content, content_compressed)
+                FROM notes
+                WHERE id > ?
+                ORDER BY id
+                LIMIT 500
+            ''', (last_id,)).fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                "UPDATE notes SET content_hash = ? WHERE id = ?",
+                [(note_content_hash(title, content), note_id)
+                 for note_id, title, content in rows]
+            )
+            last_id = rows[-1][0]
+
+    def _migrate_changed_notes_index(self, cursor):
+        """
+        Migration 7: index over every note, deleted or not, in change order,
+        so incremental snapshot backups read only the notes changed since
+        the previous one.
+        """
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_changed
+            ON notes (updated_at, id)
+        ''')
+
+    def _migrate_outbox(self, cursor):
+        """
+        Migration 8: the outbox of cloud operations waiting to be sent, one
+        entry per note, with the retry state of failed attempts.
+        
+        Triggers keep it in step with sync_status: every write that marks a
+        note pending enqueues it (replacing an older entry, so only the
+        latest version is ever sent, and retrying the new version at once),
+        and marking it synced or removing it drops the entry.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                note_id INTEGER PRIMARY KEY,
+                operation TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_due
+            ON outbox (next_attempt_at, note_id)
+        ''')
+        
+        enqueue = '''
+            INSERT INTO outbox (note_id, operation)
+            VALUES (new.id, CASE WHEN new.is_deleted THEN 'delete' ELSE 'upload' END)
+            ON CONFLICT (note_id) DO UPDATE SET
+                operation = excluded.operation,
+                version = outbox.version + 1,
+                attempts = 0,
+                next_attempt_at = 0,
+                last_error = NULL,
+                enqueued_at = CURRENT_TIMESTAMP;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS outbox_enqueue_insert
+            AFTER INSERT ON notes WHEN new.sync_status = 'not_synced'
+            BEGIN
+                {enqueue}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS outbox_enqueue_update
+            AFTER UPDATE OF sync_status ON notes WHEN new.sync_status = 'not_synced'
+            BEGIN
+                {enqueue}
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS outbox_dequeue_synced
+            AFTER UPDATE OF sync_status ON notes WHEN new.sync_status = 'synced'
+            BEGIN
+                DELETE FROM outbox WHERE note_id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS outbox_dequeue_delete
+            AFTER DELETE ON notes
+            BEGIN
+                DELETE FROM outbox WHERE note_id = old.id;
+            END
+        ''')
+        
+        cursor.execute('''
+            INSERT OR IGNORE INTO outbox (note_id, operation)
+            SELECT id, CASE WHEN is_deleted THEN 'delete' ELSE 'upload' END
+            FROM notes
+            WHERE sync_status = 'not_synced'
+        ''')
+
+    def _migrate_note_uuid(self, cursor):
+        """
+        Migration 9: a random uuid per note that stays the same wherever the
+        note is copied, so a restored backup can tell its notes apart from
+        unrelated local notes that happen to have the same id. A trigger
+        gives every inserted note one unless it brings its own.
+        """
+        cursor.execute("ALTER TABLE notes ADD COLUMN uuid TEXT")
+        cursor.execute('''
+            UPDATE notes SET uuid = lower(hex(randomblob(16))) WHERE uuid IS NULL
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_uuid ON notes (uuid)
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_assign_uuid
+            AFTER INSERT ON notes WHEN new.uuid IS NULL
+            BEGIN
+                UPDATE notes SET uuid = lower(hex(randomblob(16))) WHERE id = new.id;
+            END
+        ''')
+
+    def _migrate_drive_files(self, cursor):
+        """Migration 4: local cache of the metadata of files in Drive."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS drive_files (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                mime_type TEXT,
+                modified_time TEXT,
+                md5 TEXT,
+                note_id INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_drive_files_note
+            ON drive_files (note_id)
+            WHERE note_id IS NOT NULL
+        ''')
+
+    def _migrate_search_index(self, cursor):
+        """
+        Migration 2: the FTS5 full-text index over note titles and contents.
+        
+        The index is an external-content table mirroring the notes table, so
+        note text is not stored twice. Triggers keep it in sync on insert,
+        update, soft delete and hard delete; soft-deleted notes are never
+        indexed. If the index did not exist yet it is backfilled from the
+        existing notes.
+        """
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'notes_fts'
+        ''')
+        needs_backfill = cursor.fetchone() is None
+        
+        # prefix='2 3' keeps short prefix queries ("no*", "not*") index-backed
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                title,
+                content,
+                content='notes',
+                content_rowid='id',
+                prefix='2 3'
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_insert
+            AFTER INSERT ON notes WHEN new.is_deleted = 0
+            BEGIN
+                INSERT INTO notes_fts (rowid, title, content)
+                VALUES (new.id, new.title, new.content);
+            END
+        ''')
+        
+        # An update (including a soft delete) removes the old entry if it was
+        # indexed and re-adds the new one if the note is still live. Both steps
+        # live in one trigger because SQLite gives no ordering guarantee
+        # between separate triggers on the same event.
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_update
+            AFTER UPDATE OF title, content, is_deleted ON notes
+            BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                SELECT 'delete', old.id, old.title, old.content
+                WHERE old.is_deleted = 0;
+                INSERT INTO notes_fts (rowid, title, content)
+                SELECT new.id, new.title, new.content
+                WHERE new.is_deleted = 0;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS notes_fts_delete
+            AFTER DELETE ON notes WHEN old.is_deleted = 0
+            BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+            END
+        ''')
+        
+        if needs_backfill:
+            self._backfill_search_index(cursor)
+
+    def _backfill_search_index(self, cursor):
+        """
+        Fills the search index from every live note in a single statement,
+        as laid out by migration 2 (before bodies could be compressed).
+        """
+        cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('delete-all')")
+        cursor.execute('''
+            INSERT INTO notes_fts (rowid, title, content)
+            SELECT id, title, content
+            FROM notes
+            WHERE is_deleted = 0
+        ''')
+
+    def rebuild_search_index(self):
+        """
+        Rebuilds the full-text index from scratch.
+        Useful as a one-shot backfill for notes.db files created before the
+        index existed, or to repair an index that has drifted.
         """
         try:
-            # Create the notes table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    content TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_deleted BOOLEAN DEFAULT 0,
-                    sync_status TEXT DEFAULT 'not_synced'
-                )
-            ''')
-            
-            # Create the settings table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create the sync_metadata table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sync_metadata (
-                    note_id INTEGER PRIMARY KEY,
-                    cloud_id TEXT,
-                    last_synced TIMESTAMP,
-                    FOREIGN KEY (note_id) REFERENCES notes (id)
-                )
-            ''')
+            with self.transaction() as connection:
+                cursor = connection.cursor()
+                # Re-reads every live note through the notes_fts_source view
+                cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+                cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('optimize')")
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to rebuild search index: {str(e)}")
+
+    @staticmethod
+    def _build_search_query(text):
+        """
+        Turns free text typed by the user into an FTS5 MATCH expression.
+        Every word is quoted (so punctuation cannot break the query syntax)
+        and matched as a prefix, so "meet no" finds "meeting notes".
+        """
+        terms = []
+        for word in text.split():
+            word = word.replace('"', '""')
+            terms.append(f'"{word}"*')
+        return ' '.join(terms)
+
+    def search_notes(self, text, limit=20, offset=0):
+        """
+        Searches note titles and contents using the full-text index.
+        Title matches rank higher than content matches.
+        
+        Args:
+            text (str): The words to search for; each word matches as a prefix
+            limit (int, optional): Maximum number of results to return
+            offset (int, optional): Number of results to skip, for paging
+            
+        Returns:
+            list: Dictionaries with the note id, title, a highlighted snippet
+                  (Kivy markup) and the updated_at timestamp, best match first
+        """
+        match = self._build_search_query(text)
+        if not match:
+            return []
+        
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute('''
+                    SELECT notes.id, notes.title,
+                           snippet(notes_fts, 1, ?, ?, '...', 12),
+                           notes.updated_at
+                    FROM notes_fts
+                    JOIN notes ON notes.id = notes_fts.rowid
+                    WHERE notes_fts MATCH ?
+                    ORDER BY bm25(notes_fts, 10.0, 1.0)
+                    LIMIT ? OFFSET ?
+                ''', (SNIPPET_MATCH_START, SNIPPET_MATCH_END,
+                      match, limit, offset)).fetchall()
             
-            self.connection.commit()
+            return [
+                {
+                    'id': row[0],
+                    'title': row[1],
+                    'snippet': snippet_markup(row[2]),
+                    'updated_at': row[3]
+                }
+                for row in rows
+            ]
         except sqlite3.Error as e:
-            raise Exception(f"Failed to create database tables: {str(e)}")
+            raise Exception(f"Failed to search notes: {str(e)}")
 
     def save_note(self, title, content, note_id=None):
         """
@@ -95,30 +848,126 @@ class DatabaseManager:
             
         Returns:
             int: The ID of the saved note
+        
+        Raises:
+            Exception: If note_id does not exist or the note was deleted; a
+                deleted note is never brought back by a stale save
         """
         try:
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            body = encode_note_body(content, self.compression_threshold)
+            content_hash = note_content_hash(title, content)
             
-            if note_id is None:
-                # Create new note
-                self.cursor.execute('''
-                    INSERT INTO notes (title, content, created_at, updated_at)
-                    VALUES (?, ?, ?, ?)
-                ''', (title, content, current_time, current_time))
-                note_id = self.cursor.lastrowid
-            else:
-                # Update existing note
-                self.cursor.execute('''
-                    UPDATE notes
-                    SET title = ?, content = ?, updated_at = ?
-                    WHERE id = ?
-                ''', (title, content, current_time, note_id))
-            
-            self.connection.commit()
+            with self.transaction() as connection:
+                cursor = connection.cursor()
+                if note_id is None:
+                    # Create new note
+                    cursor.execute('''
+                        INSERT INTO notes (title, content, content_compressed,
+                                           preview, content_length, content_hash,
+                                           created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (title, *body, content_hash, current_time, current_time))
+                    note_id = cursor.lastrowid
+                    event = NOTE_CREATED
+                else:
+                    # Update existing note
+                    cursor.execute('''
+                        UPDATE notes
+                        SET title = ?, content = ?, content_compressed = ?,
+                            preview = ?, content_length = ?, content_hash = ?,
+                            updated_at = ?, sync_status = 'not_synced'
+                        WHERE id = ? AND is_deleted = 0
+                    ''', (title, *body, content_hash, current_time, note_id))
+                    if cursor.rowcount == 0:
+                        raise Exception(f"Failed to save note: note {note_id} does not exist")
+                    event = NOTE_UPDATED
+                
+                self.notify_note_listeners(event, note_id, {
+                    'id': note_id,
+                    'title': title,
+                    'preview': body[2] or '',
+                    'created_at': current_time if event == NOTE_CREATED else None,
+                    'updated_at': current_time
+                })
             return note_id
         except sqlite3.Error as e:
             raise Exception(f"Failed to save note: {str(e)}")
 
+    def save_notes_bulk(self, notes):
+        """
+        Saves many notes with one executemany() per kind of write, inside a
+        single transaction. Notes with a 'uuid' overwrite the local note with
+        that uuid, or are created under it if there is none (as when
+        restoring a backup); otherwise notes with an 'id' are inserted or
+        overwritten under that id, and the rest are created as new notes.
+        
+        Args:
+            notes (iterable): Dictionaries with 'title' and 'content', and
+                optionally 'uuid', 'id', 'created_at' and 'updated_at'
+            
+        Returns:
+            int: The number of notes saved
+        """
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        new_notes = []
+        restored_notes = []
+        matched_notes = []
+        for note in notes:
+            created_at = note.get('created_at') or current_time
+            updated_at = note.get('updated_at') or current_time
+            body = encode_note_body(note['content'], self.compression_threshold)
+            content_hash = note_content_hash(note['title'], note['content'])
+            if note.get('uuid') is not None:
+                matched_notes.append((note['uuid'], note['title'], *body, content_hash,
+                                      created_at, updated_at))
+            elif note.get('id') is None:
+                new_notes.append((note['title'], *body, content_hash, created_at, updated_at))
+            else:
+                restored_notes.append((note['id'], note['title'], *body, content_hash,
+                                       created_at, updated_at))
+        
+        overwrite = '''
+                        title = excluded.title,
+                        content = excluded.content,
+                        content_compressed = excluded.content_compressed,
+                        preview = excluded.preview,
+                        content_length = excluded.content_length,
+                        content_hash = excluded.content_hash,
+                        updated_at = excluded.updated_at,
+                        is_deleted = 0,
+                        sync_status = 'not_synced'
+        '''
+        
+        try:
+            with self.transaction() as connection:
+                cursor = connection.cursor()
+                cursor.executemany('''
+                    INSERT INTO notes (title, content, content_compressed,
+                                       preview, content_length, content_hash,
+                                       created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', new_notes)
+                cursor.executemany('''
+                    INSERT INTO notes (id, title, content, content_compressed,
+                                       preview, content_length, content_hash,
+                                       created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                ''' + overwrite, restored_notes)
+                cursor.executemany('''
+                    INSERT INTO notes (uuid, title, content, content_compressed,
+                                       preview, content_length, content_hash,
+                                       created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (uuid) DO UPDATE SET
+                ''' + overwrite, matched_notes)
+                self.notify_note_listeners(NOTES_BULK_CHANGED, None)
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to save notes: {str(e)}")
+        
+        return len(new_notes) + len(restored_notes) + len(matched_notes)
+
     def get_note(self, note_id):
         """
         Retrieves a specific note from the database.
@@ -130,13 +979,14 @@ class DatabaseManager:
             dict: The note data or None if not found
         """
         try:
-            self.cursor.execute('''
-                SELECT id, title, content, created_at, updated_at
-                FROM notes
-                WHERE id = ? AND is_deleted = 0
-            ''', (note_id,))
+            with self.pool.reader() as connection:
+                row = connection.execute('''
+                    SELECT id, title, note_body(content, content_compressed),
+                           created_at, updated_at
+                    FROM notes
+                    WHERE id = ? AND is_deleted = 0
+                ''', (note_id,)).fetchone()
             
-            row = self.cursor.fetchone()
             if row:
                 return {
                     'id': row[0],
@@ -149,6 +999,27 @@ class DatabaseManager:
         except sqlite3.Error as e:
             raise Exception(f"Failed to retrieve note: {str(e)}")
 
+    def get_note_content(self, note_id):
+        """
+        Retrieves only the content of a note, for notes listed without it.
+        
+        Args:
+            note_id (int): The ID of the note
+            
+        Returns:
+            str: The note content, or None if the note is not found
+        """
+        try:
+            with self.pool.reader() as connection:
+                row = connection.execute('''
+                    SELECT note_body(content, content_compressed)
+                    FROM notes
+                    WHERE id = ? AND is_deleted = 0
+                ''', (note_id,)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve note content: {str(e)}")
+
     def get_all_notes(self):
         """
         Retrieves all non-deleted notes from the database.
@@ -157,15 +1028,17 @@ class DatabaseManager:
             list: List of dictionaries containing note data
         """
         try:
-            self.cursor.execute('''
-                SELECT id, title, content, created_at, updated_at
-                FROM notes
-                WHERE is_deleted = 0
-                ORDER BY updated_at DESC
-            ''')
+            with self.pool.reader() as connection:
+                rows = connection.execute('''
+                    SELECT id, title, note_body(content, content_compressed),
+                           created_at, updated_at
+                    FROM notes
+                    WHERE is_deleted = 0
+                    ORDER BY updated_at DESC
+                ''').fetchall()
             
             notes = []
-            for row in self.cursor.fetchall():
+            for row in rows:
                 notes.append({
                     'id': row[0],
                     'title': row[1],
@@ -177,6 +1050,442 @@ class DatabaseManager:
         except sqlite3.Error as e:
             raise Exception(f"Failed to retrieve notes: {str(e)}")
 
+    def get_notes_page(self, limit=50, cursor=None, preview_length=100):
+        """
+        Retrieves one page of non-deleted notes, most recently updated first.
+        
+        Uses keyset pagination: instead of an OFFSET, the caller passes back
+        the cursor returned with the previous page, so every page costs the
+        same no matter how deep into the list it is. Note bodies are never
+        read: previews come from the stored preview column, which the
+        listing index covers.
+        
+        Args:
+            limit (int, optional): Maximum number of notes in the page
+            cursor (tuple, optional): The (updated_at, id) cursor returned with
+                the previous page, or None for the first page
+            preview_length (int, optional): Number of content characters to
+                return per note, at most STORED_PREVIEW_LENGTH, or None to
+                skip the preview entirely
+            
+        Returns:
+            tuple: (notes, next_cursor) where notes is a list of dictionaries
+                   and next_cursor is None once the last page is reached
+        """
+        if preview_length is None:
+            columns = "id, title, NULL, created_at, updated_at"
+            params = []
+        else:
+            columns = "id, title, substr(preview, 1, ?), created_at, updated_at"
+            params = [preview_length]
+        
+        query = f'''
+            SELECT {columns}
+            FROM notes
+            WHERE is_deleted = 0
+        '''
+        if cursor is not None:
+            query += " AND (updated_at, id) < (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute(query, params).fetchall()
+            
+            notes = []
+            for row in rows:
+                notes.append({
+                    'id': row[0],
+                    'title': row[1],
+                    'preview': row[2],
+                    'created_at': row[3],
+                    'updated_at': row[4]
+                })
+            
+            next_cursor = None
+            if len(notes) == limit:
+                last = notes[-1]
+                next_cursor = (last['updated_at'], last['id'])
+            return notes, next_cursor
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve notes page: {str(e)}")
+
+    def get_notes_pending_sync(self, limit=100, after=None):
+        """
+        Retrieves notes whose latest change has not been synced yet,
+        including soft-deleted notes whose deletion still has to be sent,
+        together with their sync metadata.
+        
+        Args:
+            limit (int, optional): Maximum number of notes to return
+            after (tuple, optional): (updated_at, id) of the last note of the
+                previous batch, to continue from there
+            
+        Returns:
+            list: Dictionaries with id, title, content, updated_at,
+                  is_deleted, content_hash, cloud_id, last_synced and
+                  remote_md5 (the cached md5Checksum of the note's Drive
+                  file); the last three are None for notes never synced.
+                  Oldest change first
+        """
+        query = f'''
+            SELECT {self.PENDING_NOTE_COLUMNS}
+            FROM notes
+            LEFT JOIN sync_metadata ON sync_metadata.note_id = notes.id
+            LEFT JOIN drive_files ON drive_files.id = sync_metadata.cloud_id
+            WHERE notes.sync_status = 'not_synced'
+        '''
+        params = []
+        if after is not None:
+            query += " AND (notes.updated_at, notes.id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY notes.updated_at, notes.id LIMIT ?"
+        params.append(limit)
+        
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute(query, params).fetchall()
+            return [self._pending_note(row) for row in rows]
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve notes pending sync: {str(e)}")
+
+    # Columns read for a note about to be synced; see _pending_note()
+    PENDING_NOTE_COLUMNS = '''
+        notes.id, notes.title,
+        note_body(notes.content, notes.content_compressed),
+        notes.updated_at, notes.is_deleted, notes.content_hash,
+        sync_metadata.cloud_id, sync_metadata.last_synced, drive_files.md5
+    '''
+
+    @staticmethod
+    def _pending_note(row):
+        """Builds a note dictionary from PENDING_NOTE_COLUMNS."""
+        return {
+            'id': row[0],
+            'title': row[1],
+            'content': row[2],
+            'updated_at': row[3],
+            'is_deleted': bool(row[4]),
+            'content_hash': row[5],
+            'cloud_id': row[6],
+            'last_synced': row[7],
+            'remote_md5': row[8]
+        }
+
+    def get_outbox_due(self, now, limit=100):
+        """
+        Retrieves outbox entries whose next attempt is due, with the notes
+        they are for.
+        
+        Args:
+            now (float): The current time as a Unix timestamp
+            limit (int, optional): Maximum number of entries to return
+            
+        Returns:
+            list: Note dictionaries as from get_notes_pending_sync(), each
+                  with the entry's 'version' and 'attempts' added, earliest
+                  due first
+        """
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute(f'''
+                    SELECT {self.PENDING_NOTE_COLUMNS}, outbox.version, outbox.attempts
+                    FROM outbox
+                    JOIN notes ON notes.id = outbox.note_id
+                    LEFT JOIN sync_metadata ON sync_metadata.note_id = notes.id
+                    LEFT JOIN drive_files ON drive_files.id = sync_metadata.cloud_id
+                    WHERE outbox.next_attempt_at <= ?
+                    ORDER BY outbox.next_attempt_at, outbox.note_id
+                    LIMIT ?
+                ''', (now, limit)).fetchall()
+            return [
+                dict(self._pending_note(row), version=row[9], attempts=row[10])
+                for row in rows
+            ]
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve due outbox entries: {str(e)}")
+
+    def get_next_outbox_attempt(self):
+        """
+        Returns:
+            float: When the earliest outbox entry is due, as a Unix
+                   timestamp (0 if it can be sent now), or None if the
+                   outbox is empty
+        """
+        try:
+            with self.pool.reader() as connection:
+                return connection.execute(
+                    'SELECT MIN(next_attempt_at) FROM outbox'
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to read the outbox: {str(e)}")
+
+    def record_outbox_failure(self, note_id, version, error, next_attempt_at):
+        """
+        Records a failed attempt to send a note's outbox entry. Does nothing
+        if the note was enqueued again since, so a newer version is not held
+        back by the failure of an older one.
+        
+        Args:
+            note_id (int): The note whose operation failed
+            version (int): The entry version that was attempted
+            error (str): Description of the failure
+            next_attempt_at (float): Unix timestamp of the next attempt
+        """
+        try:
+            with self.transaction() as connection:
+                connection.execute('''
+                    UPDATE outbox
+                    SET attempts = attempts + 1, last_error = ?,
+                        next_attempt_at = ?
+                    WHERE note_id = ? AND version = ?
+                ''', (error, next_attempt_at, note_id, version))
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to record outbox failure: {str(e)}")
+
+    def get_notes_changed_since(self, since=None, limit=500, after=None):
+        """
+        Retrieves notes changed at or after a point in time, including
+        soft-deleted ones, for snapshot backups.
+        
+        Args:
+            since (str, optional): updated_at to start from, or None for
+                every note
+            limit (int, optional): Maximum number of notes to return
+            after (tuple, optional): (updated_at, id) of the last note of the
+                previous batch, to continue from there
+            
+        Returns:
+            list: Dictionaries with id, uuid, title, content, created_at,
+                  updated_at and is_deleted, oldest change first
+        """
+        query = '''
+            SELECT id, title, note_body(content, content_compressed),
+                   created_at, updated_at, is_deleted, uuid
+            FROM notes
+            WHERE updated_at >= ?
+        '''
+        params = [since or '']
+        if after is not None:
+            query += " AND (updated_at, id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY updated_at, id LIMIT ?"
+        params.append(limit)
+        
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute(query, params).fetchall()
+            
+            return [
+                {
+                    'id': row[0],
+                    'title': row[1],
+                    'content': row[2],
+                    'created_at': row[3],
+                    'updated_at': row[4],
+                    'is_deleted': bool(row[5]),
+                    'uuid': row[6]
+                }
+                for row in rows
+            ]
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve changed notes: {str(e)}")
+
+    def mark_note_synced(self, note, cloud_id):
+        """
+        Records that a version of a note is now stored in the cloud as
+        cloud_id. The note only leaves the pending set if it still matches
+        the uploaded version, so an edit made during the upload (even within
+        the same second) is picked up by the next sync. The cached checksum
+        of the Drive file is set to the version's content hash, so the next
+        sync can tell the file is current before the changes feed says so.
+        
+        Args:
+            note (dict): The version that was uploaded, as returned by
+                get_notes_pending_sync()
+            cloud_id (str): The cloud file ID holding the note
+        """
+        try:
+            with self.transaction() as connection:
+                connection.execute('''
+                    INSERT INTO sync_metadata (note_id, cloud_id, last_synced)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (note_id) DO UPDATE SET
+                        cloud_id = excluded.cloud_id,
+                        last_synced = excluded.last_synced
+                ''', (note['id'], cloud_id, note['updated_at']))
+                connection.execute('''
+                    INSERT INTO drive_files (id, md5, note_id)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET md5 = excluded.md5
+                ''', (cloud_id, note.get('content_hash'), note['id']))
+                connection.execute('''
+                    UPDATE notes
+                    SET sync_status = 'synced'
+                    WHERE id = ? AND updated_at = ? AND is_deleted = 0
+                      AND title IS ?
+                      AND note_body(content, content_compressed) IS ?
+                ''', (note['id'], note['updated_at'], note['title'], note['content']))
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to mark note as synced: {str(e)}")
+
+    def mark_note_deletion_synced(self, note_id, updated_at):
+        """
+        Records that a soft-deleted note has been removed from the cloud.
+        
+        Args:
+            note_id (int): The ID of the deleted note
+            updated_at (str): The updated_at of the deletion that was synced
+        """
+        try:
+            with self.transaction() as connection:
+                # Keep the Drive cache in step with the file just deleted
+                connection.execute('''
+                    DELETE FROM drive_files WHERE id IN (
+                        SELECT cloud_id FROM sync_metadata WHERE note_id = ?
+                    )
+                ''', (note_id,))
+                connection.execute(
+                    'DELETE FROM sync_metadata WHERE note_id = ?', (note_id,)
+                )
+                connection.execute('''
+                    UPDATE notes
+                    SET sync_status = 'synced'
+                    WHERE id = ? AND updated_at = ? AND is_deleted = 1
+                ''', (note_id, updated_at))
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to mark note deletion as synced: {str(e)}")
+
+    @staticmethod
+    def _drive_file_row(file):
+        """Flattens Drive file metadata into a drive_files row."""
+        note_id = (file.get('appProperties') or {}).get('note_id')
+        return (
+            file['id'],
+            file.get('name'),
+            file.get('mimeType'),
+            file.get('modifiedTime'),
+            file.get('md5Checksum'),
+            int(note_id) if note_id and note_id.isdigit() else None,
+        )
+
+    def replace_drive_files(self, files, page_token):
+        """
+        Replaces the whole Drive metadata cache with a fresh listing. Notes
+        whose synced file is not in the listing are queued to upload again.
+        
+        Args:
+            files (iterable): File metadata as returned by Drive
+            page_token (str): Changes page token taken before the listing
+        """
+        try:
+            with self.transaction() as connection:
+                connection.execute('DELETE FROM drive_files')
+                connection.executemany('''
+                    INSERT OR REPLACE INTO drive_files
+                        (id, name, mime_type, modified_time, md5, note_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (self._drive_file_row(file) for file in files))
+                self._forget_remote_files(connection, '''
+                    SELECT cloud_id FROM sync_metadata
+                    WHERE cloud_id NOT IN (SELECT id FROM drive_files)
+                ''', ())
+                self._save_setting(connection, DRIVE_CHANGES_TOKEN_KEY, page_token)
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to replace Drive file cache: {str(e)}")
+
+    def apply_drive_changes(self, files, removed_ids, page_token):
+        """
+        Applies a batch of Drive changes to the metadata cache. Notes whose
+        synced file was removed are queued to upload again.
+        
+        Args:
+            files (iterable): Metadata of files created or modified
+            removed_ids (list): IDs of files deleted or trashed
+            page_token (str): Changes page token to resume from next time
+
+        Returns:
+            tuple: (changed, removed) counts of cached files whose content
+                   actually changed or that were removed. Changes to files
+                   this device uploaded, whose checksum is already cached,
+                   are not counted.
+        """
+        rows = [self._drive_file_row(file) for file in files]
+        removed_ids = list(removed_ids)
+        try:
+            with self.transaction() as connection:
+                changed = sum(
+                    1 for row in rows
+                    if connection.execute(
+                        'SELECT 1 FROM drive_files WHERE id = ? AND md5 IS ?',
+                        (row[0], row[4])
+                    ).fetchone() is None
+                )
+                connection.executemany('''
+                    INSERT OR REPLACE INTO drive_files
+                        (id, name, mime_type, modified_time, md5, note_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                removed = connection.executemany(
+                    'DELETE FROM drive_files WHERE id = ?',
+                    ((file_id,) for file_id in removed_ids)
+                ).rowcount
+                if removed_ids:
+                    placeholders = ', '.join('?' * len(removed_ids))
+                    self._forget_remote_files(connection, placeholders, removed_ids)
+                self._save_setting(connection, DRIVE_CHANGES_TOKEN_KEY, page_token)
+            return changed, removed
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to apply Drive changes: {str(e)}")
+
+    def _forget_remote_files(self, connection, cloud_ids_query, params):
+        """
+        Drops the sync metadata of notes whose Drive file no longer exists
+        and marks live ones pending, so the next sync uploads a new file.
+        cloud_ids_query is a subquery or list of placeholders for the IDs.
+        """
+        connection.execute(f'''
+            UPDATE notes SET sync_status = 'not_synced'
+            WHERE is_deleted = 0 AND id IN (
+                SELECT note_id FROM sync_metadata
+                WHERE cloud_id IN ({cloud_ids_query})
+            )
+        ''', params)
+        connection.execute(f'''
+            DELETE FROM sync_metadata WHERE cloud_id IN ({cloud_ids_query})
+        ''', params)
+
+    def get_drive_files(self):
+        """
+        Retrieves the cached metadata of every known Drive file.
+        
+        Returns:
+            list: Dictionaries with id, name, mime_type, modified_time, md5
+                  and note_id (None for files that do not hold a note)
+        """
+        try:
+            with self.pool.reader() as connection:
+                rows = connection.execute('''
+                    SELECT id, name, mime_type, modified_time, md5, note_id
+                    FROM drive_files
+                    ORDER BY id
+                ''').fetchall()
+            return [
+                {
+                    'id': row[0],
+                    'name': row[1],
+                    'mime_type': row[2],
+                    'modified_time': row[3],
+                    'md5': row[4],
+                    'note_id': row[5]
+                }
+                for row in rows
+            ]
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to retrieve Drive file cache: {str(e)}")
+
     def delete_note(self, note_id):
         """
         Soft deletes a note by marking it as deleted in the database.
@@ -185,15 +1494,41 @@ class DatabaseManager:
             note_id (int): The ID of the note to delete
         """
         try:
-            self.cursor.execute('''
-                UPDATE notes
-                SET is_deleted = 1, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (note_id,))
-            self.connection.commit()
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.transaction() as connection:
+                connection.execute('''
+                    UPDATE notes
+                    SET is_deleted = 1, updated_at = ?,
+                        sync_status = 'not_synced'
+                    WHERE id = ?
+                ''', (current_time, note_id))
+                self.notify_note_listeners(NOTE_DELETED, note_id)
         except sqlite3.Error as e:
             raise Exception(f"Failed to delete note: {str(e)}")
 
+    def delete_notes_bulk(self, note_ids=(), uuids=()):
+        """
+        Soft deletes many notes in a single transaction.
+        
+        Args:
+            note_ids (iterable, optional): The IDs of the notes to delete
+            uuids (iterable, optional): The uuids of further notes to
+                delete, as recorded in a backup
+        """
+        try:
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.transaction() as connection:
+                for column, keys in (('id', note_ids), ('uuid', uuids)):
+                    connection.executemany(f'''
+                        UPDATE notes
+                        SET is_deleted = 1, updated_at = ?,
+                            sync_status = 'not_synced'
+                        WHERE {column} = ? AND is_deleted = 0
+                    ''', ((current_time, key) for key in keys))
+                self.notify_note_listeners(NOTES_BULK_CHANGED, None)
+        except sqlite3.Error as e:
+            raise Exception(f"Failed to delete notes: {str(e)}")
+
     def get_setting(self, key):
         """
         Retrieves a setting value from the database.
@@ -205,8 +1540,10 @@ class DatabaseManager:
             str: The setting value or None if not found
         """
         try:
-            self.cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            result = self.cursor.fetchone()
+            with self.pool.reader() as connection:
+                result = connection.execute(
+                    'SELECT value FROM settings WHERE key = ?', (key,)
+                ).fetchone()
             return result[0] if result else None
         except sqlite3.Error as e:
             raise Exception(f"Failed to retrieve setting: {str(e)}")
@@ -220,17 +1557,21 @@ class DatabaseManager:
             value (str): The setting value
         """
         try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO settings (key, value, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-            ''', (key, value))
-            self.connection.commit()
+            with self.transaction() as connection:
+                self._save_setting(connection, key, value)
         except sqlite3.Error as e:
             raise Exception(f"Failed to save setting: {str(e)}")
 
+    @staticmethod
+    def _save_setting(connection, key, value):
+        connection.execute('''
+            INSERT OR REPLACE INTO settings (key, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (key, value))
+
     def __del__(self):
         """
         Ensures the database connection is properly closed when the object is destroyed.
         """
-        if self.connection:
-            self.connection.close()
\ No newline at end of file
+        if getattr(self, 'pool', None) is not None:
+            self.pool.close()
\ No newline at end of file
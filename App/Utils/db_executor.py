@@ -0,0 +1,127 @@
+# utils/db_executor.py
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+# Longest a database call may hold the UI thread: one frame at 60 fps
+FRAME_BUDGET = 1.0 / 60
+
+
+def clock_dispatch(callback, *args):
+    """
+    Runs callback(*args) on the Kivy main thread at the start of the next
+    frame. Kivy is imported here so the database layer can be used (and
+    tested) without a running app.
+    """
+    from kivy.clock import Clock
+    Clock.schedule_once(lambda dt: callback(*args), 0)
+
+
+class MainThreadMonitor:
+    """
+    Measures how long database calls hold the main (UI) thread.
+
+    The connection pool reports every connection use made on the main
+    thread. Any use longer than the frame budget is logged and counted, so
+    "no DB call blocks a frame" can be checked in tests and on devices.
+    """
+    def __init__(self, budget=FRAME_BUDGET):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears all recorded measurements."""
+        with self.lock:
+            self.calls = 0
+            self.total_time = 0.0
+            self.max_time = 0.0
+            self.over_budget = 0
+
+    def record(self, duration):
+        """Records one main-thread database call that took duration seconds."""
+        with self.lock:
+            self.calls += 1
+            self.total_time += duration
+            self.max_time = max(self.max_time, duration)
+            if duration > self.budget:
+                self.over_budget += 1
+        if duration > self.budget:
+            logging.warning(
+                f"Database call blocked the UI thread for {duration * 1000:.1f} ms "
+                f"(frame budget {self.budget * 1000:.1f} ms)"
+            )
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: calls, total_time, max_time and over_budget counts for
+                  database calls made on the main thread
+        """
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'over_budget': self.over_budget,
+            }
+
+
+class DatabaseExecutor:
+    """
+    Runs database work off the UI thread.
+
+    Calls are queued to a single dedicated worker thread, so they run in
+    the order they were submitted (a save is always visible to a listing
+    submitted after it). Results and errors are delivered back through
+    dispatch, which by default marshals them onto the Kivy main thread.
+    """
+    def __init__(self, db, dispatch=clock_dispatch):
+        """
+        Args:
+            db (DatabaseManager): The database the submitted calls use
+            dispatch (callable, optional): dispatch(callback, *args) used to
+                deliver results; defaults to the next Kivy frame
+        """
+        self.db = db
+        self.dispatch = dispatch
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-worker')
+
+    def submit(self, func, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Queues func(*args, **kwargs) to run on the worker thread.
+
+        Args:
+            func (callable): Usually a DatabaseManager method
+            on_result (callable, optional): Called with the return value
+            on_error (callable, optional): Called with the raised exception;
+                errors without a handler are logged
+
+        Returns:
+            concurrent.futures.Future: The pending result
+        """
+        def run():
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if on_error is not None:
+                    self.dispatch(on_error, e)
+                else:
+                    logging.error(f"Background database call {getattr(func, '__name__', func)} failed: {str(e)}")
+                raise
+            logging.debug(
+                f"Background database call {getattr(func, '__name__', func)} "
+                f"took {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            if on_result is not None:
+                self.dispatch(on_result, result)
+            return result
+
+        return self.executor.submit(run)
+
+    def shutdown(self, wait=True):
+        """Stops the worker thread once the queued calls have finished."""
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,170 @@
+# utils/snapshot_bundle.py
+"""
+File format for note snapshot bundles: many notes packed into one file of
+independently compressed chunks, followed by a manifest saying which notes
+each chunk holds and where it is. A reader fetches the footer and manifest
+from the end of the file and then only the chunks it needs.
+
+Layout:
+    MAGIC
+    chunk 0 .. chunk n-1    zlib-compressed JSON lines, one note per line
+    manifest                zlib-compressed JSON
+    footer                  manifest offset and length, then MAGIC
+"""
+import json
+import struct
+import zlib
+
+MAGIC = b'NOTESNP1'
+# <manifest offset> <manifest length> <MAGIC>
+FOOTER = struct.Struct('<QI8s')
+FORMAT_VERSION = 1
+
+# Uncompressed bytes of notes collected before a chunk is closed
+DEFAULT_CHUNK_SIZE = 256 * 1024
+COMPRESSION_LEVEL = 6
+
+class BundleError(Exception):
+    """Raised for a bundle that is truncated, corrupt or of another format."""
+
+class BundleWriter:
+    """
+    Streams notes into a bundle file. Notes are buffered only until a chunk
+    is full, so memory use does not grow with the number of notes.
+
+    Usage:
+        with open(path, 'wb') as f:
+            writer = BundleWriter(f)
+            for note in notes:
+                writer.add(note)
+            manifest = writer.finish(full=True)
+    """
+    def __init__(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            file: Binary file object open for writing, positioned at 0
+            chunk_size (int, optional): Uncompressed bytes per chunk
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.note_count = 0
+        self.buffer = []
+        self.buffer_ids = []
+        self.buffer_size = 0
+        self.offset = 0
+        self._write(MAGIC)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.offset += len(data)
+
+    def add(self, note):
+        """
+        Adds a note.
+
+        Args:
+            note (dict): The note, with at least 'id'; stored as given
+        """
+        line = json.dumps(note, separators=(',', ':')).encode('utf-8')
+        self.buffer.append(line)
+        self.buffer_ids.append(note['id'])
+        self.buffer_size += len(line) + 1
+        self.note_count += 1
+        if self.buffer_size >= self.chunk_size:
+            self._close_chunk()
+
+    def _close_chunk(self):
+        if not self.buffer:
+            return
+        data = zlib.compress(b'\n'.join(self.buffer), COMPRESSION_LEVEL)
+        self.chunks.append({
+            'offset': self.offset,
+            'length': len(data),
+            'crc32': zlib.crc32(data),
+            'ids': self.buffer_ids,
+        })
+        self._write(data)
+        self.buffer = []
+        self.buffer_ids = []
+        self.buffer_size = 0
+
+    def finish(self, **metadata):
+        """
+        Writes the last chunk, the manifest and the footer.
+
+        Args:
+            **metadata: Extra JSON-serializable fields for the manifest
+
+        Returns:
+            dict: The manifest
+        """
+        self._close_chunk()
+        manifest = dict(metadata, version=FORMAT_VERSION,
+                        note_count=self.note_count, chunks=self.chunks)
+        data = zlib.compress(json.dumps(manifest, separators=(',', ':')).encode('utf-8'),
+                             COMPRESSION_LEVEL)
+        manifest_offset = self.offset
+        self._write(data)
+        self._write(FOOTER.pack(manifest_offset, len(data), MAGIC))
+        return manifest
+
+def parse_footer(data):
+    """
+    Reads the footer at the end of data, which must hold at least the last
+    FOOTER.size bytes of a bundle.
+
+    Returns:
+        tuple: (manifest_offset, manifest_length)
+    """
+    if len(data) < FOOTER.size:
+        raise BundleError("Bundle is too short")
+    manifest_offset, manifest_length, magic = FOOTER.unpack(data[-FOOTER.size:])
+    if magic != MAGIC:
+        raise BundleError("Not a note snapshot bundle")
+    return manifest_offset, manifest_length
+
+def decode_manifest(data):
+    """Returns the manifest from its stored bytes."""
+    try:
+        manifest = json.loads(zlib.decompress(data).decode('utf-8'))
+    except (zlib.error, ValueError) as e:
+        raise BundleError(f"Corrupt bundle manifest: {str(e)}")
+    if manifest.get('version') != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle version {manifest.get('version')}")
+    return manifest
+
+def decode_chunk(chunk, data):
+    """
+    Returns the notes in a chunk.
+
+    Args:
+        chunk (dict): The chunk's manifest entry
+        data (bytes): The chunk's stored bytes
+    """
+    if len(data) != chunk['length'] or zlib.crc32(data) != chunk['crc32']:
+        raise BundleError(f"Corrupt bundle chunk at offset {chunk['offset']}")
+    return [json.loads(line) for line in zlib.decompress(data).split(b'\n')]
+
+def coalesce_chunks(chunks, max_bytes):
+    """
+    Groups chunks into byte ranges to download, merging neighbouring chunks
+    into one request as long as the range stays within max_bytes.
+
+    Args:
+        chunks (list): Manifest chunk entries, in file order
+        max_bytes (int): Largest range to request at once
+
+    Returns:
+        list: (start, end, chunks) with end inclusive
+    """
+    ranges = []
+    for chunk in chunks:
+        end = chunk['offset'] + chunk['length'] - 1
+        if ranges:
+            start, last_end, grouped = ranges[-1]
+            if chunk['offset'] == last_end + 1 and end - start < max_bytes:
+                ranges[-1] = (start, end, grouped + [chunk])
+                continue
+        ranges.append((chunk['offset'], end, [chunk]))
+    return ranges
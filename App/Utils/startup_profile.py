@@ -0,0 +1,85 @@
+# utils/startup_profile.py
+
+from datetime import datetime
+import json
+import logging
+import os
+import time
+
+# Version written into every startup report, so timings can be compared
+# across releases
+APP_VERSION = '1.0.0'
+
+
+class StartupProfile:
+    """
+    Times the phases of application startup.
+
+    Each call to mark() records the time elapsed since the profile started,
+    which should be as early as possible in main.py. The resulting report
+    has the duration of every phase (e.g. imports, build, first frame) and
+    can be appended to a JSON-lines file to track startup across releases.
+    """
+    def __init__(self, started=None, clock=time.perf_counter):
+        """
+        Args:
+            started (float, optional): clock() value at which startup began;
+                defaults to now
+            clock (callable, optional): Monotonic clock returning seconds
+        """
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self.marks = []
+
+    def mark(self, phase):
+        """
+        Records the end of a startup phase.
+
+        Args:
+            phase (str): Name of the phase that just finished
+
+        Returns:
+            float: Seconds the phase took
+        """
+        elapsed = self.clock() - self.started
+        previous = self.marks[-1][1] if self.marks else 0.0
+        self.marks.append((phase, elapsed))
+        return elapsed - previous
+
+    def get_report(self):
+        """
+        Returns:
+            dict: version, recorded_at, total (seconds since start at the
+                  last mark) and phases, a dict of phase name to seconds
+        """
+        phases = {}
+        previous = 0.0
+        for phase, elapsed in self.marks:
+            phases[phase] = round(elapsed - previous, 4)
+            previous = elapsed
+        return {
+            'version': APP_VERSION,
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'total': round(previous, 4),
+            'phases': phases,
+        }
+
+    def save(self, path):
+        """
+        Logs the report and appends it as one JSON line to path.
+
+        Args:
+            path (str): File collecting the reports of every launch
+        """
+        report = self.get_report()
+        summary = ', '.join(
+            f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in report['phases'].items()
+        )
+        logging.info(f"Startup took {report['total'] * 1000:.0f} ms ({summary})")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(json.dumps(report) + '\n')
+        except OSError as e:
+            logging.warning(f"Could not save startup profile: {str(e)}")
+        return report
@@ -0,0 +1,60 @@
+# benchmarks/bulk_write_benchmark.py
+"""
+Times the bulk note writes used when restoring a backup: creating new notes,
+restoring notes over existing ids, restoring notes matched by uuid, and
+deleting them all again, each in one transaction with full-text indexing.
+
+Run from the App directory:
+    python -m benchmarks.bulk_write_benchmark --notes 50000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Utils.database import DatabaseManager
+from benchmarks.compression_benchmark import make_corpus, timed
+
+def run(count, long_share, tmp_dir):
+    db = DatabaseManager(os.path.join(tmp_dir, 'notes.db'))
+    db.create_tables()
+    # Generated up front, so only the writes are timed
+    corpus = list(make_corpus(count, long_share))
+    results = {'create': timed(lambda: db.save_notes_bulk(corpus))}
+
+    # Rows were inserted in corpus order
+    with db.pool.reader() as connection:
+        saved = connection.execute("SELECT id, uuid FROM notes ORDER BY id").fetchall()
+    by_id = [dict(note, id=note_id, content=f"{note['content']} restored")
+             for note, (note_id, _) in zip(corpus, saved)]
+    results['restore_by_id'] = timed(lambda: db.save_notes_bulk(by_id))
+
+    by_uuid = [dict(note, uuid=uuid) for note, (_, uuid) in zip(corpus, saved)]
+    results['restore_by_uuid'] = timed(lambda: db.save_notes_bulk(by_uuid))
+
+    results['delete'] = timed(lambda: db.delete_notes_bulk(note_id for note_id, _ in saved))
+    assert db.get_all_notes() == []
+    db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=50000, help="Notes in the corpus")
+    parser.add_argument('--long-share', type=float, default=0.3,
+                        help="Share of notes between 2 and 10 KB")
+    args = parser.parse_args()
+    # Every call here runs on the main thread; the UI-thread warnings are noise
+    logging.getLogger().setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = run(args.notes, args.long_share, tmp_dir)
+
+    print(f"{args.notes} notes, {args.long_share:.0%} long")
+    for label, seconds in results.items():
+        print(f"{label:18}{seconds:10.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/compression_benchmark.py
+"""
+Compares the notes database with and without compressed note bodies on a
+synthetic corpus: file size, paging through the whole notes list, and a full
+scan reading every body.
+
+Run from the App directory:
+    python -m benchmarks.compression_benchmark --notes 100000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Utils.database import COMPRESSION_THRESHOLD, DatabaseManager
+
+WORDS = (
+    "meeting project idea todo shopping list call email draft review budget "
+    "travel book recipe garden weekend plan note remember check update "
+    "family work health music film read write fix order send buy pay"
+).split()
+
+def make_corpus(count, long_share=0.3, seed=1):
+    """
+    Yields notes for save_notes_bulk(): mostly short notes, with long_share
+    of them between 2 and 10 KB.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < long_share:
+            size = rng.randint(2048, 10240)
+        else:
+            size = rng.randint(40, 400)
+        words = []
+        length = 0
+        while length < size:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        yield {
+            'title': f"Note {i}",
+            'content': ' '.join(words),
+            'updated_at': f"2024-01-01 00:00:{i % 60:02d}",
+        }
+
+def timed(call):
+    """Returns the seconds call() takes."""
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+def list_everything(db):
+    """Pages through the whole notes list with 100-character previews."""
+    cursor = None
+    while True:
+        _, cursor = db.get_notes_page(limit=500, cursor=cursor)
+        if cursor is None:
+            return
+
+def list_from_bodies(db):
+    """
+    Pages through the notes list the way it was read before previews were
+    stored, truncating each body inside SQLite.
+    """
+    query = '''
+        SELECT id, title, substr(note_body(content, content_compressed), 1, 100),
+               created_at, updated_at
+        FROM notes
+        WHERE is_deleted = 0 {}
+        ORDER BY updated_at DESC, id DESC LIMIT 500
+    '''
+    with db.pool.reader() as connection:
+        rows = connection.execute(query.format('')).fetchall()
+        while rows:
+            last = rows[-1]
+            rows = connection.execute(
+                query.format("AND (updated_at, id) < (?, ?)"), (last[4], last[0])
+            ).fetchall()
+
+def scan_bodies(db):
+    """Reads and decodes the full body of every note."""
+    for _ in db.get_all_notes():
+        pass
+
+def run(label, count, compression_threshold, tmp_dir):
+    path = os.path.join(tmp_dir, f"{label}.db")
+    db = DatabaseManager(path, compression_threshold=compression_threshold)
+    db.create_tables()
+    load = timed(lambda: db.save_notes_bulk(make_corpus(count)))
+    db.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.connection.execute("VACUUM")
+    results = {
+        'label': label,
+        'size_mb': os.path.getsize(path) / 1024 / 1024,
+        'load': load,
+        'listing': timed(lambda: list_everything(db)),
+        'body_listing': timed(lambda: list_from_bodies(db)),
+        'scan': timed(lambda: scan_bodies(db)),
+    }
+    db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=100000, help="Notes in the corpus")
+    args = parser.parse_args()
+    # Every call here runs on the main thread; the UI-thread warnings are noise
+    logging.getLogger().setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rows = [
+            run('plain', args.notes, None, tmp_dir),
+            run('compressed', args.notes, COMPRESSION_THRESHOLD, tmp_dir),
+        ]
+
+    print(f"{args.notes} notes")
+    print(f"{'':12}{'size (MB)':>12}{'load (s)':>12}{'listing (s)':>14}"
+          f"{'listing from bodies (s)':>26}{'scan (s)':>12}")
+    for row in rows:
+        print(f"{row['label']:12}{row['size_mb']:12.1f}{row['load']:12.2f}"
+              f"{row['listing']:14.3f}{row['body_listing']:26.3f}{row['scan']:12.2f}")
+
+if __name__ == '__main__':
+    main()
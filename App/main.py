@@ -1,44 +1,36 @@
 # main.py
 
+# Taken before anything else is imported, so the startup profile includes
+# import time
+import time
+STARTUP_STARTED = time.perf_counter()
+
+import logging
+import os
+
 from kivymd.app import MDApp
-from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.uix.screenmanager import ScreenManager
 from kivy.core.window import Window
-from kivy.lang import Builder
 from kivy.clock import Clock
-from kivymd.uix.dialog import MDDialog
-from kivy.uix.button import Button
-from kivymd.uix.button import MDFlatButton
-# Import screen classes
-from screens.home_screen import HomeScreen
-from screens.editor_screen import EditorScreen
-from screens.settings_screen import SettingsScreen
-from screens.share_screen import ShareScreen
-
-# Import services
-from utils.database import DatabaseManager
-from services.cloud_service import GoogleDriveService
-from services.storage_service import StorageService
 
-import logging
+from screens.lazy_screen_manager import LazyScreenManager
+from Utils.startup_profile import StartupProfile
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Screens as 'module:ClassName', imported and built on first navigation
+SCREENS = {
+    'home': 'screens.home_screen:HomeScreen',
+    'editor': 'screens.Editor_screen:EditorScreen',
+    'settings': 'screens.Settings_screen:SettingsScreen',
+    'share': 'screens.Share_screen:ShareScreen',
+}
 
-# Remove or comment out the global initialization:
-# storage = StorageService()
-
-
+# Every launch appends its startup timings here
+STARTUP_PROFILE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'startup_profile.jsonl')
 
-class NotesApp(MDApp):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.sm = ScreenManager()
-        self.db = DatabaseManager()
-        self.storage = GoogleDriveService()
-        self.cloud = StorageService(self.db)
-        Window.size = (400, 600)
-        Window.minimum_width = 30
-        Window.minimum_height = 40
+startup_profile = StartupProfile(started=STARTUP_STARTED)
+startup_profile.mark('imports')
 
 
 class NotesApp(MDApp):
@@ -56,6 +48,12 @@ class NotesApp(MDApp):
         self.sm = ScreenManager()
         self.db = None
         self.storage = None
+        self.notes = None
+        self.cloud = None
+        self.sync = None
+        self.backup = None
+        self.outbox = None
+        self.sync_scheduler = None
 
         
         # Set initial window size and minimum dimensions
@@ -76,14 +74,16 @@ class NotesApp(MDApp):
             
             # Initialize services with error handling
             self.initialize_services()
+            self.migrate_database()
             
             # Create and configure screen manager
-            self.sm = ScreenManager()
+            self.sm = LazyScreenManager()
             self.load_screens()
             
             # Schedule a check for first-time setup
             Clock.schedule_once(self.check_first_time_setup, 0)
             
+            startup_profile.mark('build')
             return self.sm
             
         except Exception as e:
@@ -94,64 +94,133 @@ class NotesApp(MDApp):
         """
         Initializes all required services with proper error handling.
         """
+        # Services are imported here rather than at module level so their
+        # import cost is only paid once the app is being built
         try:
+            from Utils.database import DatabaseManager
+            from Utils.db_executor import DatabaseExecutor
+            from Services.storage_service import StorageService
+            
             self.db = DatabaseManager()
+            # Runs database calls off the UI thread and hands results back
+            # on the next frame
+            self.db_async = DatabaseExecutor(self.db)
             self.storage = StorageService(self.db)
-            # self.cloud = GoogleDriveService()
-       
-            self.cloud = GoogleDriveService()
+            # Screens read and write notes as Note objects through this
+            self.notes = self.storage.notes
         except Exception as e:
-            logging.warning(f"Could not initialize cloud service: {str(e)}")
-            self.cloud = None  # Explicitly set to None
+            raise Exception(f"Failed to initialize services: {str(e)}")
+            
+        try:
+            from Services.backup_service import BackupService
+            from Services.cloud_service import GoogleDriveService
+            from Services.outbox_worker import OutboxWorker
+            from Services.sync_scheduler import STARTUP_SYNC_DELAY, SyncScheduler
+            from Services.sync_service import SyncService
             
+            # The Drive client itself is built lazily, off the UI thread
+            self.cloud = GoogleDriveService.shared()
+            self.sync = SyncService(self.db, self.cloud)
+            self.backup = BackupService(self.db, self.cloud)
+            self.outbox = OutboxWorker(self.db, self.sync, startup_delay=STARTUP_SYNC_DELAY)
+            self.sync_scheduler = SyncScheduler(self.db, self.sync)
         except Exception as e:
-            raise Exception(f"Failed to initialize services: {str(e)}")
+            logging.warning(f"Could not initialize cloud service: {str(e)}")
+            self.cloud = None  # Explicitly set to None
+            self.sync = None
+            self.backup = None
+            self.outbox = None
+            self.sync_scheduler = None
+
+    def migrate_database(self):
+        """
+        Creates or migrates the database tables on the database worker
+        thread. The worker runs calls in order, so this is queued before the
+        screens are built: the home screen's first page query then runs
+        against the migrated schema.
+        """
+        self.db_async.submit(
+            self.db.create_tables,
+            on_result=lambda result: Clock.schedule_once(self.start_cloud_sync),
+            on_error=lambda e: self.show_error_dialog(f"Error during startup: {str(e)}")
+        )
 
     def load_screens(self):
         """
-        Adds all application screens to the screen manager.
+        Registers all application screens with the screen manager. Only the
+        home screen is built now; the others are imported and built the
+        first time they are opened.
         Uses try-except to handle potential import or initialization errors.
         """
-        screens = {
-            'home': HomeScreen,
-            'editor': EditorScreen,
-            'settings': SettingsScreen,
-            'share': ShareScreen
-        }
-        
-        for name, screen_class in screens.items():
-            try:
-                screen = screen_class(name= name)
-                self.sm.add_widget(screen)
-            except Exception as e:
-                self.show_error_dialog(f"Error loading {name} screen: {str(e)}")
+        for name, target in SCREENS.items():
+            self.sm.register(name, target)
+            
+        try:
+            self.sm.current = 'home'
+        except Exception as e:
+            self.show_error_dialog(f"Error loading home screen: {str(e)}")
 
     def on_start(self):
         """
         Handles initialization tasks after the application window is displayed.
-        Includes database setup and initial cloud sync.
         """
-        try:
-            # Create database tables if they don't exist
-            self.db.create_tables()
-            
-            # Attempt cloud sync in a separate thread to prevent UI freezing
-            Clock.schedule_once(self.delayed_cloud_sync, 1)
-        except Exception as e:
-            self.show_error_dialog(f"Error during startup: {str(e)}")
+        # The first frame is on screen once the window has flipped once
+        Window.bind(on_flip=self.on_first_frame)
 
-    def delayed_cloud_sync(self, dt):
-      
-        try:
-            def __init__(self):
-                    self.cloud = None
-            if self.cloud is not None:
-                    self.cloud.sync_notes()
-            else:
-                logging.error("Cloud service not initialized")
-            self.show_error_dialog("Cloud service not available")
-        except Exception as e:
-            self.show_error_dialog(f"Cloud sync failed: {str(e)}")
+    def on_first_frame(self, window):
+        """
+        Completes the startup profile when the first frame is displayed.
+        """
+        Window.unbind(on_flip=self.on_first_frame)
+        startup_profile.mark('first_frame')
+        startup_profile.save(STARTUP_PROFILE_PATH)
+        return False
+
+    def save_open_note(self):
+        """
+        Queues a save of the note open in the editor, if it has changes.
+        """
+        # Only screens already built are listed in screen_names
+        if 'editor' in self.sm.screen_names:
+            self.sm.get_screen('editor').save_now()
+
+    def on_pause(self):
+        """
+        Saves the note being edited, since a paused app may be killed
+        without on_stop being called.
+        """
+        self.save_open_note()
+        return True
+
+    def on_stop(self):
+        """
+        Lets queued database and storage writes finish before the app exits.
+        """
+        self.save_open_note()
+        if getattr(self, 'db_async', None) is not None:
+            self.db_async.shutdown(wait=True)
+        if getattr(self, 'storage', None) is not None:
+            self.storage.flush()
+        if getattr(self, 'sync_scheduler', None) is not None:
+            self.sync_scheduler.stop(timeout=5)
+        if getattr(self, 'outbox', None) is not None:
+            self.outbox.stop(timeout=5)
+        if getattr(self, 'cloud', None) is not None:
+            self.cloud.shutdown(wait=False)
+
+    def start_cloud_sync(self, dt):
+        """
+        Starts background cloud sync: the outbox worker, which sends notes
+        as they are saved, and the sync scheduler, whose later syncs follow
+        the edit rate. Both wait until launch has settled before their first
+        run, which is also when the Google client libraries are first
+        imported and the Drive client is built.
+        """
+        if self.sync is None:
+            logging.error("Cloud service not initialized")
+            return
+        self.outbox.start()
+        self.sync_scheduler.start()
 
     def check_first_time_setup(self, dt):
         """
@@ -165,6 +234,9 @@ class NotesApp(MDApp):
         """
         Displays a welcome dialog for first-time users.
         """
+        from kivymd.uix.dialog import MDDialog
+        from kivy.uix.button import Button
+        
         dialog = MDDialog(
             title="Welcome to Notes App!",
             text="Thank you for installing Notes App. Would you like to take a quick tour?",
@@ -185,6 +257,9 @@ class NotesApp(MDApp):
         """
         Displays an error dialog with the given message.
         """
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.button import MDFlatButton
+        
         dialog = MDDialog(
             title="Error",
             text=message,
@@ -1,16 +1,36 @@
 # screens/editor_screen.py
+import logging
+
+from kivy.clock import Clock
 from kivymd.uix.screen import MDScreen
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.button import button
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.app import MDApp
+from Model.note_draft import NoteDraft
+
+# Seconds of typing inactivity after which changes are saved
+AUTOSAVE_DELAY = 1.0
 
 
 class EditorScreen(MDScreen):
+    """
+    Edits a single note and saves it automatically.
+
+    Every text change restarts a Clock trigger, so a burst of typing causes
+    a single save once the user pauses for AUTOSAVE_DELAY seconds. The
+    title and content last saved are remembered by a NoteDraft and a save
+    is skipped when nothing differs from them. Leaving the screen saves at
+    once, and the write itself runs on the database worker thread.
+    """
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.current_note = None
+        app = MDApp.get_running_app()
+        self.draft = NoteDraft(app.notes, app.db_async)
+        self.autosave_trigger = Clock.create_trigger(self.autosave, AUTOSAVE_DELAY)
         self.setup_ui()
+        self.title_field.bind(text=self.on_text_changed)
+        self.content_field.bind(text=self.on_text_changed)
     
     def setup_ui(self):
         # Create main layout
@@ -74,39 +94,81 @@ class EditorScreen(MDScreen):
         # Add main layout to screen
         self.add_widget(layout)
     
-    def save_note(self, instance):
-        from Model.note import Note
-        
-        note = Note(
-            title=self.title_field.text,
-            content=self.content_field.text,
-            id=self.current_note.id if self.current_note else None
+    def load_note(self, note):
+        """
+        Shows a note for editing
+        Args:
+            note (Note): The note, with its content
+        """
+        self.autosave_trigger.cancel()
+        self.draft.load(note)
+        self.title_field.text = note.title
+        self.content_field.text = note.content or ""
+    
+    def is_dirty(self):
+        """Returns True if the fields differ from what was last saved"""
+        return self.draft.is_dirty(self.title_field.text, self.content_field.text)
+    
+    def on_text_changed(self, instance, value):
+        # Restart the countdown on every change, so the save happens once
+        # typing pauses
+        if self.is_dirty():
+            self.autosave_trigger.cancel()
+            self.autosave_trigger()
+    
+    def autosave(self, dt):
+        self.save_now()
+    
+    def save_now(self, on_saved=None):
+        """
+        Saves the fields on the database worker thread if they changed
+        Args:
+            on_saved (callable, optional): Called with the note once written
+        Returns:
+            bool: True if a save was queued
+        """
+        # The home screen updates from the database's change event
+        self.autosave_trigger.cancel()
+        return self.draft.save(
+            self.title_field.text, self.content_field.text,
+            on_saved=on_saved, on_error=self.on_save_error
         )
-        
-        app = MDApp.get_running_app()
-        app.storage.save_note(note)
-        
-        # Try to upload to cloud if available
-        try:
-            app.cloud.upload_note(note)
-        except:
-            pass  # Handle cloud upload failure gracefully
-        
-        self.clear_fields()
-        self.parent.current = 'home'
-        self.parent.get_screen('home').refresh_notes()
+    
+    def save_note(self, instance):
+        """
+        Saves and returns to the home screen. The fields are only cleared
+        once the note is written, so a failed write leaves the editor open
+        with the changes. Saving queues the note in the outbox; the outbox
+        worker uploads it.
+        """
+        if not self.save_now(on_saved=self.close_after_save):
+            self.close()
+    
+    def close_after_save(self, note):
+        # Text typed after Save was pressed is left to the autosave
+        if self.draft.note is note and not self.is_dirty():
+            self.close()
+    
+    def on_save_error(self, error):
+        logging.error(f"Failed to save note: {str(error)}")
+        # The draft keeps the changes marked unsaved, so the next change or
+        # leaving the screen tries again
+        MDApp.get_running_app().show_error_dialog(f"Failed to save note: {str(error)}")
     
     def cancel_edit(self, instance):
+        """Leaves without saving changes made since the last autosave"""
+        self.close()
+    
+    def close(self):
         self.clear_fields()
         self.parent.current = 'home'
     
     def clear_fields(self):
+        self.autosave_trigger.cancel()
+        self.draft.clear()
         self.title_field.text = ""
         self.content_field.text = ""
-        self.current_note = None
     
-    def on_pre_enter(self):
-        """Called before the screen is displayed"""
-        if self.current_note:
-            self.title_field.text = self.current_note.title
-            self.content_field.text = self.current_note.content
\ No newline at end of file
+    def on_pre_leave(self):
+        """Saves pending changes whenever the editor is left"""
+        self.save_now()
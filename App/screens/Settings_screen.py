@@ -1,5 +1,9 @@
 # screens/settings_screen.py
 
+import threading
+
+from kivy.clock import mainthread
+
 # Import necessary KivyMD components for building the UI
 from kivymd.uix.screen import MDScreen  # Base screen class
 from kivymd.uix.list import MDList      # Container for list items
@@ -109,6 +113,14 @@ class SettingsScreen(MDScreen):
         )
         settings_list.add_widget(sync_item)
         
+        # Add database backup setting
+        backup_item = SettingsItem(
+            icon_name="database-export",
+            text="Back Up Database to Cloud",
+            on_press=self.backup_database
+        )
+        settings_list.add_widget(backup_item)
+        
         # Add cloud account management setting
         account_item = SettingsItem(
             icon_name="account",
@@ -158,13 +170,63 @@ class SettingsScreen(MDScreen):
         Shows success or error message based on the result.
         """
         app = MDApp.get_running_app()
+        if app.sync is None:
+            self.show_message("Cloud service not available", is_error=True)
+            return
+        # Sync runs on a background thread; the result is shown on the UI thread
+        threading.Thread(target=self.run_sync, args=(app.sync,), daemon=True).start()
+    
+    def run_sync(self, sync):
         try:
-            app.cloud.sync_notes()
-            self.show_message("Sync completed successfully!")
-            # Update the home screen to show any changes from sync
-            self.parent.get_screen('home').refresh_notes()
+            result = sync.sync_notes()
         except Exception as e:
-            self.show_message(f"Sync failed: {str(e)}", is_error=True)
+            self.on_sync_finished(None, f"Sync failed: {str(e)}")
+            return
+        self.on_sync_finished(result, None)
+    
+    @mainthread
+    def on_sync_finished(self, result, error):
+        """
+        Reports the outcome of sync_with_cloud() to the user.
+        """
+        if error:
+            self.show_message(error, is_error=True)
+        elif result is None:
+            self.show_message("A sync is already in progress")
+        else:
+            self.show_message(
+                f"Sync completed successfully! "
+                f"{result['uploaded']} uploaded, {result['deleted']} deleted, "
+                f"{result['failed']} failed."
+            )
+    
+    def backup_database(self, instance):
+        """
+        Uploads a copy of the whole database. The backup runs on its own
+        thread and connection, so the app stays usable meanwhile.
+        """
+        app = MDApp.get_running_app()
+        if app.backup is None:
+            self.show_message("Cloud service not available", is_error=True)
+            return
+        thread = app.backup.start_database_backup(
+            on_result=lambda result: self.on_backup_finished(result, None),
+            on_error=lambda e: self.on_backup_finished(None, f"Backup failed: {str(e)}")
+        )
+        if thread is None:
+            self.show_message("A backup is already in progress")
+    
+    @mainthread
+    def on_backup_finished(self, result, error):
+        """
+        Reports the outcome of backup_database() to the user.
+        """
+        if error:
+            self.show_message(error, is_error=True)
+        else:
+            self.show_message(
+                f"Database backed up: {result['bytes'] // 1024} KB uploaded."
+            )
     
     def manage_cloud_account(self, instance):
         """
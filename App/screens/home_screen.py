@@ -1,16 +1,41 @@
 # screens/home_screen.py
+import logging
+
+from kivy.clock import mainthread
+from kivy.metrics import dp
+from kivy.properties import NumericProperty, ObjectProperty, StringProperty
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivymd.uix.screen import MDScreen
-from kivymd.uix.list import MDList
 from kivymd.uix.button import MDFlatButton
 from kivymd.uix.card import MDCard
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.label import MDLabel
 from kivymd.app import MDApp
+from Utils.database import NOTE_DELETED, NOTES_BULK_CHANGED
+
+# Number of notes fetched from the database per page while scrolling
+PAGE_SIZE = 50
+# Characters of content shown under each note title
+PREVIEW_LENGTH = 50
+# Fetch the next page once the list is scrolled this close to the bottom
+LOAD_MORE_THRESHOLD = 0.1
 
-class NoteListItem(MDCard):
-    def __init__(self, note, **kwargs):
+class NoteListItem(RecycleDataViewBehavior, MDCard):
+    """
+    One row of the notes list. The RecycleView only creates as many of these
+    as fit on screen and re-binds them to different notes while scrolling,
+    so the labels are built once and updated through properties.
+    """
+    note_id = NumericProperty(0)
+    title = StringProperty("")
+    preview = StringProperty("")
+    date_text = StringProperty("")
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.note = note
+        self.rv = None
         self.orientation = "vertical"
         self.size_hint_y = None
         self.height = "100dp"
@@ -28,7 +53,6 @@ class NoteListItem(MDCard):
         
         # Add title
         title = MDLabel(
-            text=note.title,
             bold=True,
             font_style="H6",
             size_hint_y=None,
@@ -37,19 +61,22 @@ class NoteListItem(MDCard):
         
         # Add content preview
         content = MDLabel(
-            text=note.content[:50] + "..." if len(note.content) > 50 else note.content,
             size_hint_y=None,
             height="24dp"
         )
         
         # Add date
         date = MDLabel(
-            text=note.updated_at.strftime("%Y-%m-%d %H:%M"),
             theme_text_color="Secondary",
             size_hint_y=None,
             height="20dp"
         )
         
+        # Keep the labels in step with whichever note this row shows
+        self.bind(title=title.setter('text'))
+        self.bind(preview=content.setter('text'))
+        self.bind(date_text=date.setter('text'))
+        
         # Add all elements to box layout
         box.add_widget(title)
         box.add_widget(content)
@@ -57,11 +84,40 @@ class NoteListItem(MDCard):
         
         # Add box layout to card
         self.add_widget(box)
+        self.bind(on_press=self.open_note)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Called by the RecycleView when this row is bound to a note."""
+        self.rv = rv
+        return super().refresh_view_attrs(rv, index, data)
+
+    def open_note(self, instance):
+        if self.rv is not None and self.rv.open_note:
+            self.rv.open_note(self.note_id)
+
+class NotesRecycleView(RecycleView):
+    """RecycleView for the notes list that forwards row taps to open_note."""
+    open_note = ObjectProperty(None, allownone=True)
 
 class HomeScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # Keyset cursor for the next page, or None once every note is loaded
+        self.next_cursor = None
+        self.all_loaded = False
+        # Pages load in the background; the generation lets a refresh
+        # discard pages still in flight from before it
+        self.loading = False
+        self.list_generation = 0
+        # Index in notes_list.data of each listed note, so a change finds
+        # its row without scanning the list
+        self.row_index = {}
         self.setup_ui()
+        
+        # Patch single rows when notes change instead of reloading the list
+        app = MDApp.get_running_app()
+        if app is not None and app.db is not None:
+            app.db.add_note_listener(self.on_note_changed)
     
     def setup_ui(self):
         # Create main layout
@@ -71,13 +127,20 @@ class HomeScreen(MDScreen):
             padding="8dp"
         )
         
-        # Create notes list with scrolling
-        self.notes_list = MDList(
-            spacing="8dp",
-            padding="8dp",
+        # Create a recycling notes list: only the visible rows exist as widgets
+        self.notes_list = NotesRecycleView(open_note=self.open_note)
+        self.notes_list.viewclass = NoteListItem
+        rows = RecycleBoxLayout(
+            orientation="vertical",
+            spacing=dp(8),
+            padding=dp(8),
+            default_size=(None, dp(100)),
+            default_size_hint=(1, None),
             size_hint_y=None
         )
-        self.notes_list.bind(minimum_height=self.notes_list.setter('height'))
+        rows.bind(minimum_height=rows.setter('height'))
+        self.notes_list.add_widget(rows)
+        self.notes_list.bind(scroll_y=self.on_notes_scroll)
         
         # Add list to layout
         self.layout.add_widget(self.notes_list)
@@ -96,18 +159,140 @@ class HomeScreen(MDScreen):
     def new_note(self, instance):
         self.parent.current = 'editor'
     
+    def on_pre_enter(self):
+        """Loads the first page the first time the screen is shown."""
+        if not self.notes_list.data and not self.all_loaded and not self.loading:
+            self.refresh_notes()
+
     def refresh_notes(self):
-        self.notes_list.clear_widgets()
+        """
+        Reloads the list from the first page. Existing row widgets are
+        recycled, so this only touches the rows currently on screen.
+        """
+        self.list_generation += 1
+        self.next_cursor = None
+        self.all_loaded = False
+        self.loading = False
+        self.notes_list.data = []
+        self.row_index = {}
+        self.load_more_notes()
+        self.notes_list.scroll_y = 1
+
+    def load_more_notes(self):
+        """Fetches the next page of notes on the database worker thread."""
+        if self.all_loaded or self.loading:
+            return
+        self.loading = True
+        generation = self.list_generation
         app = MDApp.get_running_app()
-        notes = app.storage.get_all_notes()
-        for note in notes:
-            item = NoteListItem(note)
-            item.bind(on_press=lambda x, note=note: self.open_note(note))
-            self.notes_list.add_widget(item)
-    
-    def open_note(self, note):
-        editor_screen = self.parent.get_screen('editor')
-        editor_screen.current_note = note
-        editor_screen.title_field.text = note.title
-        editor_screen.content_field.text = note.content
-        self.parent.current = 'editor'
\ No newline at end of file
+        app.db_async.submit(
+            app.notes.list_page,
+            limit=PAGE_SIZE,
+            cursor=self.next_cursor,
+            preview_length=PREVIEW_LENGTH + 1,
+            on_result=lambda page: self.on_page_loaded(generation, page),
+            on_error=self.on_page_error
+        )
+
+    def on_page_loaded(self, generation, page):
+        """Appends a page fetched by load_more_notes() to the list."""
+        if generation != self.list_generation:
+            return
+        notes, self.next_cursor = page
+        self.loading = False
+        self.all_loaded = self.next_cursor is None
+        
+        # Notes saved while the page was loading may already be listed
+        data = self.notes_list.data
+        start = len(data)
+        data.extend(
+            self.note_to_row(note) for note in notes if note.id not in self.row_index
+        )
+        self.reindex_rows(start, len(data))
+
+    def on_page_error(self, error):
+        self.loading = False
+        logging.error(f"Failed to load notes: {str(error)}")
+
+    def on_notes_scroll(self, instance, scroll_y):
+        if scroll_y <= LOAD_MORE_THRESHOLD and not self.all_loaded:
+            self.load_more_notes()
+
+    @staticmethod
+    def note_to_row(note):
+        """
+        Converts a listed Note into RecycleView row data. Only the title and
+        preview are used, so the note's content is never loaded.
+        """
+        preview = note.preview or ""
+        if len(preview) > PREVIEW_LENGTH:
+            preview = preview[:PREVIEW_LENGTH] + "..."
+        return {
+            'note_id': note.id,
+            'title': note.title,
+            'preview': preview,
+            'date_text': note.updated_at.strftime('%Y-%m-%d %H:%M') if note.updated_at else ""
+        }
+
+    def reindex_rows(self, start, stop):
+        """Records the index of the rows from start up to stop."""
+        data = self.notes_list.data
+        for index in range(start, stop):
+            self.row_index[data[index]['note_id']] = index
+
+    def apply_note_saved(self, note):
+        """
+        Moves a created or updated note to the top of the list without
+        reloading anything else. A note already at the top, as while it is
+        being edited and autosaved, is updated in place.
+        """
+        data = self.notes_list.data
+        row = self.note_to_row(note)
+        index = self.row_index.get(note.id)
+        if index == 0:
+            data[0] = row
+            return
+        if index is not None:
+            data.pop(index)
+        else:
+            index = len(data)
+        data.insert(0, row)
+        # Only the rows above the old position have moved
+        self.reindex_rows(0, index + 1)
+
+    def apply_note_deleted(self, note_id):
+        """Removes a single note's row from the list."""
+        index = self.row_index.pop(note_id, None)
+        if index is not None:
+            self.notes_list.data.pop(index)
+            self.reindex_rows(index, len(self.notes_list.data))
+
+    @mainthread
+    def on_note_changed(self, event, note_id, note):
+        """
+        Applies a note change event from the database as a single-row update,
+        or reloads the list after a bulk write. Writes may happen on the
+        database worker thread, so this always runs on the UI thread.
+        """
+        if event == NOTES_BULK_CHANGED:
+            self.refresh_notes()
+        elif event == NOTE_DELETED:
+            self.apply_note_deleted(note_id)
+        else:
+            self.apply_note_saved(MDApp.get_running_app().notes.from_summary(note))
+
+    def open_note(self, note_id):
+        app = MDApp.get_running_app()
+        app.db_async.submit(
+            app.notes.get,
+            note_id,
+            on_result=lambda note: self.show_note(note_id, note)
+        )
+
+    def show_note(self, note_id, note):
+        """Opens a note fetched by open_note() in the editor."""
+        if note is None:
+            self.apply_note_deleted(note_id)
+            return
+        self.parent.get_screen('editor').load_note(note)
+        self.parent.current = 'editor'
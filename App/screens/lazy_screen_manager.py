@@ -0,0 +1,50 @@
+# screens/lazy_screen_manager.py
+import importlib
+import logging
+import time
+
+from kivy.uix.screenmanager import ScreenManager
+
+
+class LazyScreenManager(ScreenManager):
+    """
+    A ScreenManager that imports and builds each screen the first time it
+    is needed, either by navigating to it or by get_screen(). Only the
+    first screen shown is constructed at startup.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Screen name to 'module:ClassName' for screens not built yet
+        self.screen_factories = {}
+        # Screen name to seconds taken to import and build it
+        self.build_times = {}
+
+    def register(self, name, target):
+        """
+        Registers a screen to be built on first use.
+
+        Args:
+            name (str): Screen name used for navigation
+            target (str): 'module:ClassName' of the screen class
+        """
+        self.screen_factories[name] = target
+
+    def build_screen(self, name):
+        """Imports, builds and adds a registered screen."""
+        module_name, class_name = self.screen_factories.pop(name).split(':')
+        started = time.perf_counter()
+        screen_class = getattr(importlib.import_module(module_name), class_name)
+        screen = screen_class(name=name)
+        self.add_widget(screen)
+        self.build_times[name] = time.perf_counter() - started
+        logging.debug(f"Built {name} screen in {self.build_times[name] * 1000:.1f} ms")
+        return screen
+
+    def get_screen(self, name):
+        if name in self.screen_factories:
+            return self.build_screen(name)
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.screen_factories or super().has_screen(name)
@@ -0,0 +1,998 @@
+# tests/test_cloud.py
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+
+from Model.note import note_content_hash, note_payload
+from Utils.database import DatabaseManager
+from Services import cloud_service, sync_service
+from Services.backup_service import SNAPSHOT_STATE_KEY, BackupService
+from Services.outbox_worker import OutboxWorker
+from Services.sync_scheduler import SyncScheduler
+from Services.cloud_service import GoogleDriveService, UploadResult
+from Services.sync_service import SyncService
+from Utils.snapshot_bundle import BundleError
+
+
+class FakeDrive:
+    """
+    Local stand-in for GoogleDriveService that keeps files in a dict and
+    records every request, so tests can count network round-trips.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        self.next_id = 1
+        self.fail_titles = set()
+        self.on_upload = None
+        # Changes feed as (file_id, removed); a page token is an index into it
+        self.changes = []
+        self.listings = 0
+        # Contents of files uploaded with upload_file()
+        self.blobs = {}
+        self.signed_in = True
+        # interactive flag of every authenticate() call
+        self.auth_requests = []
+
+    def authenticate(self, interactive=True):
+        self.auth_requests.append(interactive)
+        return self.signed_in
+
+    def upload_note(self, note, file_id=None):
+        self.requests.append(('upload', note['id'], file_id))
+        if note['title'] in self.fail_titles:
+            raise ConnectionError("network unavailable")
+        if self.on_upload:
+            self.on_upload(note)
+        if file_id is None or file_id not in self.files:
+            file_id = f"drive-{self.next_id}"
+            self.next_id += 1
+        self.files[file_id] = (note['title'], note['content'])
+        self.changes.append((file_id, False))
+        return file_id
+
+    def upload_notes_bulk(self, notes):
+        results = []
+        for note in notes:
+            try:
+                file_id = self.upload_note(note, note.get('cloud_id'))
+                results.append(UploadResult(note['id'], file_id, None))
+            except Exception as e:
+                results.append(UploadResult(note['id'], None, e))
+        return results
+
+    def upload_file(self, file_path, file_name=None):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        file_id = f"drive-{self.next_id}"
+        self.next_id += 1
+        self.requests.append(('upload_file', file_id, len(data)))
+        self.blobs[file_id] = data
+        return file_id
+
+    def download_range(self, file_id, start, end=None):
+        self.requests.append(('range', file_id, start, end))
+        data = self.blobs[file_id]
+        if start < 0:
+            return data[start:], len(data)
+        return data[start:None if end is None else end + 1], len(data)
+
+    def delete_file(self, file_id):
+        self.requests.append(('delete', file_id))
+        self.changes.append((file_id, True))
+        self.blobs.pop(file_id, None)
+        return self.files.pop(file_id, None) is not None
+
+    def remove_remotely(self, file_id):
+        """Deletes a file as if from another device."""
+        del self.files[file_id]
+        self.changes.append((file_id, True))
+
+    def metadata(self, file_id):
+        title, content = self.files[file_id]
+        return {'id': file_id, 'name': f"{title}.txt",
+                'md5Checksum': note_content_hash(title, content)}
+
+    def iter_files(self, query=None):
+        self.listings += 1
+        for file_id in list(self.files):
+            yield self.metadata(file_id)
+
+    def get_changes_start_token(self):
+        return str(len(self.changes))
+
+    def list_changes(self, page_token):
+        changes = []
+        for file_id, removed in self.changes[int(page_token):]:
+            change = {'fileId': file_id, 'removed': removed or file_id not in self.files}
+            if not change['removed']:
+                change['file'] = self.metadata(file_id)
+            changes.append(change)
+        return changes, str(len(self.changes))
+
+
+class FakeCredentials:
+    """Credentials whose refresh() just moves the expiry forward."""
+
+    def __init__(self, expires_in):
+        self.refresh_token = 'refresh'
+        self.refreshes = 0
+        self.expiry = self.utc_now() + timedelta(seconds=expires_in)
+
+    @staticmethod
+    def utc_now():
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = self.utc_now() + timedelta(hours=1)
+
+
+class MockDriveHandler(BaseHTTPRequestHandler):
+    """
+    Serves the Drive v3 media upload endpoints. Each request is held for a
+    moment so overlapping uploads can be observed.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Serves server.media for alt=media requests, honouring Range."""
+        if 'alt=media' not in self.path:
+            if urlparse(self.path).path.endswith('/files'):
+                self.list_files()
+            else:
+                self.file_metadata()
+            return
+        media = self.server.media
+        with self.server.lock:
+            self.server.ranges.append(self.headers.get('Range'))
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range') or '')
+        if match and match.group(1) and int(match.group(1)) >= self.server.fail_from:
+            # Simulates the connection dropping part way through a download
+            self.respond(503, {'error': {'code': 503, 'message': 'Unavailable'}})
+            return
+        if match is None:
+            self.send_bytes(200, media, {})
+            return
+        if not match.group(1):
+            # Suffix range: the last N bytes
+            start, end = max(len(media) - int(match.group(2)), 0), len(media) - 1
+        else:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(media) - 1
+        if start >= len(media):
+            self.send_bytes(416, b'', {'Content-Range': f"bytes */{len(media)}"})
+            return
+        chunk = media[start:end + 1]
+        self.send_bytes(206, chunk, {
+            'Content-Range': f"bytes {start}-{start + len(chunk) - 1}/{len(media)}"
+        })
+
+    def file_metadata(self):
+        """Serves the metadata of server.media."""
+        self.respond(200, {
+            'md5Checksum': self.server.md5 or hashlib.md5(self.server.media).hexdigest(),
+            'modifiedTime': self.server.modified_time,
+        })
+
+    def list_files(self):
+        """Serves server.listing five files per page."""
+        query = parse_qs(urlparse(self.path).query)
+        start = int(query.get('pageToken', ['0'])[0])
+        with self.server.lock:
+            self.server.requests.append(('GET', self.path, b''))
+        payload = {'files': self.server.listing[start:start + 5]}
+        if start + 5 < len(self.server.listing):
+            payload['nextPageToken'] = str(start + 5)
+        self.respond(200, payload)
+
+    def do_POST(self):
+        self.handle_upload(None)
+
+    def do_PATCH(self):
+        self.handle_upload(self.path.split('?')[0].rsplit('/', 1)[-1])
+
+    def handle_upload(self, file_id):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+            server.requests.append((self.command, self.path, body))
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+            if file_id is None:
+                file_id = f"drive-{len(server.requests)}"
+        if file_id == 'missing':
+            self.respond(404, {'error': {'code': 404, 'message': 'File not found'}})
+        else:
+            self.respond(200, {'id': file_id})
+
+    def respond(self, status, payload):
+        self.send_bytes(status, json.dumps(payload).encode('utf-8'),
+                        {'Content-Type': 'application/json'})
+
+    def send_bytes(self, status, data, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DriveServerTestCase(unittest.TestCase):
+    """Runs GoogleDriveService against a local mock of the Drive API."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockDriveHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = 0
+        self.server.peak_in_flight = 0
+        self.server.requests = []
+        self.server.delay = 0.05
+        self.server.media = b''
+        self.server.ranges = []
+        self.server.listing = []
+        self.server.fail_from = float('inf')
+        # Overrides the md5 reported for server.media when set
+        self.server.md5 = None
+        self.server.modified_time = '2024-01-01T00:00:00.000Z'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        doc = json.loads(get_static_doc('drive', 'v3'))
+        doc['rootUrl'] = f"http://127.0.0.1:{self.server.server_port}/"
+        self.drive = GoogleDriveService()
+        self.drive.service = build_from_document(doc, http=httplib2.Http())
+        self.drive.http_factory = httplib2.Http
+
+    def tearDown(self):
+        self.drive.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestDriveUploads(DriveServerTestCase):
+
+    def test_bulk_upload_runs_requests_concurrently(self):
+        notes = [{'id': i, 'title': f"Note {i}", 'content': "body"} for i in range(12)]
+
+        started = time.perf_counter()
+        results = self.drive.upload_notes_bulk(notes)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([result.note_id for result in results], list(range(12)))
+        self.assertTrue(all(result.error is None and result.file_id for result in results))
+        self.assertEqual(self.server.peak_in_flight, 4)
+        # Twelve requests back to back would take at least 0.6 s
+        self.assertLess(elapsed, 12 * self.server.delay)
+
+    def test_upload_threads_are_kept_between_calls(self):
+        def upload_threads():
+            return {thread for thread in threading.enumerate()
+                    if thread.name.startswith('drive-upload')}
+
+        notes = [{'id': i, 'title': f"Note {i}", 'content': "body"} for i in range(8)]
+        self.drive.upload_notes_bulk(notes)
+        first = upload_threads()
+        self.drive.upload_notes_bulk(notes)
+
+        self.assertEqual(len(first), self.drive.upload_workers)
+        self.assertEqual(upload_threads(), first)
+
+        self.drive.shutdown()
+        self.assertEqual(upload_threads(), set())
+
+    def test_small_notes_use_a_single_multipart_request(self):
+        self.drive.upload_notes_bulk([{'id': 1, 'title': "Short", 'content': "body"}])
+
+        [(method, path, body)] = self.server.requests
+        self.assertEqual(method, 'POST')
+        self.assertIn('uploadType=multipart', path)
+        self.assertIn(b'Short\n\nbody', body)
+
+    def test_existing_files_are_overwritten(self):
+        results = self.drive.upload_notes_bulk([
+            {'id': 1, 'title': "Edited", 'content': "body", 'cloud_id': 'drive-abc'},
+        ])
+
+        self.assertEqual(results[0].file_id, 'drive-abc')
+        [(method, path, _)] = self.server.requests
+        self.assertEqual(method, 'PATCH')
+        self.assertIn('/files/drive-abc', path)
+
+    def test_file_missing_from_drive_is_uploaded_again(self):
+        results = self.drive.upload_notes_bulk([
+            {'id': 1, 'title': "Orphan", 'content': "body", 'cloud_id': 'missing'},
+        ])
+
+        self.assertIsNone(results[0].error)
+        self.assertEqual([request[0] for request in self.server.requests], ['PATCH', 'POST'])
+
+
+class TestSyncService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir.name, 'notes.db'))
+        self.db.create_tables()
+        self.drive = FakeDrive()
+        self.sync = SyncService(self.db, self.drive, batch_size=3)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_first_sync_uploads_every_note(self):
+        for i in range(7):
+            self.db.save_note(f"Note {i}", f"body {i}")
+
+        result = self.sync.sync_notes()
+
+        self.assertEqual(result['uploaded'], 7)
+        self.assertEqual(len(self.drive.files), 7)
+        self.assertEqual(self.db.get_notes_pending_sync(), [])
+
+    def test_sync_only_sends_changed_notes(self):
+        note_ids = [self.db.save_note(f"Note {i}", "body") for i in range(5)]
+        self.sync.sync_notes()
+        self.drive.requests = []
+
+        self.db.save_note("Note 2", "edited body", note_ids[2])
+        result = self.sync.sync_notes()
+
+        self.assertEqual(result['uploaded'], 1)
+        self.assertEqual(len(self.drive.requests), 1)
+        # The edit overwrites the note's existing Drive file
+        _, note_id, file_id = self.drive.requests[0]
+        self.assertEqual(note_id, note_ids[2])
+        self.assertEqual(self.drive.files[file_id], ("Note 2", "edited body"))
+        self.assertEqual(len(self.drive.files), 5)
+
+    def test_nothing_changed_means_no_requests(self):
+        self.db.save_note("Note", "body")
+        self.sync.sync_notes()
+        self.drive.requests = []
+
+        self.sync.sync_notes()
+
+        self.assertEqual(self.drive.requests, [])
+
+    def test_soft_delete_removes_drive_file(self):
+        note_id = self.db.save_note("Doomed", "body")
+        self.sync.sync_notes()
+
+        self.db.delete_note(note_id)
+        result = self.sync.sync_notes()
+
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(self.drive.files, {})
+        self.assertEqual(self.db.get_notes_pending_sync(), [])
+
+    def test_deleting_unsynced_note_sends_nothing(self):
+        note_id = self.db.save_note("Never synced", "body")
+        self.db.delete_note(note_id)
+
+        self.sync.sync_notes()
+
+        self.assertEqual(self.drive.requests, [])
+        self.assertEqual(self.db.get_notes_pending_sync(), [])
+
+    def test_failed_upload_is_retried_next_sync(self):
+        self.db.save_note("Flaky", "body")
+        self.db.save_note("Fine", "body")
+        self.drive.fail_titles.add("Flaky")
+
+        result = self.sync.sync_notes()
+        self.assertEqual((result['uploaded'], result['failed']), (1, 1))
+
+        self.drive.fail_titles.clear()
+        result = self.sync.sync_notes()
+        self.assertEqual((result['uploaded'], result['failed']), (1, 0))
+
+    def test_edit_during_upload_stays_pending(self):
+        note_id = self.db.save_note("Racing", "first version")
+
+        def edit_while_uploading(note):
+            self.drive.on_upload = None
+            self.db.save_note("Racing", "second version", note_id)
+
+        self.drive.on_upload = edit_while_uploading
+        self.sync.sync_notes()
+
+        pending = self.db.get_notes_pending_sync()
+        self.assertEqual([note['content'] for note in pending], ["second version"])
+
+        self.sync.sync_notes()
+        self.assertEqual(list(self.drive.files.values()), [("Racing", "second version")])
+
+    def test_save_without_edits_sends_nothing(self):
+        note_id = self.db.save_note("Same", "unchanged body")
+        first = self.sync.sync_notes()
+        self.drive.requests = []
+
+        self.db.save_note("Same", "unchanged body", note_id)
+        result = self.sync.sync_notes()
+
+        self.assertEqual(self.drive.requests, [])
+        self.assertEqual((result['uploaded'], result['unchanged']), (0, 1))
+        self.assertEqual(self.db.get_notes_pending_sync(), [])
+
+        size = len(note_payload("Same", "unchanged body"))
+        self.assertEqual((first['bytes_sent'], result['bytes_skipped']), (size, size))
+        self.assertEqual((self.sync.bytes_sent, self.sync.bytes_skipped), (size, size))
+
+    def test_note_changed_on_drive_is_uploaded_again(self):
+        note_id = self.db.save_note("Shared", "local body")
+        self.sync.sync_notes()
+        [file_id] = self.drive.files
+        # Another device overwrites the file
+        self.drive.files[file_id] = ("Shared", "remote body")
+        self.drive.changes.append((file_id, False))
+
+        self.db.save_note("Shared", "local body", note_id)
+        result = self.sync.sync_notes()
+
+        self.assertEqual(result['uploaded'], 1)
+        self.assertEqual(self.drive.files[file_id], ("Shared", "local body"))
+
+    def test_outbox_sends_only_the_latest_version(self):
+        note_id = self.db.save_note("Draft", "one")
+        self.db.save_note("Draft", "two", note_id)
+        self.db.save_note("Draft", "three", note_id)
+
+        result = self.sync.drain_outbox()
+
+        self.assertEqual(result['uploaded'], 1)
+        self.assertEqual(list(self.drive.files.values()), [("Draft", "three")])
+        self.assertIsNone(self.db.get_next_outbox_attempt())
+
+    def test_failed_outbox_entries_back_off(self):
+        self.db.save_note("Flaky", "body")
+        self.drive.fail_titles.add("Flaky")
+
+        before = time.time()
+        self.assertEqual(self.sync.drain_outbox()['failed'], 1)
+        self.assertGreaterEqual(self.db.get_next_outbox_attempt(),
+                                before + sync_service.OUTBOX_RETRY_BASE / 2)
+
+        # Not due yet, so nothing is sent
+        self.drive.requests = []
+        self.assertEqual(self.sync.drain_outbox()['failed'], 0)
+        self.assertEqual(self.drive.requests, [])
+
+        # A manual sync retries at once and clears the entry
+        self.drive.fail_titles.clear()
+        self.assertEqual(self.sync.sync_notes()['uploaded'], 1)
+        self.assertIsNone(self.db.get_next_outbox_attempt())
+
+    def test_retry_delay_grows_exponentially(self):
+        delays = [sync_service.retry_delay(attempts, base=1, maximum=100)
+                  for attempts in range(8)]
+        self.assertTrue(0.5 <= delays[0] <= 1)
+        self.assertTrue(16 <= delays[5] <= 32)
+        self.assertTrue(50 <= delays[7] <= 100)
+
+    def test_outbox_worker_uploads_saved_notes(self):
+        worker = OutboxWorker(self.db, self.sync, debounce=0.01)
+        worker.start()
+        try:
+            self.db.save_note("Queued", "body")
+            deadline = time.monotonic() + 2
+            while not self.drive.files and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            worker.stop(timeout=2)
+
+        self.assertEqual(list(self.drive.files.values()), [("Queued", "body")])
+
+    def test_outbox_worker_waits_for_startup_delay(self):
+        self.db.save_note("Left over", "body")
+        worker = OutboxWorker(self.db, self.sync, debounce=0.01, startup_delay=0.2)
+        started = time.monotonic()
+        worker.start()
+        try:
+            time.sleep(0.05)
+            self.assertEqual(self.drive.auth_requests, [])
+            while not self.drive.files and time.monotonic() < started + 2:
+                time.sleep(0.01)
+        finally:
+            worker.stop(timeout=2)
+
+        self.assertEqual(list(self.drive.files.values()), [("Left over", "body")])
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_outbox_worker_waits_for_sign_in(self):
+        self.drive.signed_in = False
+        worker = OutboxWorker(self.db, self.sync, debounce=0.01)
+        worker.start()
+        try:
+            self.db.save_note("Queued", "body")
+            time.sleep(0.1)
+        finally:
+            worker.stop(timeout=2)
+
+        self.assertEqual(self.drive.requests, [])
+        self.assertNotIn(True, self.drive.auth_requests)
+        self.assertIsNotNone(self.db.get_next_outbox_attempt())
+
+    def test_remote_state_is_cached_and_updated_from_changes(self):
+        self.db.save_note("First", "body")
+        self.sync.sync_notes()
+        self.db.save_note("Second", "body")
+        self.sync.sync_notes()
+        self.sync.refresh_remote_files()
+
+        # Only the first sync lists Drive; later ones read the changes feed
+        self.assertEqual(self.drive.listings, 1)
+        cached = {file['id'] for file in self.db.get_drive_files()}
+        self.assertEqual(cached, set(self.drive.files))
+
+    def test_note_removed_from_drive_is_uploaded_again(self):
+        note_id = self.db.save_note("Lost", "body")
+        self.sync.sync_notes()
+        [file_id] = self.drive.files
+        self.drive.remove_remotely(file_id)
+
+        result = self.sync.sync_notes()
+
+        self.assertEqual(result['uploaded'], 1)
+        self.assertEqual(list(self.drive.files.values()), [("Lost", "body")])
+        self.assertEqual(self.drive.requests[-1], ('upload', note_id, None))
+
+
+class FakeClock:
+    """Monotonic clock advanced by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSyncScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir.name, 'notes.db'))
+        self.db.create_tables()
+        self.drive = FakeDrive()
+        self.sync = SyncService(self.db, self.drive)
+        self.clock = FakeClock()
+        self.scheduler = SyncScheduler(self.db, self.sync, startup_delay=10,
+                                       min_interval=60, max_interval=200,
+                                       edit_delay=15, clock=self.clock)
+        # Listen for edits as start() does, but tick by hand
+        self.db.add_note_listener(self.scheduler.on_note_changed)
+        self.scheduler.request_sync()
+        self.scheduler.tick()
+
+    def tearDown(self):
+        self.db.remove_note_listener(self.scheduler.on_note_changed)
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        return self.scheduler.tick()
+
+    def test_quiet_syncs_back_off(self):
+        intervals = []
+        for _ in range(3):
+            intervals.append(self.scheduler.interval)
+            self.assertIsNone(self.advance(self.scheduler.interval - 1))
+            self.assertIsNotNone(self.advance(1))
+
+        self.assertEqual(intervals, [120, 200, 200])
+        self.assertEqual(self.scheduler.runs, 4)
+
+    def test_burst_of_edits_is_synced_once(self):
+        for i in range(3):
+            self.db.save_note(f"Note {i}", "body")
+            self.assertIsNone(self.advance(5))
+        # 15 seconds after the last edit
+        self.assertIsNone(self.advance(9))
+        result = self.advance(1)
+
+        self.assertEqual(result['uploaded'], 3)
+        self.assertEqual(self.scheduler.runs, 2)
+        self.assertEqual(self.scheduler.interval, 60)
+
+    def test_continuous_edits_are_synced_within_min_interval(self):
+        note_id = self.db.save_note("Busy", "body 0")
+        ran = []
+        for i in range(1, 7):
+            ran.append(self.advance(10) is not None)
+            self.db.save_note("Busy", f"body {i}", note_id)
+
+        self.assertEqual(ran, [False] * 5 + [True])
+
+    def test_sync_in_flight_is_skipped(self):
+        self.db.save_note("Pending", "body")
+        self.scheduler.request_sync()
+        with self.sync.sync_lock:
+            self.assertIsNone(self.scheduler.tick())
+
+        self.assertEqual(self.scheduler.skipped_runs, 1)
+        self.assertEqual(self.drive.files, {})
+        self.assertEqual(self.scheduler.seconds_until_next_run(), 60)
+        self.assertEqual(self.advance(60)['uploaded'], 1)
+
+    def test_failing_syncs_back_off(self):
+        for i in range(5):
+            self.db.save_note(f"Offline {i}", "body")
+            self.drive.fail_titles.add(f"Offline {i}")
+        self.advance(15)
+
+        intervals = []
+        for _ in range(3):
+            intervals.append(self.scheduler.interval)
+            result = self.advance(self.scheduler.interval)
+            self.assertEqual(result['failed'], 5)
+
+        self.assertEqual(intervals, [120, 200, 200])
+
+    def test_signed_out_syncs_back_off_without_prompting(self):
+        self.drive.signed_in = False
+        self.db.save_note("Local", "body")
+        self.advance(15)
+        self.advance(self.scheduler.interval)
+
+        self.assertEqual(self.scheduler.interval, 200)
+        self.assertEqual(self.drive.requests, [])
+        self.assertNotIn(True, self.drive.auth_requests)
+
+    def test_only_remote_changes_count_as_activity(self):
+        self.db.save_note("Note", "body")
+        self.advance(15)
+
+        # The changes feed reports this device's own upload
+        result = self.advance(60)
+        self.assertEqual(result['remote_changes'], 0)
+        self.assertEqual(self.scheduler.interval, 120)
+
+        [file_id] = self.drive.files
+        self.drive.remove_remotely(file_id)
+        result = self.advance(120)
+        self.assertEqual(result['remote_changes'], 1)
+        self.assertEqual(self.scheduler.interval, 60)
+
+    def test_first_sync_waits_for_startup_delay(self):
+        scheduler = SyncScheduler(self.db, self.sync, startup_delay=0.2)
+        started = time.monotonic()
+        scheduler.start()
+        try:
+            self.assertEqual(scheduler.runs, 0)
+            deadline = started + 2
+            while scheduler.runs == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            scheduler.stop(timeout=2)
+
+        self.assertEqual(scheduler.runs, 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+class TestBackupService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp_dir.name, 'notes.db'))
+        self.db.create_tables()
+        self.drive = FakeDrive()
+        # Small chunks so a modest library spans many of them
+        self.backup = BackupService(self.db, self.drive, chunk_size=4096,
+                                    work_dir=self.tmp_dir.name)
+        self.note_ids = [
+            self.db.save_note(f"Note {i}", f"body of note {i} " * (i % 50 + 1))
+            for i in range(300)
+        ]
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def lose_local_notes(self):
+        with self.db.transaction() as connection:
+            connection.execute("DELETE FROM notes")
+
+    def notes_by_title(self):
+        return {note['title']: note['content'] for note in self.db.get_all_notes()}
+
+    def test_full_backup_is_one_upload_and_restores_in_few_requests(self):
+        expected = self.notes_by_title()
+        result = self.backup.backup()
+
+        self.assertTrue(result['full'])
+        self.assertEqual(result['notes'], 300)
+        self.assertEqual([request[0] for request in self.drive.requests], ['upload_file'])
+        manifest = self.backup.read_manifest(result['file_id'])
+        self.assertGreater(len(manifest['chunks']), 10)
+
+        self.lose_local_notes()
+        self.drive.requests = []
+        self.assertEqual(self.backup.restore(), 300)
+
+        self.assertEqual(self.notes_by_title(), expected)
+        # The tail with the manifest, then every chunk in one ranged request
+        self.assertEqual(len(self.drive.requests), 2)
+
+    def test_restoring_one_note_fetches_only_its_chunk(self):
+        result = self.backup.backup()
+        manifest = self.backup.read_manifest(result['file_id'])
+        self.lose_local_notes()
+        self.drive.requests = []
+
+        self.assertEqual(self.backup.restore([self.note_ids[150]]), 1)
+
+        self.assertEqual(list(self.notes_by_title()), ["Note 150"])
+        _, _, start, end = self.drive.requests[-1]
+        [chunk] = [c for c in manifest['chunks'] if self.note_ids[150] in c['ids']]
+        self.assertEqual((start, end), (chunk['offset'], chunk['offset'] + chunk['length'] - 1))
+
+    def test_incremental_backup_carries_edits_and_deletions(self):
+        self.backup.backup()
+        self.db.save_note("Note 7", "edited", self.note_ids[7])
+        self.db.delete_note(self.note_ids[8])
+
+        result = self.backup.backup()
+        self.assertFalse(result['full'])
+        self.assertEqual(len(self.backup.get_state()['bundles']), 2)
+
+        self.lose_local_notes()
+        self.backup.restore()
+
+        notes = self.notes_by_title()
+        self.assertEqual(notes["Note 7"], "edited")
+        self.assertNotIn("Note 8", notes)
+        self.assertEqual(len(notes), 299)
+
+    def test_restore_leaves_unrelated_local_notes_alone(self):
+        self.backup.backup()
+        self.db.delete_note(self.note_ids[0])
+        self.backup.backup()
+
+        # A fresh install where notes were written before restoring; their
+        # ids are the same as those of the first backed up notes
+        other = DatabaseManager(os.path.join(self.tmp_dir.name, 'other.db'))
+        other.create_tables()
+        local_ids = [other.save_note("Mine", "local body"),
+                     other.save_note("Also mine", "local body")]
+        self.assertEqual(local_ids, self.note_ids[:2])
+        other.save_setting(SNAPSHOT_STATE_KEY, self.db.get_setting(SNAPSHOT_STATE_KEY))
+        restore = BackupService(other, self.drive, work_dir=self.tmp_dir.name)
+        try:
+            restore.restore()
+            # Restoring again overwrites the restored notes, not adds more
+            restore.restore()
+            notes = {note['title']: note for note in other.get_all_notes()}
+        finally:
+            other.close()
+
+        self.assertEqual(len(notes), 301)
+        self.assertEqual(notes["Mine"]['id'], local_ids[0])
+        self.assertEqual(notes["Mine"]['content'], "local body")
+        self.assertEqual(notes["Also mine"]['content'], "local body")
+        self.assertNotIn("Note 0", notes)
+        self.assertEqual(notes["Note 1"]['content'], self.notes_by_title()["Note 1"])
+
+    def test_corrupt_chunk_is_rejected(self):
+        result = self.backup.backup()
+        data = bytearray(self.drive.blobs[result['file_id']])
+        data[100] ^= 0xFF
+        self.drive.blobs[result['file_id']] = bytes(data)
+
+        with self.assertRaises(BundleError):
+            self.backup.restore()
+
+    def test_database_file_backup_is_uploaded_compressed(self):
+        result = self.backup.backup_database_file(pages_per_step=32)
+
+        restored_path = os.path.join(self.tmp_dir.name, 'restored.db')
+        with open(restored_path, 'wb') as f:
+            f.write(gzip.decompress(self.drive.blobs[result['file_id']]))
+        connection = sqlite3.connect(restored_path)
+        count = connection.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        connection.close()
+
+        self.assertEqual(count, 300)
+        self.assertEqual(result['bytes'], len(self.drive.blobs[result['file_id']]))
+        self.assertGreater(result['steps'], 1)
+
+    def test_database_backup_runs_on_its_own_thread(self):
+        results = []
+        thread = self.backup.start_database_backup(on_result=results.append)
+        thread.join(timeout=10)
+
+        self.assertNotEqual(thread.ident, threading.get_ident())
+        self.assertEqual(len(results), 1)
+        self.assertIn(results[0]['file_id'], self.drive.blobs)
+
+        # Only one database backup runs at a time
+        with self.backup.database_backup_lock:
+            self.assertIsNone(self.backup.start_database_backup())
+
+    def test_full_backup_replaces_the_chain(self):
+        first = self.backup.backup()
+        self.db.save_note("Note 1", "edited", self.note_ids[1])
+        self.backup.backup()
+
+        result = self.backup.backup(full=True)
+
+        self.assertEqual(self.backup.get_state()['bundles'], [result['file_id']])
+        self.assertEqual(list(self.drive.blobs), [result['file_id']])
+        self.assertNotIn(first['file_id'], self.drive.blobs)
+
+
+class TestDriveClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.drive = GoogleDriveService()
+        self.drive.token_path = os.path.join(self.tmp_dir.name, 'token.pickle')
+
+    def tearDown(self):
+        self.drive.stop_token_refresh()
+        self.tmp_dir.cleanup()
+
+    def test_import_does_not_load_google_client(self):
+        app_dir = os.path.join(os.path.dirname(__file__), '..')
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            "import sys; import Services.cloud_service; "
+            "print(any(name.startswith('googleapiclient') for name in sys.modules))"
+        ], cwd=app_dir, text=True)
+        self.assertEqual(output.strip(), 'False')
+
+    def test_shared_instance_is_reused(self):
+        self.assertIs(GoogleDriveService.shared(), GoogleDriveService.shared())
+
+    def test_authenticate_without_stored_token_does_not_prompt(self):
+        self.assertFalse(self.drive.authenticate(interactive=False))
+        self.assertIsNone(self.drive.service)
+
+    def test_token_is_refreshed_before_it_expires(self):
+        original_margin = cloud_service.TOKEN_REFRESH_MARGIN
+        cloud_service.TOKEN_REFRESH_MARGIN = 0
+        try:
+            self.drive.creds = FakeCredentials(expires_in=0.05)
+            self.drive.schedule_token_refresh()
+            first_timer = self.drive.refresh_timer
+            # Wait until the refresh has run and scheduled the next one
+            deadline = time.monotonic() + 2
+            while (self.drive.refresh_timer in (None, first_timer)
+                   and time.monotonic() < deadline):
+                time.sleep(0.01)
+        finally:
+            cloud_service.TOKEN_REFRESH_MARGIN = original_margin
+
+        self.assertEqual(self.drive.creds.refreshes, 1)
+        self.assertTrue(os.path.exists(self.drive.token_path))
+
+
+class TestDriveListing(DriveServerTestCase):
+
+    def test_listing_follows_page_tokens(self):
+        self.server.listing = [{'id': f"file-{i}", 'name': f"{i}.txt"} for i in range(12)]
+
+        files = list(self.drive.iter_files())
+
+        self.assertEqual([file['id'] for file in files], [f"file-{i}" for i in range(12)])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertIn('md5Checksum', self.server.requests[0][1])
+
+
+class TestDriveDownloads(DriveServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server.media = os.urandom(300 * 1024)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.tmp_dir.name, 'backup.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def read_saved(self):
+        with open(self.save_path, 'rb') as f:
+            return f.read()
+
+    def test_download_range(self):
+        media = self.server.media
+
+        tail, size = self.drive.download_range('backup', -100)
+        middle, _ = self.drive.download_range('backup', 1000, 1999)
+
+        self.assertEqual((tail, size), (media[-100:], len(media)))
+        self.assertEqual(middle, media[1000:2000])
+        self.assertEqual(self.server.ranges, ["bytes=-100", "bytes=1000-1999"])
+
+    def test_download_is_streamed_in_chunks(self):
+        self.drive.download_file('backup', self.save_path, chunk_size=64 * 1024)
+
+        self.assertEqual(self.read_saved(), self.server.media)
+        self.assertEqual(len(self.server.ranges), 5)
+        self.assertEqual(self.server.ranges[1], f"bytes={64 * 1024}-{128 * 1024 - 1}")
+        self.assertFalse(os.path.exists(self.save_path + '.part'))
+
+    def interrupt_download(self, after):
+        """Leaves a partial download of the first `after` bytes behind."""
+        self.server.fail_from = after
+        with self.assertRaises(HttpError):
+            self.drive.download_file('backup', self.save_path, chunk_size=after)
+        self.server.fail_from = float('inf')
+        self.server.ranges = []
+
+    def test_partial_download_is_resumed(self):
+        self.interrupt_download(100 * 1024)
+
+        self.drive.download_file('backup', self.save_path, chunk_size=64 * 1024)
+
+        self.assertEqual(self.read_saved(), self.server.media)
+        self.assertEqual(self.server.ranges[0], f"bytes={100 * 1024}-{164 * 1024 - 1}")
+        self.assertFalse(os.path.exists(self.save_path + '.part.rev'))
+
+    def test_complete_partial_file_is_kept(self):
+        self.interrupt_download(100 * 1024)
+        # As if the app stopped between the last chunk and the rename
+        with open(self.save_path + '.part', 'ab') as f:
+            f.write(self.server.media[100 * 1024:])
+
+        self.drive.download_file('backup', self.save_path)
+
+        self.assertEqual(self.read_saved(), self.server.media)
+        self.assertEqual(len(self.server.ranges), 1)
+
+    def test_partial_download_of_replaced_file_starts_over(self):
+        self.interrupt_download(100 * 1024)
+        self.server.media = os.urandom(200 * 1024)
+        self.server.modified_time = '2024-01-02T00:00:00.000Z'
+
+        self.drive.download_file('backup', self.save_path, chunk_size=64 * 1024)
+
+        self.assertEqual(self.read_saved(), self.server.media)
+        self.assertEqual(self.server.ranges[0], f"bytes=0-{64 * 1024 - 1}")
+
+    def test_checksum_mismatch_is_rejected(self):
+        self.server.md5 = hashlib.md5(b'other contents').hexdigest()
+
+        with self.assertRaises(cloud_service.DownloadError):
+            self.drive.download_file('backup', self.save_path)
+
+        self.assertFalse(os.path.exists(self.save_path))
+        self.assertFalse(os.path.exists(self.save_path + '.part'))
+
+    def test_empty_file(self):
+        self.server.media = b''
+        self.drive.download_file('empty', self.save_path)
+        self.assertEqual(self.read_saved(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# tests/test_startup.py
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from Utils.startup_profile import StartupProfile
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStartupProfile(unittest.TestCase):
+
+    def test_phases_are_timed_from_the_previous_mark(self):
+        clock = FakeClock()
+        profile = StartupProfile(clock=clock)
+        clock.now += 0.5
+        profile.mark('imports')
+        clock.now += 0.25
+        profile.mark('build')
+
+        report = profile.get_report()
+
+        self.assertEqual(report['phases'], {'imports': 0.5, 'build': 0.25})
+        self.assertEqual(report['total'], 0.75)
+
+    def test_reports_are_appended(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'profile', 'startup.jsonl')
+            for _ in range(2):
+                profile = StartupProfile()
+                profile.mark('first_frame')
+                profile.save(path)
+
+            with open(path) as f:
+                reports = [json.loads(line) for line in f]
+
+        self.assertEqual(len(reports), 2)
+        self.assertIn('first_frame', reports[0]['phases'])
+
+
+class TestLazyScreenManager(unittest.TestCase):
+
+    def setUp(self):
+        from kivy.uix.screenmanager import Screen
+        from screens.lazy_screen_manager import LazyScreenManager
+
+        # A throwaway module standing in for a screen module
+        self.module = types.ModuleType('lazy_test_screens')
+        self.module.built = []
+
+        class RecordingScreen(Screen):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.module_built.append(self.name)
+
+        RecordingScreen.module_built = self.module.built
+        self.module.RecordingScreen = RecordingScreen
+        sys.modules['lazy_test_screens'] = self.module
+
+        self.sm = LazyScreenManager()
+        self.sm.register('home', 'lazy_test_screens:RecordingScreen')
+        self.sm.register('editor', 'lazy_test_screens:RecordingScreen')
+
+    def tearDown(self):
+        del sys.modules['lazy_test_screens']
+
+    def test_screens_are_built_on_first_navigation(self):
+        self.sm.current = 'home'
+        self.assertEqual(self.module.built, ['home'])
+        self.assertTrue(self.sm.has_screen('editor'))
+
+        self.sm.current = 'editor'
+        self.sm.current = 'home'
+        self.sm.current = 'editor'
+
+        self.assertEqual(self.module.built, ['home', 'editor'])
+        self.assertEqual(set(self.sm.build_times), {'home', 'editor'})
+
+    def test_get_screen_builds_the_screen(self):
+        screen = self.sm.get_screen('editor')
+        self.assertEqual(screen.name, 'editor')
+        self.assertIs(self.sm.get_screen('editor'), screen)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,976 @@
+# tests/test_storage.py
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datetime import datetime
+
+from Model.database import NoteRepository
+from Model.note import Note, note_content_hash
+from Model.note_draft import NoteDraft
+from Utils.database import (
+    NOTE_CREATED, NOTE_DELETED, NOTE_UPDATED, NOTES_BULK_CHANGED,
+    STORED_PREVIEW_LENGTH, DatabaseManager, register_sql_functions
+)
+from Utils.db_backup import backup_database, compress_file
+from Utils.db_executor import DatabaseExecutor
+from Services.storage_service import (
+    BACKUP_FILE_NAME, FSYNC_ALWAYS, FSYNC_NEVER, STORE_FILE_NAME, StorageService
+)
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Base class giving every test a fresh database in a temporary directory."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'notes.db')
+        self.db = DatabaseManager(self.db_path)
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+
+class TestMigrations(DatabaseTestCase):
+
+    def test_new_database_is_at_latest_version(self):
+        latest = self.db.SCHEMA_MIGRATIONS[-1][0]
+        self.assertEqual(self.db.get_schema_version(), latest)
+
+    def test_migrate_is_idempotent(self):
+        self.db.save_note("Kept", "across migrate() calls")
+        self.db.migrate()
+        self.db.create_tables()
+        notes, _ = self.db.get_notes_page()
+        self.assertEqual([note['title'] for note in notes], ["Kept"])
+
+    def test_unversioned_database_is_upgraded_in_place(self):
+        # A notes.db created before migrations existed has user_version 0
+        # and none of the indexes
+        legacy_path = os.path.join(self.tmp_dir.name, 'legacy.db')
+        connection = sqlite3.connect(legacy_path)
+        connection.execute('''
+            CREATE TABLE notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                content TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_deleted BOOLEAN DEFAULT 0,
+                sync_status TEXT DEFAULT 'not_synced'
+            )
+        ''')
+        connection.execute("INSERT INTO notes (title, content) VALUES ('Old note', 'legacy body')")
+        connection.commit()
+        connection.close()
+
+        db = DatabaseManager(legacy_path)
+        db.create_tables()
+        self.assertEqual(db.get_schema_version(), db.SCHEMA_MIGRATIONS[-1][0])
+        self.assertEqual([note['title'] for note in db.search_notes("legacy")], ["Old note"])
+        db.close()
+
+
+    def test_content_hash_is_kept_up_to_date(self):
+        class Version5Database(DatabaseManager):
+            SCHEMA_MIGRATIONS = DatabaseManager.SCHEMA_MIGRATIONS[:5]
+
+        path = os.path.join(self.tmp_dir.name, 'v5.db')
+        old_db = Version5Database(path)
+        old_db.create_tables()
+        old_db.close()
+        connection = sqlite3.connect(path)
+        # The search triggers call note_body(), which DatabaseManager registers
+        register_sql_functions(connection)
+        old_id = connection.execute(
+            "INSERT INTO notes (title, content) VALUES ('Old', 'saved before hashes')"
+        ).lastrowid
+        connection.commit()
+        connection.close()
+
+        db = DatabaseManager(path)
+        db.create_tables()
+        new_id = db.save_note("New", "saved after")
+        db.save_notes_bulk([{'title': "Bulk", 'content': "restored", 'id': 10}])
+        hashes = dict(db.connection.execute("SELECT id, content_hash FROM notes"))
+        db.close()
+
+        self.assertEqual(hashes, {
+            old_id: note_content_hash("Old", "saved before hashes"),
+            new_id: note_content_hash("New", "saved after"),
+            10: note_content_hash("Bulk", "restored"),
+        })
+
+
+class TestQueryPlans(DatabaseTestCase):
+    """
+    Guards against the listing and sync queries regressing to full table
+    scans or temporary sort b-trees as the schema evolves.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.db.save_notes_bulk(
+            {'title': f"Note {i}", 'content': "body " * 20} for i in range(50)
+        )
+
+    def capture_statements(self, call):
+        """Runs call() and returns every SELECT it executed, parameters bound."""
+        statements = []
+        # Inside a transaction reads go through the writer connection, so
+        # tracing that one connection sees every statement
+        with self.db.transaction() as connection:
+            connection.set_trace_callback(statements.append)
+            try:
+                call()
+            finally:
+                connection.set_trace_callback(None)
+        return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+    def assert_index_only(self, call):
+        statements = self.capture_statements(call)
+        self.assertTrue(statements)
+        for sql in statements:
+            plan = self.db.connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            details = [row[3] for row in plan]
+            for detail in details:
+                self.assertNotEqual(detail, "SCAN notes", f"Full scan in: {sql}")
+                self.assertNotIn("TEMP B-TREE", detail, f"Sort without index in: {sql}")
+
+    def test_first_listing_page_uses_index(self):
+        self.assert_index_only(lambda: self.db.get_notes_page(limit=10))
+
+    def test_listing_page_without_preview_uses_index(self):
+        self.assert_index_only(lambda: self.db.get_notes_page(limit=10, preview_length=None))
+
+    def test_following_listing_page_uses_index(self):
+        _, cursor = self.db.get_notes_page(limit=10)
+        self.assert_index_only(lambda: self.db.get_notes_page(limit=10, cursor=cursor))
+
+    def test_pending_sync_query_uses_index(self):
+        self.assert_index_only(lambda: self.db.get_notes_pending_sync())
+
+
+class TestNotesPage(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # All with the same timestamp, so only the id orders them
+        self.db.save_notes_bulk(
+            {'title': f"Note {i}", 'content': "body", 'updated_at': "2024-01-01 00:00:00"}
+            for i in range(25)
+        )
+        self.all_ids = sorted((note['id'] for note in self.db.get_all_notes()), reverse=True)
+
+    def pages(self, limit, between_pages=None):
+        """Yields every page, calling between_pages(seen_ids) after each."""
+        cursor = None
+        seen = []
+        while True:
+            notes, cursor = self.db.get_notes_page(limit=limit, cursor=cursor)
+            seen.extend(note['id'] for note in notes)
+            yield notes
+            if cursor is None:
+                return
+            if between_pages is not None:
+                between_pages(seen)
+
+    def listed_ids(self, limit, between_pages=None):
+        return [note['id'] for page in self.pages(limit, between_pages) for note in page]
+
+    def test_equal_timestamps_are_paged_without_gaps_or_repeats(self):
+        for limit in (1, 7, 25, 100):
+            self.assertEqual(self.listed_ids(limit), self.all_ids)
+
+    def test_last_full_page_is_followed_by_an_empty_one(self):
+        pages = list(self.pages(limit=5))
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 5, 0])
+
+    def test_deletes_between_pages(self):
+        deleted_listed = []
+        deleted_ahead = []
+
+        def delete_some(seen):
+            # One note already listed and one still ahead
+            ahead = [note_id for note_id in self.all_ids
+                     if note_id not in seen and note_id not in deleted_ahead]
+            self.db.delete_notes_bulk([seen[-1]] + ahead[-1:])
+            deleted_listed.append(seen[-1])
+            deleted_ahead.extend(ahead[-1:])
+
+        listed = self.listed_ids(6, delete_some)
+
+        self.assertEqual(len(listed), len(set(listed)))
+        self.assertTrue(set(deleted_listed) <= set(listed))
+        self.assertFalse(set(listed) & set(deleted_ahead))
+        self.assertEqual(set(listed) | set(deleted_ahead), set(self.all_ids))
+
+    def test_edits_between_pages(self):
+        edited = []
+
+        def edit_one(seen):
+            ahead = [note_id for note_id in self.all_ids
+                     if note_id not in seen and note_id not in edited]
+            if ahead:
+                # Moves the note to the top of the list, behind the cursor
+                self.db.save_note("Edited", "body", ahead[-1])
+                edited.append(ahead[-1])
+
+        listed = self.listed_ids(6, edit_one)
+
+        self.assertTrue(edited)
+        self.assertEqual(len(listed), len(set(listed)))
+        self.assertEqual(set(listed) | set(edited), set(self.all_ids))
+        self.assertFalse(set(listed) & set(edited))
+        # A fresh listing starts with the edited notes
+        self.assertEqual(set(self.listed_ids(100)[:len(edited)]), set(edited))
+
+
+class TestNoteEvents(DatabaseTestCase):
+    """The change events the home screen patches its rows from."""
+
+    def setUp(self):
+        super().setUp()
+        self.events = []
+        self.db.add_note_listener(
+            lambda event, note_id, note: self.events.append((event, note_id, note))
+        )
+
+    def test_single_note_events(self):
+        note_id = self.db.save_note("Title", "body")
+        self.db.save_note("Title", "edited", note_id)
+        self.db.delete_note(note_id)
+
+        self.assertEqual([(event, nid) for event, nid, _ in self.events], [
+            (NOTE_CREATED, note_id), (NOTE_UPDATED, note_id), (NOTE_DELETED, note_id),
+        ])
+        created, updated = self.events[0][2], self.events[1][2]
+        self.assertEqual((created['title'], created['preview']), ("Title", "body"))
+        self.assertEqual(updated['preview'], "edited")
+        self.assertIsNone(updated['created_at'])
+
+    def test_bulk_writes_send_one_event(self):
+        self.db.save_notes_bulk({'title': f"Note {i}", 'content': "body"} for i in range(5))
+        self.db.delete_notes_bulk([1, 2])
+        self.assertEqual(self.events, [(NOTES_BULK_CHANGED, None, None)] * 2)
+
+    def test_saving_a_deleted_note_does_not_revive_it(self):
+        note_id = self.db.save_note("Gone", "body")
+        self.db.delete_note(note_id)
+        self.events = []
+
+        with self.assertRaises(Exception):
+            self.db.save_note("Gone", "stale edit", note_id)
+        with self.assertRaises(Exception):
+            self.db.save_note("Missing", "body", 12345)
+
+        self.assertEqual(self.events, [])
+        self.assertIsNone(self.db.get_note(note_id))
+
+
+class TestTransactions(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.events = []
+        self.db.add_note_listener(
+            lambda event, note_id, note: self.events.append((event, note_id))
+        )
+
+    def titles(self):
+        return sorted(note['title'] for note in self.db.get_all_notes())
+
+    def committed_titles(self):
+        """
+        The titles another thread sees. Inside a block the thread holding
+        the writer reads its own uncommitted writes.
+        """
+        result = []
+        reader = threading.Thread(target=lambda: result.extend(self.titles()))
+        reader.start()
+        reader.join()
+        return result
+
+    def test_block_commits_once_at_the_end(self):
+        with self.db.transaction():
+            first = self.db.save_note("First", "body")
+            self.db.save_note("Second", "body")
+            self.assertEqual(self.titles(), ["First", "Second"])
+            # Other threads see the last committed state until the block exits
+            self.assertEqual(self.committed_titles(), [])
+            self.assertEqual(self.events, [])
+
+        self.assertEqual(self.titles(), ["First", "Second"])
+        self.assertEqual(self.events[0], (NOTE_CREATED, first))
+        self.assertEqual(len(self.events), 2)
+
+    def test_outer_block_rolls_back_everything(self):
+        self.db.save_note("Kept", "body")
+        self.events = []
+
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.save_note("Dropped", "body")
+                self.db.delete_notes_bulk([1])
+                raise RuntimeError("abort")
+
+        self.assertEqual(self.titles(), ["Kept"])
+        self.assertEqual(self.events, [])
+        # The writer is usable again afterwards
+        self.db.save_note("After", "body")
+        self.assertEqual(self.titles(), ["After", "Kept"])
+
+    def test_nested_blocks_join_the_outer_transaction(self):
+        with self.db.transaction():
+            with self.db.transaction():
+                self.db.save_note("Inner", "body")
+            # Leaving the inner block neither commits nor notifies
+            self.assertEqual(self.committed_titles(), [])
+            self.assertEqual(self.events, [])
+            self.db.save_note("Outer", "body")
+
+        self.assertEqual(self.titles(), ["Inner", "Outer"])
+        self.assertEqual(len(self.events), 2)
+
+    def test_failure_in_a_nested_block_rolls_back_the_outer_one(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.save_note("Outer", "body")
+                with self.db.transaction():
+                    self.db.save_note("Inner", "body")
+                    raise RuntimeError("abort")
+
+        self.assertEqual(self.titles(), [])
+        self.assertEqual(self.events, [])
+
+    def test_bulk_round_trip(self):
+        count = self.db.save_notes_bulk(
+            {'title': f"Note {i}", 'content': f"body {i}" * (i + 1)} for i in range(200)
+        )
+        self.assertEqual(count, 200)
+        notes = {note['title']: note for note in self.db.get_all_notes()}
+        self.assertEqual(len(notes), 200)
+        self.assertEqual(notes["Note 7"]['content'], "body 7" * 8)
+
+        # Saving again with ids overwrites instead of duplicating
+        self.db.save_notes_bulk(
+            {'id': note['id'], 'title': title, 'content': "restored"}
+            for title, note in notes.items()
+        )
+        self.assertEqual(len(self.db.get_all_notes()), 200)
+        self.assertEqual(self.db.get_note(notes["Note 7"]['id'])['content'], "restored")
+
+        doomed = [note['id'] for title, note in notes.items() if title < "Note 5"]
+        self.db.delete_notes_bulk(doomed)
+        remaining = self.db.get_all_notes()
+        self.assertEqual(len(remaining), 200 - len(doomed))
+        self.assertFalse({note['id'] for note in remaining} & set(doomed))
+        found = self.db.search_notes("restored", limit=200)
+        self.assertEqual({note['id'] for note in found}, {note['id'] for note in remaining})
+        self.assertEqual(self.events, [(NOTES_BULK_CHANGED, None)] * 3)
+
+
+class TestSearch(DatabaseTestCase):
+
+    def found(self, text):
+        return [note['title'] for note in self.db.search_notes(text)]
+
+    def test_words_match_as_prefixes(self):
+        self.db.save_note("Groceries", "buy apples and bread")
+        self.db.save_note("Meeting", "agenda for monday")
+
+        self.assertEqual(self.found("app"), ["Groceries"])
+        self.assertEqual(self.found("app bre"), ["Groceries"])
+        self.assertEqual(self.found("mon"), ["Meeting"])
+        self.assertEqual(self.found("apples monday"), [])
+
+    def test_title_matches_rank_first(self):
+        self.db.save_note("Older", "ideas for the garden")
+        self.db.save_note("Garden", "plants")
+        self.db.save_note("Newest", "the garden needs water")
+
+        self.assertEqual(self.found("garden")[0], "Garden")
+        self.assertEqual(len(self.found("garden")), 3)
+
+    def test_deleted_notes_leave_the_index(self):
+        note_id = self.db.save_note("Receipt", "warranty details")
+        self.db.delete_note(note_id)
+        self.assertEqual(self.found("warranty"), [])
+
+        note_ids = [self.db.save_note(f"Receipt {i}", "warranty") for i in range(3)]
+        self.db.delete_notes_bulk(note_ids[:2])
+        self.assertEqual(self.found("warranty"), ["Receipt 2"])
+
+    def test_edits_replace_the_indexed_words(self):
+        note_id = self.db.save_note("Draft", "first version")
+        self.db.save_note("Final", "second version", note_id)
+
+        self.assertEqual(self.found("first"), [])
+        self.assertEqual(self.found("draft"), [])
+        self.assertEqual(self.found("second"), ["Final"])
+        self.assertEqual(self.found("version"), ["Final"])
+
+    def test_other_connections_need_the_sql_functions(self):
+        self.db.save_note("Shared", "written by the app")
+        connection = sqlite3.connect(self.db_path)
+        try:
+            # Plain reads of the notes table work as they are
+            self.assertEqual(connection.execute("SELECT title FROM notes").fetchall(),
+                             [("Shared",)])
+            with self.assertRaisesRegex(sqlite3.OperationalError, "note_body"):
+                connection.execute("INSERT INTO notes (title, content) VALUES ('Raw', 'script')")
+            connection.rollback()
+
+            register_sql_functions(connection)
+            connection.execute("INSERT INTO notes (title, content) VALUES ('Raw', 'script')")
+            connection.commit()
+        finally:
+            connection.close()
+
+        self.assertEqual(self.found("script"), ["Raw"])
+
+    def test_search_index_is_backfilled_by_its_migration(self):
+        class Version1Database(DatabaseManager):
+            SCHEMA_MIGRATIONS = DatabaseManager.SCHEMA_MIGRATIONS[:1]
+
+        path = os.path.join(self.tmp_dir.name, 'v1.db')
+        old_db = Version1Database(path)
+        old_db.create_tables()
+        old_db.close()
+        connection = sqlite3.connect(path)
+        connection.executemany(
+            "INSERT INTO notes (title, content, is_deleted) VALUES (?, 'written by an old version', ?)",
+            [("Before search", 0), ("Deleted", 1)]
+        )
+        connection.commit()
+        connection.close()
+
+        db = DatabaseManager(path)
+        db.create_tables()
+        try:
+            self.assertEqual([note['title'] for note in db.search_notes("old vers")],
+                             ["Before search"])
+        finally:
+            db.close()
+
+    def test_snippet_escapes_markup_in_note_text(self):
+        self.db.save_note("Tags", "see [color=ff0000]red[/color] & fox [")
+
+        [result] = self.db.search_notes("fox")
+
+        self.assertEqual(
+            result['snippet'],
+            "see &bl;color=ff0000&br;red&bl;/color&br; &amp; [b]fox[/b] &bl;"
+        )
+
+
+class TestOutbox(DatabaseTestCase):
+
+    def entries(self):
+        return self.db.connection.execute(
+            "SELECT note_id, operation, version FROM outbox ORDER BY note_id"
+        ).fetchall()
+
+    def test_writes_enqueue_the_latest_operation_once(self):
+        note_id = self.db.save_note("Draft", "one")
+        self.db.save_note("Draft", "two", note_id)
+        self.assertEqual(self.entries(), [(note_id, 'upload', 2)])
+
+        self.db.delete_note(note_id)
+        self.assertEqual(self.entries(), [(note_id, 'delete', 3)])
+
+    def test_synced_notes_leave_the_outbox(self):
+        self.db.save_note("Draft", "body")
+        [note] = self.db.get_outbox_due(time.time())
+
+        self.db.mark_note_synced(note, 'drive-1')
+
+        self.assertEqual(self.entries(), [])
+        self.assertIsNone(self.db.get_next_outbox_attempt())
+
+    def test_failure_of_an_older_version_is_ignored(self):
+        note_id = self.db.save_note("Draft", "one")
+        [attempted] = self.db.get_outbox_due(time.time())
+        self.db.save_note("Draft", "two", note_id)
+
+        self.db.record_outbox_failure(note_id, attempted['version'], "offline", time.time() + 60)
+
+        [due] = self.db.get_outbox_due(time.time())
+        self.assertEqual((due['content'], due['attempts']), ("two", 0))
+
+
+class TestCompressedContent(DatabaseTestCase):
+
+    LONG_BODY = "The quick brown fox jumps over the lazy dog. " * 200
+
+    def stored_columns(self, note_id):
+        return self.db.connection.execute(
+            "SELECT content, content_compressed, preview, content_length FROM notes WHERE id = ?",
+            (note_id,)
+        ).fetchone()
+
+    def test_long_bodies_are_stored_compressed(self):
+        long_id = self.db.save_note("Long", self.LONG_BODY)
+        short_id = self.db.save_note("Short", "a few words")
+
+        content, compressed, preview, length = self.stored_columns(long_id)
+        self.assertIsNone(content)
+        self.assertLess(len(compressed), len(self.LONG_BODY) // 10)
+        self.assertEqual(preview, self.LONG_BODY[:STORED_PREVIEW_LENGTH])
+        self.assertEqual(length, len(self.LONG_BODY))
+        self.assertEqual(self.stored_columns(short_id)[:2], ("a few words", None))
+
+        self.assertEqual(self.db.get_note(long_id)['content'], self.LONG_BODY)
+        self.assertEqual(self.db.get_note_content(long_id), self.LONG_BODY)
+        notes, _ = self.db.get_notes_page(preview_length=9)
+        self.assertEqual(notes[1]['preview'], "The quick")
+
+    def test_compression_can_be_disabled(self):
+        db = DatabaseManager(os.path.join(self.tmp_dir.name, 'raw.db'),
+                             compression_threshold=None)
+        db.create_tables()
+        note_id = db.save_note("Long", self.LONG_BODY)
+        row = db.connection.execute(
+            "SELECT content, content_compressed FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()
+        db.close()
+        self.assertEqual(row, (self.LONG_BODY, None))
+
+    def test_search_reads_compressed_bodies(self):
+        note_id = self.db.save_note("Long", self.LONG_BODY)
+        self.assertEqual([note['id'] for note in self.db.search_notes("fox")], [note_id])
+
+        self.db.save_note("Long", self.LONG_BODY.replace("fox", "cat"), note_id)
+        self.assertEqual(self.db.search_notes("fox"), [])
+        self.assertEqual([note['id'] for note in self.db.search_notes("cat")], [note_id])
+
+        self.db.rebuild_search_index()
+        self.assertEqual([note['id'] for note in self.db.search_notes("cat")], [note_id])
+
+    def test_existing_notes_are_compressed_on_upgrade(self):
+        class Version4Database(DatabaseManager):
+            SCHEMA_MIGRATIONS = DatabaseManager.SCHEMA_MIGRATIONS[:4]
+
+        path = os.path.join(self.tmp_dir.name, 'v4.db')
+        old_db = Version4Database(path)
+        old_db.create_tables()
+        old_db.close()
+        connection = sqlite3.connect(path)
+        connection.execute("INSERT INTO notes (title, content) VALUES ('Old', ?)", (self.LONG_BODY,))
+        connection.commit()
+        connection.close()
+
+        db = DatabaseManager(path)
+        db.create_tables()
+        content, compressed, preview = db.connection.execute(
+            "SELECT content, content_compressed, preview FROM notes"
+        ).fetchone()
+        self.assertIsNone(content)
+        self.assertIsNotNone(compressed)
+        self.assertEqual(preview, self.LONG_BODY[:STORED_PREVIEW_LENGTH])
+        self.assertEqual([note['title'] for note in db.search_notes("lazy")], ["Old"])
+        db.close()
+
+
+class TestConcurrentAccess(DatabaseTestCase):
+
+    def test_worker_threads_read_and_write_concurrently(self):
+        errors = []
+
+        def writer(worker):
+            try:
+                for i in range(50):
+                    self.db.save_note(f"Worker {worker} note {i}", "body")
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(50):
+                    self.db.get_notes_page(limit=20)
+                    self.db.search_notes("worker")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(3)]
+        threads += [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        notes, _ = self.db.get_notes_page(limit=1000, preview_length=None)
+        self.assertEqual(len(notes), 150)
+
+    def test_transaction_reads_its_own_writes(self):
+        with self.db.transaction():
+            note_id = self.db.save_note("Draft", "not committed yet")
+            self.assertEqual(self.db.get_note(note_id)['title'], "Draft")
+
+            # Other threads only see committed data
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(self.db.get_note(note_id)))
+            thread.start()
+            thread.join()
+            self.assertEqual(seen, [None])
+
+        self.assertEqual(self.db.get_note(note_id)['title'], "Draft")
+
+
+
+class TestOnlineBackup(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.db.save_notes_bulk(
+            {'title': f"Note {i}", 'content': f"body {i} " * 200} for i in range(300)
+        )
+        self.target_path = os.path.join(self.tmp_dir.name, 'backup.db')
+
+    def count_backed_up_notes(self):
+        connection = sqlite3.connect(self.target_path)
+        try:
+            self.assertEqual(connection.execute("PRAGMA integrity_check").fetchone()[0], 'ok')
+            return connection.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_backup_copies_the_database_in_steps(self):
+        stats = backup_database(self.db, self.target_path, pages_per_step=16, step_pause=0)
+
+        self.assertEqual(self.count_backed_up_notes(), 300)
+        self.assertEqual(stats['steps'], -(-stats['pages'] // 16))
+        self.assertGreater(stats['pages_per_second'], 0)
+        self.assertLessEqual(stats['copy_seconds'], stats['seconds'])
+        self.assertEqual(stats['ui_slow_calls'], 0)
+
+    def test_writes_during_backup_do_not_block_or_restart_it(self):
+        write_times = []
+
+        def clock():
+            # Called between backup steps, on the backup's thread
+            if len(write_times) < 3:
+                started = time.perf_counter()
+                self.db.save_note("Written during backup", "body")
+                write_times.append(time.perf_counter() - started)
+            return time.perf_counter()
+
+        stats = backup_database(self.db, self.target_path, pages_per_step=16,
+                                step_pause=0, clock=clock)
+
+        # The copy is the snapshot from when the backup started
+        self.assertEqual(self.count_backed_up_notes(), 300)
+        self.assertEqual(stats['steps'], -(-stats['pages'] // 16))
+        self.assertEqual(len(self.db.get_all_notes()), 303)
+        self.assertLess(max(write_times), 0.5)
+
+    def test_compressed_backup_round_trips(self):
+        backup_database(self.db, self.target_path)
+        compressed_path = compress_file(self.target_path)
+
+        with gzip.open(compressed_path, 'rb') as f, open(self.target_path, 'rb') as original:
+            self.assertEqual(f.read(), original.read())
+        self.assertLess(os.path.getsize(compressed_path), os.path.getsize(self.target_path))
+
+
+class TestDatabaseExecutor(DatabaseTestCase):
+
+    def test_calls_run_off_the_main_thread(self):
+        delivered = []
+        executor = DatabaseExecutor(
+            self.db, dispatch=lambda callback, *args: delivered.append(callback(*args))
+        )
+        self.db.main_thread_monitor.reset()
+
+        executor.submit(self.db.save_note, "Async", "saved on the worker")
+        executor.submit(
+            self.db.get_notes_page,
+            on_result=lambda page: [note['title'] for note in page[0]]
+        )
+        executor.shutdown()
+
+        self.assertEqual(delivered, [["Async"]])
+        self.assertEqual(self.db.get_main_thread_stats()['calls'], 0)
+
+    def test_errors_are_delivered_to_the_error_handler(self):
+        errors = []
+        executor = DatabaseExecutor(self.db, dispatch=lambda callback, *args: callback(*args))
+        executor.submit(self.db.save_note, None, "a title is required", on_error=errors.append)
+        executor.shutdown()
+        self.assertEqual(len(errors), 1)
+
+
+class TestNoteRepository(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.notes = NoteRepository(self.db)
+
+    def test_saved_note_round_trips(self):
+        note = Note("Groceries", content="milk, eggs")
+        note_id = self.notes.save(note)
+        self.assertEqual(note.id, note_id)
+
+        loaded = self.notes.get(note_id)
+
+        self.assertEqual((loaded.title, loaded.content), ("Groceries", "milk, eggs"))
+        self.assertIsInstance(loaded.updated_at, datetime)
+        self.assertEqual(len(loaded.updated_at.strftime('%Y-%m-%d %H:%M')), 16)
+
+    def test_listing_does_not_read_note_bodies(self):
+        self.notes.save(Note("Long", content="x" * 10000))
+
+        statements = []
+        with self.db.transaction() as connection:
+            connection.set_trace_callback(statements.append)
+            try:
+                notes, _ = self.notes.list_page(preview_length=20)
+            finally:
+                connection.set_trace_callback(None)
+
+        self.assertEqual(len(notes[0].preview), 20)
+        self.assertFalse(notes[0].content_loaded)
+        self.assertFalse(any("SELECT content" in sql for sql in statements))
+
+        # The body is fetched on first access
+        self.assertEqual(notes[0].content, "x" * 10000)
+        self.assertTrue(notes[0].content_loaded)
+
+    def test_storage_service_note_api(self):
+        storage = StorageService(self.db, base_dir=self.tmp_dir.name)
+        first = Note("First", content="one")
+        storage.save_note(first)
+        storage.save_note(Note("Second", content="two"))
+
+        self.assertEqual([note.title for note in storage.get_all_notes()], ["Second", "First"])
+        self.assertEqual(storage.get_note(first.id).content, "one")
+
+        storage.delete_note(first.id)
+        self.assertIsNone(storage.get_note(first.id))
+
+    def test_note_uses_slots(self):
+        with self.assertRaises(AttributeError):
+            Note("Title").colour = "red"
+
+
+class TestNoteDraft(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.notes = NoteRepository(self.db)
+        self.executor = DatabaseExecutor(self.db, dispatch=lambda callback, *args: callback(*args))
+        self.draft = NoteDraft(self.notes, self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        super().tearDown()
+
+    def wait_for_writes(self):
+        # The worker runs calls in order, so this returns once earlier
+        # writes and their callbacks are done
+        self.executor.submit(lambda: None).result()
+
+    def test_unchanged_text_is_not_saved_again(self):
+        self.assertTrue(self.draft.save("Title", "body"))
+        self.assertFalse(self.draft.save("Title", "body"))
+        self.assertFalse(self.draft.is_dirty("Title", "body"))
+        self.wait_for_writes()
+
+        self.assertEqual(len(self.db.get_all_notes()), 1)
+
+    def test_empty_note_is_not_created(self):
+        self.assertFalse(self.draft.save("  ", ""))
+        self.assertIsNone(self.draft.note)
+
+    def test_quick_saves_of_a_new_note_update_one_row(self):
+        saved = []
+        for content in ("d", "dr", "draft"):
+            self.draft.save("New", content, on_saved=saved.append)
+        self.wait_for_writes()
+
+        [note] = self.db.get_all_notes()
+        self.assertEqual(note['content'], "draft")
+        self.assertEqual([n.id for n in saved], [note['id']] * 3)
+
+    def test_failed_write_keeps_the_changes_unsaved(self):
+        saved, errors = [], []
+        with mock.patch.object(NoteRepository, 'save',
+                               side_effect=Exception("disk I/O error")):
+            self.draft.save("Title", "body", on_saved=saved.append, on_error=errors.append)
+            self.wait_for_writes()
+
+        self.assertEqual((saved, len(errors)), ([], 1))
+        self.assertTrue(self.draft.is_dirty("Title", "body"))
+
+        # The next save retries the same text
+        self.assertTrue(self.draft.save("Title", "body", on_saved=saved.append))
+        self.wait_for_writes()
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(self.notes.get(saved[0].id).content, "body")
+
+    def test_loaded_note_is_updated_in_place(self):
+        note_id = self.notes.save(Note("Old", content="text"))
+        self.draft.load(self.notes.get(note_id))
+
+        self.assertFalse(self.draft.is_dirty("Old", "text"))
+        self.draft.save("Old", "new text")
+        self.wait_for_writes()
+
+        [note] = self.db.get_all_notes()
+        self.assertEqual((note['id'], note['content']), (note_id, "new text"))
+
+
+class TestStorageService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # A long delay, so only explicit flush() calls write in these tests
+        self.storage = StorageService(None, base_dir=self.tmp_dir.name, flush_delay=60)
+        self.store_path = os.path.join(self.tmp_dir.name, STORE_FILE_NAME)
+
+    def tearDown(self):
+        self.storage.flush()
+        self.tmp_dir.cleanup()
+
+    def reopen(self):
+        self.storage.flush()
+        return StorageService(None, base_dir=self.tmp_dir.name, flush_delay=0)
+
+    def test_items_survive_a_restart(self):
+        self.storage.store_data('first_time_setup_complete', True)
+        self.storage.store_data('theme', {'style': 'Dark'})
+
+        storage = self.reopen()
+
+        self.assertTrue(storage.retrieve_data('first_time_setup_complete'))
+        self.assertEqual(storage.retrieve_data('theme'), {'style': 'Dark'})
+        self.assertIsNone(storage.retrieve_data('missing'))
+
+    def test_writes_are_coalesced_into_one_flush(self):
+        for i in range(100):
+            self.storage.store_data(f"key_{i}", i)
+        self.assertFalse(os.path.exists(self.store_path))
+
+        self.storage.flush()
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), [STORE_FILE_NAME])
+        self.assertEqual(len(self.reopen().list_stored_items()), 100)
+
+    def test_delayed_flush_writes_without_being_asked(self):
+        storage = StorageService(None, base_dir=self.tmp_dir.name, flush_delay=0.01)
+        storage.store_data('key', 'value')
+        deadline = time.monotonic() + 2
+        while not os.path.exists(self.store_path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(os.path.exists(self.store_path))
+
+    def test_delete_data(self):
+        self.storage.store_data('key', 'value')
+        self.assertTrue(self.storage.delete_data('key'))
+        self.assertFalse(self.storage.delete_data('key'))
+        self.assertEqual(self.reopen().list_stored_items(), [])
+
+    def test_returned_data_is_a_copy(self):
+        self.storage.store_data('theme', {'style': 'Dark'})
+        self.storage.retrieve_data('theme')['style'] = 'Light'
+        self.assertEqual(self.storage.retrieve_data('theme'), {'style': 'Dark'})
+
+    def test_per_key_files_are_imported(self):
+        legacy_path = os.path.join(self.tmp_dir.name, 'first_time_setup_complete.json')
+        with open(legacy_path, 'w') as f:
+            json.dump({'timestamp': '2024-01-01T00:00:00', 'content': True}, f, indent=4)
+
+        self.assertTrue(self.storage.retrieve_data('first_time_setup_complete'))
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertTrue(self.reopen().retrieve_data('first_time_setup_complete'))
+
+    def test_truncated_store_falls_back_to_previous_version(self):
+        self.storage.store_data('first_time_setup_complete', True)
+        self.storage.flush()
+        self.storage.store_data('theme', 'Dark')
+        self.storage.flush()
+        # Simulate a write torn by a crash
+        with open(self.store_path, 'r+') as f:
+            f.truncate(20)
+
+        storage = StorageService(None, base_dir=self.tmp_dir.name)
+
+        self.assertTrue(storage.retrieve_data('first_time_setup_complete'))
+
+    def test_checksum_mismatch_is_detected(self):
+        self.storage.store_data('theme', 'Dark')
+        self.storage.flush()
+        with open(self.store_path) as f:
+            data = json.load(f)
+        data['items']['theme']['content'] = 'Tampered'
+        with open(self.store_path, 'w') as f:
+            json.dump(data, f)
+
+        storage = StorageService(None, base_dir=self.tmp_dir.name)
+
+        self.assertIsNone(storage.retrieve_data('theme'))
+
+    def test_fsync_policy_per_key_class(self):
+        fsynced = []
+        with mock.patch('os.fsync', side_effect=fsynced.append):
+            storage = StorageService(None, base_dir=self.tmp_dir.name, flush_delay=60,
+                                     fsync_policies={'setup.': FSYNC_ALWAYS, 'cache.': FSYNC_NEVER})
+            # Written and fsynced immediately
+            storage.store_data('setup.done', True)
+            self.assertTrue(os.path.exists(self.store_path))
+            self.assertTrue(fsynced)
+
+            # Coalesced and not fsynced
+            fsynced.clear()
+            storage.store_data('cache.preview', 'text')
+            storage.flush()
+            self.assertEqual(fsynced, [])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, BACKUP_FILE_NAME)))
+
+    def test_store_file_never_disappears_during_a_flush(self):
+        self.storage.store_data('theme', 'Dark')
+        self.storage.flush()
+        replace = os.replace
+        missing = []
+
+        def checked_replace(src, dst):
+            missing.append(not os.path.exists(self.store_path))
+            replace(src, dst)
+
+        with mock.patch('os.replace', side_effect=checked_replace):
+            self.storage.store_data('theme', 'Light')
+            self.storage.flush()
+
+        self.assertTrue(missing)
+        self.assertFalse(any(missing))
+        storage = StorageService(None, base_dir=self.tmp_dir.name)
+        self.assertEqual(storage.retrieve_data('theme'), 'Light')
+        with open(os.path.join(self.tmp_dir.name, BACKUP_FILE_NAME)) as f:
+            self.assertEqual(json.load(f)['items']['theme']['content'], 'Dark')
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                         sorted([STORE_FILE_NAME, BACKUP_FILE_NAME]))
+
+    def test_backup_is_copied_where_links_are_unsupported(self):
+        self.storage.store_data('theme', 'Dark')
+        self.storage.flush()
+        with mock.patch('os.link', side_effect=OSError("links not supported")):
+            self.storage.store_data('theme', 'Light')
+            self.storage.flush()
+        with open(os.path.join(self.tmp_dir.name, BACKUP_FILE_NAME)) as f:
+            self.assertEqual(json.load(f)['items']['theme']['content'], 'Dark')
+
+
+if __name__ == '__main__':
+    unittest.main()